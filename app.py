@@ -1,62 +1,375 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 import json
 import threading
 import time
 import base64
+import csv
+import io
 import hashlib
+import selectors
+import socket
+import asyncio
+from collections import deque
 from email_service import EmailService
+from websocket_loop import EventLoop, SocketConnection, LoopConnection, AsyncConnection, DEFAULT_SERVER_MODE
+from websocket_deflate import CompressionStats, negotiate as negotiate_deflate
+from websocket_coalesce import BroadcastCoalescer
+from websocket_heartbeat import HeartbeatMonitor
+from websocket_codec import JSON_CODEC, CodecError, negotiate_subprotocol
+from change_bus import ChangeBus, default_address as default_bus_address
+from websocket_ratelimit import RateLimiter
+from websocket_workers import DBWorkerPool, PoolBusy, JobTimeout
+from websocket_frame import (
+    FrameDecoder, FrameError, encode_frame, encode_frame_parts, encode_close,
+    OPCODE_TEXT, OPCODE_BINARY, OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG
+)
 # 导入备份模块
 from backup import init_app as init_backup, auto_backup
+from task_search import init_app as init_search, search_tasks
+from http_compression import ResponseCompressor, representation_etags
+from task_cache import TaskCache
+from sqlalchemy import event
+from sqlalchemy.orm.util import identity_key
 
 app = Flask(__name__)
 CORS(app)  # 启用CORS支持所有域名的请求
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///task_manager.db'
+# 可通过环境变量 TODO_DATABASE_URI 指定其它数据库（如压测时使用临时库）
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('TODO_DATABASE_URI', 'sqlite:///task_manager.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
+# 按Accept-Encoding压缩JSON响应（1KB以下不压缩），安装brotli后优先使用br
+response_compressor = ResponseCompressor(min_size=1024, gzip_level=6, brotli_quality=5)
+response_compressor.init_app(app)
 
 
 # 简单的WebSocket服务器类
 class SimpleWebSocketServer:
-    def __init__(self, app, host='0.0.0.0', port=5001):
+    # 服务器运行模式：thread 为每个客户端一个线程，selector 为事件循环多路复用，
+    # asyncio 为asyncio流 + 协程处理器（数据库操作放到线程池执行）；Windows上默认asyncio，其它平台默认selector
+    MODES = ('thread', 'selector', 'asyncio')
+    MAX_HANDSHAKE_SIZE = 8192  # 握手请求头上限，防止恶意客户端撑大缓冲区
+    # 慢客户端处理策略：drop 直接断开（客户端会自动重连），resync 暂停推送并在积压消化后通知客户端重新拉取
+    SLOW_CLIENT_POLICIES = ('drop', 'resync')
+    RESYNC_CHECK_INTERVAL = 0.05  # resync策略下检查积压是否消化的间隔（秒）
+
+    def __init__(self, app, host='0.0.0.0', port=5001, mode=DEFAULT_SERVER_MODE, loop_count=1,
+                 max_connections_per_loop=None, send_high_water_mark=4 * 1024 * 1024, slow_client_policy='drop',
+                 compression=True, compression_options=None, coalesce_window_ms=0,
+                 ping_interval=30, pong_timeout=10, rate_limits=None, global_rate_limits=None,
+                 max_message_size=4 * 1024 * 1024, max_frame_size=2 * 1024 * 1024,
+                 db_workers=4, db_queue_limit=256, event_timeouts=None):
+        if mode not in self.MODES:
+            raise ValueError(f'不支持的WebSocket服务器模式: {mode}')
+        if slow_client_policy not in self.SLOW_CLIENT_POLICIES:
+            raise ValueError(f'不支持的慢客户端策略: {slow_client_policy}')
         self.app = app
         self.host = host
         self.port = port
+        self.mode = mode
+        self.loop_count = max(1, loop_count)
+        # 事件循环模式下每个循环的连接数上限，None为不限（select()实现的循环仍受SELECT_MAX_CONNECTIONS限制），
+        # 所有循环都满时新连接在accept后直接关闭
+        self.max_connections_per_loop = max_connections_per_loop
+        self.send_high_water_mark = send_high_water_mark  # 单个连接出站积压上限（字节）
+        self.slow_client_policy = slow_client_policy
+        # permessage-deflate：compression_options覆盖DEFAULT_DEFLATE_OPTIONS中的阈值、级别与上下文保留设置
+        self.compression = compression
+        self.compression_options = compression_options
+        self.compression_stats = CompressionStats()
+        # 广播合并窗口（毫秒），大于0时同一任务在窗口内的多次变更合并为一条批量推送
+        self.coalescer = (BroadcastCoalescer(self._broadcast_now, coalesce_window_ms / 1000)
+                          if coalesce_window_ms > 0 else None)
+        # 服务器主动心跳：连接空闲ping_interval秒后发送ping，pong_timeout秒内无回应则断开；ping_interval为0时关闭
+        self.heartbeat = (HeartbeatMonitor(self._send_ping, self._reap_idle_client, ping_interval, pong_timeout,
+                                           tick=min(1.0, pong_timeout / 4))
+                          if ping_interval > 0 else None)
+        # 按事件类型的令牌桶限流（连接级与全局），None使用默认配置，两者都为空字典时关闭
+        self.rate_limiter = (RateLimiter(rate_limits, global_rate_limits)
+                             if rate_limits != {} or global_rate_limits != {} else None)
+        self.max_message_size = max_message_size  # 单条消息（含所有分片、解压后）上限
+        self.max_frame_size = max_frame_size  # 单个帧的负载上限
         self.clients = set()
+        self._clients_lock = threading.Lock()
+        self._resync_pending = set()  # resync策略下暂停推送、等待积压消化的连接（由_clients_lock保护）
+        self._resync_watcher = None  # 有暂停推送的连接时运行的检查线程
+        # 订阅索引：分类 -> 订阅该分类的连接，None键下是未限定分类的连接（含未订阅的连接）
+        # 广播只访问相关分类下的连接，完成状态视图在候选连接上再过滤
+        self._category_index = {None: set()}
+        self._subscriptions = {}  # 连接 -> (分类集合, 完成状态集合)，空集合表示不限
         self.running = False
+        self.ready = threading.Event()  # 监听端口就绪后置位
+        self.loops = []
+        self._next_loop = 0
+        self.aio_loop = None
+        self._aio_stop = None
+        # 所有模式下事件的数据库操作都在有界线程池中执行，I/O线程不被数据库阻塞
+        # event_timeouts为 事件类型 -> 时间预算（秒），排队超过预算的事件不再执行
+        self.db_pool = DBWorkerPool(db_workers, db_queue_limit, event_timeouts)
+
+        # 运行统计，用于对比不同模式下的连接数与处理延迟
+        self.latencies = deque(maxlen=10000)  # 最近消息处理耗时（毫秒）
+        self.messages_handled = 0
+        self.slow_clients_dropped = 0
+        self.slow_clients_resynced = 0
+        self.idle_clients_reaped = 0
+        self.connections_refused = 0
+        self._stats_lock = threading.Lock()
 
     def add_client(self, websocket):
-        self.clients.add(websocket)
-        print(f'WebSocket客户端已连接: {len(self.clients)} 个客户端')
+        with self._clients_lock:
+            self.clients.add(websocket)
+            self._subscriptions[websocket] = (frozenset(), frozenset())
+            self._category_index[None].add(websocket)
+            count = len(self.clients)
+        if self.heartbeat:
+            self.heartbeat.track(websocket)
+        print(f'WebSocket客户端已连接: {count} 个客户端')
 
     def remove_client(self, websocket):
-        self.clients.discard(websocket)
-        print(f'WebSocket客户端已断开: {len(self.clients)} 个客户端')
+        with self._clients_lock:
+            if websocket not in self.clients:
+                return
+            self.clients.discard(websocket)
+            self._resync_pending.discard(websocket)
+            self._unindex_client(websocket)
+            self._subscriptions.pop(websocket, None)
+            count = len(self.clients)
+        if self.heartbeat:
+            self.heartbeat.untrack(websocket)
+        if self.rate_limiter:
+            self.rate_limiter.forget(websocket)
+        print(f'WebSocket客户端已断开: {count} 个客户端')
+
+    def _send_ping(self, client):
+        try:
+            client.send(encode_frame(b'', OPCODE_PING))
+        except Exception as e:
+            print(f'发送心跳失败: {e}')
+
+    def _reap_idle_client(self, client):
+        """心跳超时：断开无响应的连接"""
+        print(f'客户端 {getattr(client, "address", None)} 心跳超时，断开连接')
+        client.abort()
+        self.remove_client(client)
+        with self._stats_lock:
+            self.idle_clients_reaped += 1
+
+    def _unindex_client(self, websocket):
+        """从订阅索引中移除连接（需持有_clients_lock）"""
+        categories, _ = self._subscriptions.get(websocket, (frozenset(), frozenset()))
+        for category in categories or (None,):
+            subscribers = self._category_index.get(category)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers and category is not None:
+                    del self._category_index[category]
+
+    def subscribe(self, websocket, categories=(), completed=()):
+        """
+        设置连接的订阅：categories为关注的分类，completed为关注的完成状态视图（True/False），
+        都为空时接收全部推送；新订阅替换旧订阅
+        """
+        categories = frozenset(categories)
+        completed = frozenset(completed)
+        with self._clients_lock:
+            if websocket not in self.clients:
+                return
+            self._unindex_client(websocket)
+            self._subscriptions[websocket] = (categories, completed)
+            for category in categories or (None,):
+                self._category_index.setdefault(category, set()).add(websocket)
+
+    @staticmethod
+    def change_topics(change):
+        """
+        取出一条任务变更涉及的(分类, 完成状态)，返回None表示无法判断、需要推送给所有连接
+        更新和删除带有previous（变更前的分类与状态），让原来视图的订阅者也能收到任务离开的通知
+        """
+        states = [state for state in (change.get('task'), change.get('previous')) if state]
+        if not states:
+            return None
+        return {(state.get('category'), bool(state.get('completed'))) for state in states}
+
+    @staticmethod
+    def message_changes(message):
+        """批量推送中的变更列表，其它消息返回None"""
+        data = message.get('data', {})
+        if message.get('type') == 'sync_notification' and data.get('action') == 'batch':
+            return data.get('changes')
+        return None
+
+    @classmethod
+    def message_topics(cls, message):
+        """取出一条推送涉及的(分类, 完成状态)，批量推送为各条变更的并集；返回None表示需要推送给所有连接"""
+        if message.get('type') != 'sync_notification':
+            return None
+        changes = cls.message_changes(message)
+        topics = set()
+        for change in changes if changes is not None else [message.get('data', {})]:
+            change_topics = cls.change_topics(change)
+            if change_topics is None:
+                return None
+            topics.update(change_topics)
+        return topics
+
+    @staticmethod
+    def subscription_matches(subscription, topics):
+        """订阅(分类集合, 完成状态集合)是否关心这些(分类, 完成状态)"""
+        if topics is None:
+            return True
+        categories, completed = subscription
+        return any((not categories or category in categories) and (not completed or state in completed)
+                   for category, state in topics)
+
+    def subscribers_for(self, topics):
+        """按订阅索引找出关心这些(分类, 完成状态)的连接，开销与订阅者数量成正比"""
+        return [client for client, _ in self._match_subscribers(topics)]
+
+    def _match_subscribers(self, topics):
+        """返回[(连接, 订阅)]"""
+        with self._clients_lock:
+            if topics is None:
+                return [(client, self._subscriptions[client]) for client in self.clients]
+            candidates = set(self._category_index[None])
+            for category in {category for category, _ in topics}:
+                candidates.update(self._category_index.get(category, ()))
+            return [(client, self._subscriptions[client]) for client in candidates
+                    if self.subscription_matches(self._subscriptions[client], topics)]
+
+    def filter_message(self, message, subscription, change_topics):
+        """
+        按订阅过滤批量推送中的变更，只保留该订阅关心的变更；不限订阅或非批量推送原样返回
+        change_topics为与变更列表一一对应的涉及分类与状态
+        """
+        if change_topics is None or subscription == (frozenset(), frozenset()):
+            return message
+        changes = [change for change, topics in zip(self.message_changes(message), change_topics)
+                   if self.subscription_matches(subscription, topics)]
+        return {**message, 'data': {**message['data'], 'changes': changes}}
 
     def broadcast_to_all(self, message):
-        """向所有连接的客户端广播消息"""
-        if not self.clients:
+        """
+        向订阅了相关分类/视图的客户端广播消息（与任务无关的消息发给所有客户端）
+        开启合并窗口时任务变更先进入合并器，窗口结束后批量发出
+        """
+        if self.coalescer and self.coalescer.accepts(message):
+            self.coalescer.add(message)
             return
-        
-        message_str = json.dumps(message)
-        dead_clients = set()
-        
-        for client_socket in self.clients:
-            try:
-                self.send_to_client(client_socket, message_str, is_string=True)
-            except Exception as e:
-                print(f'广播消息失败: {e}')
-                dead_clients.add(client_socket)
-        
+        self._broadcast_now(message)
+
+    def _broadcast_now(self, message):
+        """
+        立即广播，返回接收者数量
+        消息按编码各序列化和组帧一次，同一个bytes放入每个连接的出站队列，由各连接的写端排空；
+        批量推送按订阅分组，每组只收到自己订阅范围内的变更，组内共享编码结果
+        """
+        if not self.clients:
+            return 0
+
+        recipients = self._match_subscribers(self.message_topics(message))
+        if not recipients:
+            return 0
+        changes = self.message_changes(message)
+        change_topics = [self.change_topics(change) for change in changes] if changes is not None else None
+        groups = {}  # 订阅 -> 连接列表（非批量推送所有连接为一组）
+        for client, subscription in recipients:
+            groups.setdefault(subscription if change_topics is not None else None, []).append(client)
+
+        dead_clients = []
+        for subscription, clients in groups.items():
+            group_message = self.filter_message(message, subscription, change_topics)
+            # 每种编码只序列化一次：编码名 -> (负载, 连接之间共享的帧（未压缩帧、无上下文压缩帧）)
+            encoded = {}
+            for client in clients:
+                try:
+                    codec = client.codec
+                    if codec.name not in encoded:
+                        encoded[codec.name] = (codec.encode(group_message), {})
+                    payload, frames = encoded[codec.name]
+                    if not self._enqueue_broadcast(client, payload, frames):
+                        dead_clients.append(client)
+                except Exception as e:
+                    print(f'广播消息失败: {e}')
+                    dead_clients.append(client)
+
         # 清理死连接
         for client in dead_clients:
             self.remove_client(client)
+        return len(recipients)
+
+    def _enqueue_broadcast(self, client, payload, frames):
+        """把广播放入连接的出站队列，超过高水位时按策略处理；返回False表示连接已被断开"""
+        with self._clients_lock:
+            paused = client in self._resync_pending
+        if paused:
+            self._finish_resync(client)
+            return True  # 暂停期间的推送直接跳过，客户端收到resync_required后会重新拉取
+
+        pending = client.pending_bytes()
+        if pending + len(payload) <= self.send_high_water_mark:
+            self.send_payload(client, payload, frames)
+            return True
+
+        if self.slow_client_policy == 'resync':
+            print(f'客户端出站积压 {pending} 字节，暂停推送等待重新同步')
+            with self._clients_lock:
+                self._resync_pending.add(client)
+                watcher = None
+                if self._resync_watcher is None:
+                    watcher = self._resync_watcher = threading.Thread(
+                        target=self._watch_resync, name='ws-resync', daemon=True)
+            if watcher:
+                watcher.start()
+            return True
+
+        print(f'客户端出站积压 {pending} 字节，断开慢客户端')
+        client.abort()
+        with self._stats_lock:
+            self.slow_clients_dropped += 1
+        return False
+
+    def _finish_resync(self, client):
+        """积压消化到高水位的一半以下时结束暂停并通知客户端重新同步，返回是否已结束"""
+        if client.pending_bytes() > self.send_high_water_mark // 2:
+            return False
+        with self._clients_lock:
+            if client not in self._resync_pending:
+                return True  # 已由其它线程结束
+            self._resync_pending.discard(client)
+        with self._stats_lock:
+            self.slow_clients_resynced += 1
+        self.send_to_client(client, {'type': 'resync_required', 'data': {}})
+        return True
+
+    def _watch_resync(self):
+        """定期检查暂停推送的连接，积压一消化就发送resync_required，不必等到下一次广播；没有暂停的连接时退出"""
+        while True:
+            time.sleep(self.RESYNC_CHECK_INTERVAL)
+            with self._clients_lock:
+                clients = list(self._resync_pending)
+                if not clients:
+                    self._resync_watcher = None
+                    return
+            for client in clients:
+                try:
+                    self._finish_resync(client)
+                except Exception as e:
+                    print(f'检查慢客户端积压失败: {e}')
 
     def start(self):
         """启动WebSocket服务器线程"""
+        if self.heartbeat:
+            self.heartbeat.start()
+        if self.mode == 'selector':
+            self._start_selector_server()
+            return
+        if self.mode == 'asyncio':
+            self._start_asyncio_server()
+            return
 
         def run_server():
             try:
@@ -67,7 +380,9 @@ class SimpleWebSocketServer:
                 server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
                 server_socket.bind((self.host, self.port))
                 server_socket.listen(5)
+                self.port = server_socket.getsockname()[1]
                 self.running = True
+                self.ready.set()
                 print(f'原生WebSocket服务器启动在 ws://{self.host}:{self.port}')
 
                 while self.running:
@@ -96,39 +411,34 @@ class SimpleWebSocketServer:
 
     def handle_client(self, client_socket, address):
         """处理单个WebSocket客户端"""
+        conn = SocketConnection(client_socket, address)
         try:
-            # WebSocket握手
-            data = client_socket.recv(1024).decode('utf-8')
-            if 'Sec-WebSocket-Key' in data:
-                # 执行WebSocket握手
-                lines = data.split('\r\n')  # 修复这里：使用转义字符
-                key_line = [line for line in lines if line.startswith('Sec-WebSocket-Key:')][0]
-                key = key_line.split(': ')[1]
-                accept_key = self.compute_accept_key(key)
-
-                response = (
-                        "HTTP/1.1 101 Switching Protocols\r\n"
-                        "Upgrade: websocket\r\n"
-                        "Connection: Upgrade\r\n"
-                        "Sec-WebSocket-Accept: " + accept_key + "\r\n\r\n"
-                )
-                client_socket.send(response.encode('utf-8'))
+            # WebSocket握手：读到请求头结束为止，同一次读取中请求头之后的帧数据留给解码器
+            request_text, data = self.read_handshake(conn)
+            response, negotiated = self.build_handshake_response(request_text) if request_text else (None, None)
+            if response:
+                conn.send(response)
+                self.prepare_connection(conn, negotiated)
 
                 # 添加到客户端列表
-                self.add_client(client_socket)
+                self.add_client(conn)
 
                 # 处理消息
                 while self.running:
                     try:
-                        data = client_socket.recv(1024)
                         if not data:
+                            data = conn.recv(65536)
+                            if not data:
+                                break
+
+                        # 增量解析WebSocket帧
+                        messages, keep_open = self.decode_frames(conn, conn.decoder, data)
+                        data = b''
+                        for message in messages:
+                            self.handle_message(conn, message)
+                        if not keep_open:
                             break
 
-                        # 解析WebSocket帧
-                        message = self.parse_websocket_frame(data)
-                        if message:
-                            self.handle_message(client_socket, message)
-
                     except Exception as e:
                         print(f'处理WebSocket消息错误: {e}')
                         break
@@ -136,8 +446,268 @@ class SimpleWebSocketServer:
         except Exception as e:
             print(f'WebSocket客户端处理错误: {e}')
         finally:
-            self.remove_client(client_socket)
-            client_socket.close()
+            self.remove_client(conn)
+            conn.close()
+
+    def read_handshake(self, conn):
+        """
+        线程模式下读取握手请求头，返回(请求头文本, 请求头之后已收到的字节)
+        连接关闭或请求头超过MAX_HANDSHAKE_SIZE时请求头文本为None
+        """
+        buffer = bytearray()
+        while True:
+            header_end = buffer.find(b'\r\n\r\n')
+            if header_end >= 0:
+                return buffer[:header_end + 4].decode('utf-8', errors='ignore'), bytes(buffer[header_end + 4:])
+            if len(buffer) > self.MAX_HANDSHAKE_SIZE:
+                return None, b''
+            chunk = conn.recv(4096)
+            if not chunk:
+                return None, b''
+            buffer.extend(chunk)
+
+    def build_handshake_response(self, request_text):
+        """
+        根据握手请求生成101响应及扩展协商结果
+        不是WebSocket握手时返回(None, None)
+        """
+        headers = {}
+        for line in request_text.split('\r\n')[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        key = headers.get('sec-websocket-key')
+        if not key:
+            return None, None
+        accept_key = self.compute_accept_key(key)
+
+        response = (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                "Sec-WebSocket-Accept: " + accept_key + "\r\n"
+        )
+
+        negotiated = {}
+        codec, protocol = negotiate_subprotocol(headers.get('sec-websocket-protocol'))
+        negotiated['codec'] = codec
+        if protocol:
+            response += "Sec-WebSocket-Protocol: " + protocol + "\r\n"
+
+        if self.compression:
+            deflate, extension_header = negotiate_deflate(
+                headers.get('sec-websocket-extensions'), self.compression_options, self.compression_stats)
+            if deflate:
+                response += "Sec-WebSocket-Extensions: " + extension_header + "\r\n"
+                negotiated['deflate'] = deflate
+
+        response += "\r\n"
+        return response.encode('utf-8'), negotiated
+
+    def prepare_connection(self, conn, negotiated):
+        """握手完成后按协商结果初始化连接的编解码状态"""
+        conn.deflate = negotiated.get('deflate')
+        conn.codec = negotiated.get('codec', JSON_CODEC)
+        conn.decoder = FrameDecoder(self.max_message_size, conn.deflate, self.max_frame_size)
+
+    def _start_selector_server(self):
+        """启动事件循环模式：所有连接由固定数量的selectors循环线程非阻塞处理"""
+        try:
+            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server_socket.bind((self.host, self.port))
+            server_socket.listen(socket.SOMAXCONN)
+            server_socket.setblocking(False)
+            self.port = server_socket.getsockname()[1]
+        except Exception as e:
+            print(f'启动WebSocket服务器失败: {e}')
+            return
+
+        self.loops = [EventLoop(name=f'ws-loop-{i}') for i in range(self.loop_count)]
+        self.loops[0].register(server_socket, selectors.EVENT_READ,
+                               lambda mask: self._accept_connections(server_socket))
+        for loop in self.loops:
+            loop.start()
+
+        self.running = True
+        self.ready.set()
+        print(f'原生WebSocket服务器启动在 ws://{self.host}:{self.port} '
+              f'(事件循环模式, {self.loop_count} 个循环)')
+
+    def _accept_connections(self, server_socket):
+        """接受所有就绪连接，并轮询分配到各个事件循环"""
+        while True:
+            try:
+                client_socket, address = server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self.running:
+                    print(f'WebSocket服务器错误: {e}')
+                return
+
+            loop = self._reserve_loop()
+            if loop is None:
+                with self._stats_lock:
+                    self.connections_refused += 1
+                print('WebSocket连接数已达上限，拒绝新连接')
+                client_socket.close()
+                continue
+            conn = LoopConnection(loop, client_socket, address,
+                                  on_data=self._on_connection_data,
+                                  on_close=self.remove_client)
+            if loop.in_loop_thread():
+                conn.attach()
+            else:
+                loop.call_soon_threadsafe(conn.attach)
+
+    def _reserve_loop(self):
+        """从轮询位置开始找一个还有连接名额的事件循环，都已满时返回None"""
+        for _ in range(len(self.loops)):
+            loop = self.loops[self._next_loop]
+            self._next_loop = (self._next_loop + 1) % len(self.loops)
+            if loop.reserve_connection(self.max_connections_per_loop):
+                return loop
+        return None
+
+    def _on_connection_data(self, conn, data):
+        """事件循环模式下处理连接上新到达的数据"""
+        if not conn.handshake_done:
+            buffer = conn.recv_buffer
+            buffer.extend(data)
+            header_end = buffer.find(b'\r\n\r\n')
+            if header_end < 0:
+                if len(buffer) > self.MAX_HANDSHAKE_SIZE:
+                    conn.close()
+                return
+            request_text = buffer[:header_end + 4].decode('utf-8', errors='ignore')
+            data = bytes(buffer[header_end + 4:])
+            buffer.clear()
+            response, negotiated = self.build_handshake_response(request_text)
+            if not response:
+                conn.close()
+                return
+            conn.send(response)
+            conn.handshake_done = True
+            self.prepare_connection(conn, negotiated)
+            self.add_client(conn)
+            if not data:
+                return
+
+        messages, keep_open = self.decode_frames(conn, conn.decoder, data)
+        for message in messages:
+            if conn.closed:
+                return
+            self.handle_message(conn, message)
+        if not keep_open:
+            conn.close()
+
+    def decode_frames(self, client_socket, decoder, data):
+        """
+        把收到的数据交给连接的解码器，并就地应答ping和关闭帧
+        返回(完整消息列表, 是否保持连接)：文本帧为JSON字符串，二进制帧按协商的子协议解码为对象
+        """
+        if self.heartbeat:
+            self.heartbeat.touch(client_socket)
+        try:
+            frames = decoder.feed(data)
+        except FrameError as e:
+            print(f'WebSocket帧错误: {e}')
+            client_socket.send(encode_close(e.close_code))
+            return [], False
+
+        messages = []
+        for opcode, payload in frames:
+            if opcode == OPCODE_TEXT:
+                messages.append(payload.decode('utf-8', errors='ignore'))
+            elif opcode == OPCODE_BINARY and client_socket.codec is not JSON_CODEC:
+                try:
+                    messages.append(client_socket.codec.decode(payload))
+                except CodecError as e:
+                    print(f'WebSocket消息解码失败: {e}')
+                    self.send_to_client(client_socket, {
+                        'type': 'error',
+                        'data': {'code': 'DECODE_ERROR', 'message': str(e)}
+                    })
+            elif opcode == OPCODE_PING:
+                client_socket.send(encode_frame(payload, OPCODE_PONG))
+            elif opcode == OPCODE_PONG:
+                if self.heartbeat:
+                    self.heartbeat.pong(client_socket)
+            elif opcode == OPCODE_CLOSE:
+                # 回显状态码完成关闭握手
+                client_socket.send(encode_frame(payload[:2], OPCODE_CLOSE))
+                return messages, False
+        return messages, True
+
+    def _start_asyncio_server(self):
+        """启动asyncio模式：在独立线程中运行asyncio事件循环"""
+
+        def run_loop():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self.aio_loop = loop
+            try:
+                loop.run_until_complete(self._serve_asyncio())
+            except Exception as e:
+                print(f'启动WebSocket服务器失败: {e}')
+            finally:
+                # 取消仍在处理连接的协程，让它们在循环关闭前完成清理
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.close()
+
+        server_thread = threading.Thread(target=run_loop, daemon=True)
+        server_thread.start()
+
+    async def _serve_asyncio(self):
+        self._aio_stop = asyncio.Event()
+        server = await asyncio.start_server(self._handle_stream, self.host, self.port,
+                                            backlog=socket.SOMAXCONN)
+        self.port = server.sockets[0].getsockname()[1]
+        self.running = True
+        self.ready.set()
+        print(f'原生WebSocket服务器启动在 ws://{self.host}:{self.port} (asyncio模式)')
+
+        async with server:
+            await self._aio_stop.wait()
+
+    async def _handle_stream(self, reader, writer):
+        """asyncio模式下处理单个WebSocket客户端"""
+        conn = None
+        try:
+            request_bytes = await reader.readuntil(b'\r\n\r\n')
+            response, negotiated = self.build_handshake_response(request_bytes.decode('utf-8', errors='ignore'))
+            if not response:
+                return
+            writer.write(response)
+
+            conn = AsyncConnection(asyncio.get_running_loop(), reader, writer,
+                                   writer.get_extra_info('peername'))
+            self.prepare_connection(conn, negotiated)
+            self.add_client(conn)
+
+            while self.running:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                messages, keep_open = self.decode_frames(conn, conn.decoder, data)
+                for message in messages:
+                    await self.handle_message_async(conn, message)
+                if not keep_open:
+                    break
+
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except Exception as e:
+            print(f'WebSocket客户端处理错误: {e}')
+        finally:
+            if conn:
+                self.remove_client(conn)
+                conn.closed = True
+            writer.close()
 
     def compute_accept_key(self, key):
         """计算WebSocket握手accept key"""
@@ -147,55 +717,99 @@ class SimpleWebSocketServer:
         ).decode('utf-8')
         return accept
 
-    def parse_websocket_frame(self, data):
-        """解析WebSocket数据帧"""
-        if len(data) < 2:
-            return None
-
-        # 第一个字节：FIN和操作码
-        first_byte = data[0]
-        fin = (first_byte & 0x80) != 0
-        opcode = first_byte & 0x0f
-
-        # 第二个字节：掩码和负载长度
-        second_byte = data[1]
-        masked = (second_byte & 0x80) != 0
-        payload_length = second_byte & 0x7f
-
-        offset = 2
-
-        # 扩展负载长度
-        if payload_length == 126:
-            payload_length = int.from_bytes(data[offset:offset + 2], 'big')
-            offset += 2
-        elif payload_length == 127:
-            payload_length = int.from_bytes(data[offset:offset + 8], 'big')
-            offset += 8
-
-        # 掩码
-        if masked:
-            mask = data[offset:offset + 4]
-            offset += 4
-        else:
-            mask = None
+    def handle_message(self, client_socket, message):
+        """处理接收到的WebSocket消息：限流检查后提交到数据库线程池，完成后在工作线程中发送结果"""
+        started = time.perf_counter()
+        message, future, rejected = self.submit_message(client_socket, message)
+        if rejected:
+            self.send_to_client(client_socket, rejected)
+            return
 
-        # 负载数据
-        payload = data[offset:offset + payload_length]
+        def deliver(done):
+            response, broadcast_message = self.job_result(done, message)
+            if broadcast_message:
+                self.broadcast_to_all(broadcast_message)
+            if response:
+                self.send_to_client(client_socket, response)
+            self.record_latency(started)
+
+        future.add_done_callback(deliver)
+
+    def submit_message(self, client, message):
+        """
+        解析消息、限流，然后把数据库操作提交到线程池，返回(解析后的消息, Future, 拒绝响应)
+        JSON字符串在这里解析一次，解析后的对象直接交给process_message
+        """
+        if isinstance(message, str):
+            try:
+                message = json.loads(message)
+            except ValueError:
+                pass  # 由process_message返回解析错误
+        message, rejected = self.check_rate_limit(client, message)
+        if rejected:
+            return message, None, rejected
+
+        event_type = message.get('type') if isinstance(message, dict) else None
+        try:
+            future = self.db_pool.submit(client, str(event_type), self.process_message, message, client)
+        except PoolBusy:
+            print(f'数据库线程池已满，拒绝事件: {event_type}')
+            return message, None, self.error_response('SERVER_BUSY', '服务器繁忙，请稍后重试', message)
+        return message, future, None
+
+    def job_result(self, future, message):
+        """取出线程池任务的结果，超时或异常时转换为error响应"""
+        try:
+            return future.result()
+        except JobTimeout:
+            return self.error_response('TIMEOUT', '服务器处理超时，请稍后重试', message), None
+        except Exception as e:
+            print(f'处理WebSocket消息失败: {e}')
+            return self.error_response('PROCESS_ERROR', f'处理消息失败: {str(e)}', message), None
 
-        # 如果有掩码，解码
-        if mask:
-            payload = bytes([b ^ mask[i % 4] for i, b in enumerate(payload)])
+    @staticmethod
+    def error_response(code, text, message=None):
+        data = message if isinstance(message, dict) else {}
+        return {
+            'type': 'error',
+            'data': {
+                'code': code,
+                'message': text,
+                'event': data.get('type'),
+                'requestId': data.get('requestId')
+            }
+        }
 
-        try:
-            return payload.decode('utf-8')
-        except:
-            return payload.decode('utf-8', errors='ignore')
+    def check_rate_limit(self, client, message):
+        """在任何数据库操作之前按事件类型限流，返回(待处理的消息, 拒绝响应)"""
+        if self.rate_limiter is None or not isinstance(message, dict):
+            return message, None
+
+        data = message
+        event_type = data.get('type')
+        wait = self.rate_limiter.check(client, str(event_type))
+        if not wait:
+            return data, None
+        return None, {
+            'type': 'error',
+            'data': {
+                'code': 'RATE_LIMITED',
+                'message': f'请求过于频繁，请{wait:.1f}秒后重试',
+                'event': event_type,
+                'retryAfter': round(wait, 3),
+                'requestId': data.get('requestId')
+            }
+        }
 
-    def handle_message(self, client_socket, message):
-        """处理接收到的WebSocket消息"""
+    def process_message(self, message, client=None):
+        """
+        执行消息对应的数据库操作，返回(回复消息, 广播消息)，本身不做网络I/O
+        message为JSON字符串或已解码的对象，client为发送消息的连接
+        在数据库线程池中调用：Flask-SQLAlchemy按应用上下文划分会话，每个任务使用独立的会话，退出上下文时移除
+        """
         with self.app.app_context():  # 添加应用上下文
             try:
-                data = json.loads(message)
+                data = json.loads(message) if isinstance(message, str) else message
                 event_type = data.get('type')
                 payload = data.get('data', {})
 
@@ -203,14 +817,28 @@ class SimpleWebSocketServer:
 
                 # 根据事件类型处理
                 if event_type == 'fetch_tasks':
-                    tasks = Task.query.order_by(Task.created_at.desc()).all()
+                    # 带since游标时只返回游标之后变更的任务和删除墓碑；全量拉取可用limit/cursor分页，
+                    # fields/summary只返回部分字段或content预览
+                    try:
+                        fields = parse_task_fields(payload.get('fields'))
+                    except ValueError as e:
+                        return self.error_response('INVALID_FIELDS', str(e), data), None
+                    limit = payload.get('limit')
+                    if limit is not None:
+                        try:
+                            limit = parse_page_limit(limit)
+                        except (TypeError, ValueError):
+                            return self.error_response('INVALID_LIMIT', 'limit必须是正整数', data), None
+                    try:
+                        tasks_data = fetch_tasks_data(payload.get('since'), limit,
+                                                      payload.get('cursor'), fields, bool(payload.get('summary')))
+                    except (TypeError, ValueError) as e:
+                        return self.error_response('INVALID_CURSOR', str(e), data), None
                     response = {
                         'type': 'tasks_data',
-                        'data': {
-                            'tasks': [task.to_dict() for task in tasks]
-                        }
+                        'data': tasks_data
                     }
-                    self.send_to_client(client_socket, response)
+                    return response, None
 
                 elif event_type == 'create_task':
                     # 创建任务逻辑
@@ -225,6 +853,7 @@ class SimpleWebSocketServer:
                             completed=task_data.get('completed', False)
                         )
                         db.session.add(new_task)
+                        record_task_change('create', new_task)
                         db.session.commit()
                         task_data = new_task.to_dict()
 
@@ -236,9 +865,7 @@ class SimpleWebSocketServer:
                                 'task': task_data
                             }
                         }
-                        self.broadcast_to_all(broadcast_message)
-
-                        # 发送创建响应给请求客户端
+                        # 创建响应发给请求客户端
                         response = {
                             'type': 'task_created',
                             'data': {
@@ -247,7 +874,7 @@ class SimpleWebSocketServer:
                             }
                         }
                         print(f'发送创建任务响应，requestId: {request_id}, task: {task_data}')
-                        self.send_to_client(client_socket, response)
+                        return response, broadcast_message
 
                 elif event_type == 'update_task':
                     # 更新任务逻辑
@@ -255,6 +882,7 @@ class SimpleWebSocketServer:
                     if task_id:
                         task = Task.query.get(task_id)
                         if task:
+                            previous = {'category': task.category, 'completed': task.completed}
                             # 从payload中获取任务数据
                             task_data = payload.get('task', payload)
                             
@@ -270,6 +898,7 @@ class SimpleWebSocketServer:
                                     task.completed_at = datetime.utcnow()
                                 else:
                                     task.completed_at = None
+                            record_task_change('update', task)
                             db.session.commit()
                             updated_task_data = task.to_dict()
 
@@ -278,12 +907,11 @@ class SimpleWebSocketServer:
                                 'type': 'sync_notification',
                                 'data': {
                                     'action': 'update',
-                                    'task': updated_task_data
+                                    'task': updated_task_data,
+                                    'previous': previous
                                 }
                             }
-                            self.broadcast_to_all(broadcast_message)
-
-                            # 发送更新响应给请求客户端
+                            # 更新响应发给请求客户端
                             response = {
                                 'type': 'task_updated',
                                 'data': {
@@ -291,7 +919,7 @@ class SimpleWebSocketServer:
                                     'requestId': data.get('requestId')
                                 }
                             }
-                            self.send_to_client(client_socket, response)
+                            return response, broadcast_message
 
                 elif event_type == 'delete_task':
                     # 删除任务逻辑
@@ -300,6 +928,7 @@ class SimpleWebSocketServer:
                         task = Task.query.get(task_id)
                         if task:
                             db.session.delete(task)
+                            record_task_change('delete', task)
                             db.session.commit()
 
                             response = {
@@ -309,7 +938,7 @@ class SimpleWebSocketServer:
                                     'requestId': data.get('requestId')
                                 }
                             }
-                            self.send_to_client(client_socket, response)
+                            return response, None
 
                 elif event_type == 'update_task_completed':
                     # 更新任务完成状态逻辑
@@ -319,33 +948,46 @@ class SimpleWebSocketServer:
                     if task_id is not None and completed is not None:
                         task = Task.query.get(task_id)
                         if task:
+                            previous = {'category': task.category, 'completed': task.completed}
                             task.completed = completed
                             if completed:
                                 task.completed_at = datetime.utcnow()
                             else:
                                 task.completed_at = None
+                            record_task_change('update', task)
                             db.session.commit()
+                            updated_task_data = task.to_dict()
 
+                            # 广播完成状态变更，开启合并窗口时批量勾选会合并为一条推送
+                            broadcast_message = {
+                                'type': 'sync_notification',
+                                'data': {
+                                    'action': 'update',
+                                    'task': updated_task_data,
+                                    'previous': previous
+                                }
+                            }
                             response = {
                                 'type': 'task_completed_updated',
                                 'data': {
-                                    'task': task.to_dict(),
+                                    'task': updated_task_data,
                                     'requestId': data.get('requestId')
                                 }
                             }
-                            self.send_to_client(client_socket, response)
+                            return response, broadcast_message
 
                 elif event_type == 'clear_all_tasks':
                     # 清空所有任务
                     try:
                         Task.query.delete()
+                        record_task_change('clear')
                         db.session.commit()
                         
                         response = {
                             'type': 'all_tasks_cleared',
                             'data': {}
                         }
-                        self.send_to_client(client_socket, response)
+                        return response, None
                     except Exception as e:
                         print(f'清空任务失败: {e}')
                         error_response = {
@@ -355,12 +997,88 @@ class SimpleWebSocketServer:
                                 'message': f'清空任务失败: {str(e)}'
                             }
                         }
-                        self.send_to_client(client_socket, error_response)
+                        return error_response, None
                         
+                elif event_type == 'sync_tasks':
+                    # 批量同步离线积压：一个事务、一次响应、一条合并后的广播
+                    try:
+                        result, changes = sync_tasks_data(payload.get('tasks', []))
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f'批量同步任务失败: {e}')
+                        error_response = {
+                            'type': 'error',
+                            'data': {
+                                'code': 'SYNC_ERROR',
+                                'message': f'批量同步失败: {str(e)}',
+                                'requestId': data.get('requestId')
+                            }
+                        }
+                        return error_response, None
+
+                    result['requestId'] = data.get('requestId')
+                    response = {'type': 'sync_result', 'data': result}
+                    broadcast_message = None
+                    if changes:
+                        broadcast_message = {
+                            'type': 'sync_notification',
+                            'data': {
+                                'action': 'batch',
+                                'changes': changes
+                            }
+                        }
+                    print(f'批量同步完成: {len(changes)} 条变更, {len(result["errors"])} 条错误, '
+                          f'{len(result["conflicts"])} 条冲突')
+                    return response, broadcast_message
+
+                elif event_type == 'subscribe':
+                    # 订阅分类/完成状态视图，之后只推送相关任务的变更；两者都为空表示订阅全部
+                    categories = payload.get('categories') or []
+                    completed = payload.get('completed') or []
+                    invalid = [category for category in categories if category not in TASK_CATEGORIES]
+                    if invalid or any(not isinstance(state, bool) for state in completed):
+                        error_response = {
+                            'type': 'error',
+                            'data': {
+                                'code': 'INVALID_SUBSCRIPTION',
+                                'message': f'无效的订阅: 分类必须是{TASK_CATEGORIES}之一，完成状态必须是true/false',
+                                'requestId': data.get('requestId')
+                            }
+                        }
+                        return error_response, None
+                    if client is not None:
+                        self.subscribe(client, categories, completed)
+                    response = {
+                        'type': 'subscribed',
+                        'data': {
+                            'categories': sorted(set(categories)),
+                            'completed': sorted(set(completed)),
+                            'requestId': data.get('requestId')
+                        }
+                    }
+                    return response, None
+
+                elif event_type == 'search_tasks':
+                    # 全文搜索，结果分页返回
+                    try:
+                        tasks, next_offset = search_tasks_data(payload)
+                    except (TypeError, ValueError) as e:
+                        return self.error_response('INVALID_QUERY', str(e), data), None
+                    response = {
+                        'type': 'search_results',
+                        'data': {
+                            'query': payload.get('query'),
+                            'tasks': [task.to_dict() for task in tasks],
+                            'nextOffset': next_offset,
+                            'requestId': data.get('requestId')
+                        }
+                    }
+                    return response, None
+
                 elif event_type == 'ping':
                     # 心跳响应
                     response = {'type': 'pong', 'data': {}}
-                    self.send_to_client(client_socket, response)
+                    return response, None
 
             except Exception as e:
                 print(f'处理WebSocket消息失败: {e}')
@@ -371,56 +1089,166 @@ class SimpleWebSocketServer:
                         'message': f'处理消息失败: {str(e)}'
                     }
                 }
-                self.send_to_client(client_socket, error_response)
+                return error_response, None
 
-    def send_to_client(self, client_socket, message, is_string=False):
-        """向特定客户端发送消息"""
+        return None, None
+
+    async def handle_message_async(self, conn, message):
+        """asyncio模式下处理消息：数据库操作在线程池中执行，不阻塞事件循环"""
+        started = time.perf_counter()
+        message, future, rejected = self.submit_message(conn, message)
+        if rejected:
+            await self.send_to_client_async(conn, rejected)
+            return
         try:
-            if not is_string:
-                json_message = json.dumps(message)
-            else:
-                json_message = message
-            frame = self.create_websocket_frame(json_message)
-            client_socket.send(frame)
+            await asyncio.wrap_future(future)
+        except Exception:
+            pass  # 异常由job_result转换为error响应
+        response, broadcast_message = self.job_result(future, message)
+        if broadcast_message:
+            await self.broadcast_to_all_async(broadcast_message)
+        if response:
+            await self.send_to_client_async(conn, response)
+        self.record_latency(started)
+
+    async def send_to_client_async(self, conn, message):
+        """asyncio模式下向特定客户端发送消息"""
+        try:
+            self.send_payload(conn, conn.codec.encode(message))
+            await conn.drain()
         except Exception as e:
             print(f'发送消息到客户端失败: {e}')
 
-    def create_websocket_frame(self, message):
-        """创建WebSocket数据帧"""
-        message_bytes = message.encode('utf-8')
-        message_length = len(message_bytes)
+    async def broadcast_to_all_async(self, message):
+        """asyncio模式下向所有连接的客户端广播消息（入队不等待，慢客户端由高水位处理）"""
+        self.broadcast_to_all(message)
+
+    def record_latency(self, started):
+        """记录一条消息的处理耗时"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self.latencies.append(elapsed_ms)
+            self.messages_handled += 1
+
+    def get_stats(self):
+        """返回连接数与消息处理延迟分位数"""
+        with self._stats_lock:
+            samples = sorted(self.latencies)
+            messages_handled = self.messages_handled
+
+        def percentile(pct):
+            if not samples:
+                return None
+            index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+            return round(samples[index], 3)
 
-        frame = bytearray()
+        return {
+            'mode': self.mode,
+            'connections': len(self.clients),
+            'messages_handled': messages_handled,
+            'slow_clients_dropped': self.slow_clients_dropped,
+            'slow_clients_resynced': self.slow_clients_resynced,
+            'idle_clients_reaped': self.idle_clients_reaped,
+            'connections_refused': self.connections_refused,
+            'rate_limited': dict(self.rate_limiter.rejected) if self.rate_limiter else {},
+            'db_pool': self.db_pool.stats(),
+            'compression': self.compression_stats.to_dict(),
+            'coalescing': self.coalescer.stats.to_dict() if self.coalescer else None,
+            'latency_ms': {
+                'p50': percentile(50),
+                'p95': percentile(95),
+                'p99': percentile(99),
+                'max': round(samples[-1], 3) if samples else None
+            }
+        }
 
-        # 第一个字节：FIN=1, 操作码=1 (文本)
-        frame.append(0x81)
+    def get_connection_stats(self):
+        """每个连接的地址、最近活动、心跳往返时间与出站积压"""
+        with self._clients_lock:
+            clients = list(self.clients)
+        connections = []
+        for client in clients:
+            address = getattr(client, 'address', None)
+            stats = {
+                'address': f'{address[0]}:{address[1]}' if isinstance(address, tuple) else address,
+                'pending_bytes': client.pending_bytes()
+            }
+            if self.heartbeat:
+                stats.update(self.heartbeat.snapshot(client) or {})
+            connections.append(stats)
+        return connections
 
-        # 负载长度
-        if message_length < 126:
-            frame.append(message_length)
-        elif message_length < 65536:
-            frame.append(126)
-            frame.extend(message_length.to_bytes(2, 'big'))
-        else:
-            frame.append(127)
-            frame.extend(message_length.to_bytes(8, 'big'))
+    def send_to_client(self, client_socket, message, is_string=False):
+        """向特定客户端发送消息"""
+        try:
+            if is_string:
+                message = json.loads(message)  # 按连接协商的子协议重新编码
+            self.send_payload(client_socket, client_socket.codec.encode(message))
+        except Exception as e:
+            print(f'发送消息到客户端失败: {e}')
 
-        # 负载数据
-        frame.extend(message_bytes)
+    def send_payload(self, client, payload, frames=None):
+        """
+        按连接协商的子协议（文本/二进制帧）和压缩参数组帧并放入出站队列
+        frames用于广播：未压缩帧和无上下文压缩帧与连接无关，只生成一次供所有连接共享
+        """
+        opcode = client.codec.opcode
+        deflate = client.deflate
+        if deflate is None or not deflate.should_compress(payload):
+            if frames is None:
+                return client.send_parts(encode_frame_parts(payload, opcode))
+            if 'plain' not in frames:
+                frames['plain'] = encode_frame(payload, opcode)
+            return client.send(frames['plain'])
+
+        if not deflate.server_context_takeover:
+            key = ('deflate', deflate.server_window_bits)
+            frame = frames.get(key) if frames is not None else None
+            if frame is None:
+                frame = encode_frame(deflate.compress(payload), opcode, rsv1=True)
+                if frames is not None:
+                    frames[key] = frame
+            return client.send(frame)
+
+        # 保留上下文时压缩结果依赖该连接之前发送的消息，压缩与入队必须原子地按顺序进行
+        with deflate.lock:
+            return client.send_parts(encode_frame_parts(deflate.compress(payload), opcode, rsv1=True))
 
-        return bytes(frame)
+    def create_websocket_frame(self, message):
+        """创建WebSocket文本数据帧"""
+        return encode_frame(message.encode('utf-8'), OPCODE_TEXT)
 
     def stop(self):
         """停止WebSocket服务器"""
         self.running = False
+        if self.coalescer:
+            self.coalescer.flush()
+        if self.heartbeat:
+            self.heartbeat.stop()
+        for loop in self.loops:
+            loop.stop()
+        if self.aio_loop and self._aio_stop:
+            self.aio_loop.call_soon_threadsafe(self._aio_stop.set)
+        self.db_pool.shutdown()
 
 
 # 初始化原生WebSocket服务器
-websocket_server = SimpleWebSocketServer(app, host='0.0.0.0', port=5001)
+websocket_server = SimpleWebSocketServer(app, host='0.0.0.0', port=5001, mode=DEFAULT_SERVER_MODE)
+
+# 跨进程变更总线：HTTP接口的写操作发布到总线，由运行WebSocket服务器的进程转发给客户端
+# 套接字放在instance目录下，使用同一数据目录的进程共用一条总线
+change_bus = ChangeBus(default_bus_address(app.instance_path))
 
 # 任务分类枚举
 TASK_CATEGORIES = ['任务', '想尝试', '提醒']
 
+# 任务列表分页
+DEFAULT_PAGE_SIZE = 100  # 只传cursor不传limit时的每页条数
+MAX_PAGE_SIZE = 500
+DEFAULT_SEARCH_LIMIT = 20
+# IN查询每批的参数个数，低于旧版SQLite默认999个绑定参数的上限
+SQLITE_MAX_VARIABLES = 500
+
 # 初始化邮件服务
 email_service = EmailService()
 
@@ -429,12 +1257,15 @@ _email_service_initialized = False
 
 
 class Task(db.Model):
+    # 列表按(created_at, id)倒序分页，复合索引使每一页都是一次索引范围扫描
+    __table_args__ = (db.Index('ix_task_created_at_id', 'created_at', 'id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=True)  # 选填标题
     content = db.Column(db.Text, nullable=False)  # 必填内容
     category = db.Column(db.String(50), nullable=False, default='任务')  # 分类
     completed = db.Column(db.Boolean, default=False)  # 完成状态
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 创建时间
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # 创建时间（分页键，不能为空）
     completed_at = db.Column(db.DateTime, nullable=True)  # 完成时间
 
     def to_dict(self):
@@ -449,6 +1280,13 @@ class Task(db.Model):
         }
 
 
+# 列表接口可投影的字段（与Task.to_dict一致），id始终返回
+TASK_FIELDS = ('id', 'title', 'content', 'category', 'completed', 'created_at', 'completed_at')
+SUMMARY_CONTENT_LENGTH = 100  # 摘要模式下content预览的字符数
+TASK_LIST_BATCH = 1000  # 流式读取时每批的行数
+EXPORT_CHUNK_ROWS = 500  # 导出时每块输出的行数
+
+
 # 邮件发送历史记录表
 class EmailLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -465,9 +1303,732 @@ class EmailLog(db.Model):
         }
 
 
+# 任务变更日志：每次创建、更新、删除、清空都追加一条，seq单调递增，用于增量同步
+# 每个任务只保留最新一条记录（删除的任务保留墓碑），清空时整表重置为一条clear记录，
+# 因此日志大小与任务数同阶，不随编辑次数增长
+class TaskChange(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}  # seq永不复用，服务器重启后游标依然有效
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)  # 变更序号
+    task_id = db.Column(db.Integer, nullable=True, index=True)  # 清空操作为空
+    action = db.Column(db.String(10), nullable=False)  # create/update/delete/clear
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)  # 变更时间
+
+
+def id_batches(ids):
+    """把ID列表按SQLITE_MAX_VARIABLES分批，用于IN查询"""
+    ids = list(ids)
+    for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+        yield ids[start:start + SQLITE_MAX_VARIABLES]
+
+
+def record_task_change(action, task=None):
+    """在当前事务中记录一次任务变更，需在commit之前调用"""
+    if action == 'clear':
+        TaskChange.query.delete()
+        db.session.add(TaskChange(action='clear'))
+        return
+
+    record_task_changes([(action, task)])
+
+
+def record_task_changes(changes):
+    """批量记录[(动作, 任务)]，旧记录按批删除，避免逐条查询"""
+    if any(task.id is None for _, task in changes):
+        db.session.flush()  # 新建任务需要先拿到自增ID
+    for batch in id_batches(task.id for _, task in changes):
+        TaskChange.query.filter(TaskChange.task_id.in_(batch)).delete(synchronize_session=False)
+    db.session.add_all([TaskChange(task_id=task.id, action=action) for action, task in changes])
+
+
+def current_change_seq():
+    """当前最大变更序号"""
+    return db.session.query(db.func.max(TaskChange.seq)).scalar() or 0
+
+
+# 任务内存缓存（可选）：环境变量 TODO_TASK_CACHE=1 开启，TODO_TASK_CACHE_MAX 为缓存的任务数上限
+task_cache = TaskCache(enabled=os.environ.get('TODO_TASK_CACHE') == '1',
+                       max_tasks=int(os.environ.get('TODO_TASK_CACHE_MAX', 100000)))
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_task_cache_changes(session, flush_context):
+    """
+    记录本次事务写入的任务变更，提交后直写进缓存
+    以变更日志为准：所有写入路径（HTTP、WebSocket、批量接口）都会记录TaskChange；
+    同时记下经由会话改动的任务，提交时若有未记录变更的改动则丢弃缓存，避免返回旧数据
+    """
+    if not task_cache.enabled:
+        return
+    info = session.info
+    touched = info.setdefault('task_cache_touched', set())
+    logged = info.setdefault('task_cache_logged', set())
+    pending = info.setdefault('task_cache_changes', [])
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Task):
+            touched.add(obj.id)
+    for change in session.new:
+        if not isinstance(change, TaskChange):
+            continue
+        logged.add(change.task_id)
+        if not task_cache.loaded:
+            continue
+        row = None
+        if change.action not in ('delete', 'clear'):
+            task = session.identity_map.get(identity_key(Task, change.task_id))
+            if task is None:
+                continue  # 不在会话中的任务交给读取前的增量追赶
+            row = (task.created_at, task.id, task.to_dict())
+        pending.append((change.seq, change.action, change.task_id, row))
+
+
+@event.listens_for(db.session, 'after_commit')
+def apply_task_cache_changes(session):
+    changes = session.info.pop('task_cache_changes', None)
+    touched = session.info.pop('task_cache_touched', set())
+    logged = session.info.pop('task_cache_logged', set())
+    if touched - logged and None not in logged:  # 清空操作的task_id为空，视为覆盖所有任务
+        task_cache.invalidate()
+    elif changes:
+        task_cache.apply(changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_task_cache_changes(session):
+    for key in ('task_cache_changes', 'task_cache_touched', 'task_cache_logged'):
+        session.info.pop(key, None)
+
+
+# 任务表重建（如测试中的drop_all/create_all）后变更序号从头开始，缓存随之作废
+event.listen(Task.__table__, 'after_create', lambda target, connection, **kw: task_cache.invalidate())
+
+
+def refresh_task_cache():
+    """
+    读取前确认缓存可用，返回是否可用
+    只比较一次数据库中的最大变更序号：与缓存一致时直接由内存返回；其它进程写入后按变更日志增量追上；
+    首次读取时整体加载，任务数超过上限时不缓存
+    """
+    if not task_cache.enabled:
+        return False
+    seq = current_change_seq()
+    if task_cache.loaded and seq == task_cache.seq:
+        return True
+    if not task_cache.loaded and task_cache.oversized_at == seq:
+        return False
+
+    if task_cache.loaded and seq > task_cache.seq:
+        changes = TaskChange.query.filter(TaskChange.seq > task_cache.seq).order_by(TaskChange.seq).all()
+        task_ids = [change.task_id for change in changes if change.action not in ('delete', 'clear')]
+        rows = {}
+        for batch in id_batches(task_ids):
+            rows.update((row[1], row) for row in project_tasks(Task.query.filter(Task.id.in_(batch))))
+        task_cache.catch_up([(change.seq, change.action, change.task_id, rows.get(change.task_id))
+                             for change in changes], seq)
+        return task_cache.loaded
+
+    # 首次读取，或变更序号回退（数据库被替换）时整体加载
+    if Task.query.count() > task_cache.max_tasks:
+        task_cache.mark_oversized(seq)
+        print(f'任务数超过缓存上限 {task_cache.max_tasks}，读取将直接查询数据库')
+        return False
+    task_cache.reset(project_tasks(Task.query), seq)
+    return True
+
+
+def search_tasks_data(params):
+    """
+    解析搜索参数并执行搜索，返回(本页任务, 下一页的offset)，没有下一页时offset为None
+    params包含query、category、completed、limit、offset，参数无效时抛出ValueError
+    """
+    query = params.get('query')
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError('搜索关键词不能为空')
+    category = params.get('category') or None
+    if category is not None and category not in TASK_CATEGORIES:
+        raise ValueError('无效的分类')
+    completed = params.get('completed')
+    if completed is not None and not isinstance(completed, bool):
+        raise ValueError('completed必须是true/false')
+    limit = parse_page_limit(params.get('limit') or DEFAULT_SEARCH_LIMIT)
+    offset = int(params.get('offset') or 0)
+    if offset < 0:
+        raise ValueError('offset不能小于0')
+
+    tasks, has_more = search_tasks(query, category, completed, limit, offset)
+    return tasks, offset + limit if has_more else None
+
+
+def task_version(task_id=None):
+    """
+    任务数据的版本号，用于ETag：不传task_id时为全局最大变更序号，否则为该任务最近一次变更的序号
+    （变更日志早于该任务时退回全局序号）。所有写入路径（HTTP与WebSocket）都会记录变更，
+    且序号存在数据库中，多个工作进程之间同样一致；只走主键/task_id索引，不读取任务表
+    """
+    if task_id is not None:
+        seq = db.session.query(db.func.max(TaskChange.seq)).filter(TaskChange.task_id == task_id).scalar()
+        if seq:
+            return seq
+    return current_change_seq()
+
+
+def json_response(body):
+    return app.response_class(body, mimetype='application/json')
+
+
+def conditional_json(etag, build):
+    """
+    带强ETag的JSON响应：If-None-Match命中时直接返回304，不调用build
+    压缩后的表示ETag带编码后缀，客户端携带任一表示的ETag都视为命中，304中返回它携带的那个
+    build可以返回数据或已拼好的响应；数据与任务缓存中的JSON片段使用同一编码（TaskCache.encode），
+    缓存与数据库两条路径在同一个强ETag下的响应字节完全一致
+    """
+    matched = next((tag for tag in representation_etags(etag) if request.if_none_match.contains(tag)), None)
+    if matched:
+        response = app.response_class(status=304)
+        response.set_etag(matched)
+        return response
+    result = build()
+    response = result if isinstance(result, app.response_class) else json_response(TaskCache.encode(result))
+    response.set_etag(etag)
+    return response
+
+
+def parse_task_fields(fields):
+    """解析fields参数（逗号分隔的字符串或数组），为空时返回全部字段，包含未知字段时抛出ValueError"""
+    if not fields:
+        return TASK_FIELDS
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+        raise ValueError('fields必须是字段名列表')
+    fields = {field.strip() for field in fields if field.strip()}
+    unknown = fields - set(TASK_FIELDS)
+    if unknown:
+        raise ValueError(f'未知字段: {", ".join(sorted(unknown))}，可选字段为{list(TASK_FIELDS)}')
+    return tuple(field for field in TASK_FIELDS if field == 'id' or field in fields)
+
+
+def project_tasks(query, fields=TASK_FIELDS, summary=False):
+    """
+    列表接口的快速序列化：只查询投影需要的列，按批流式读取元组并直接编码，不构造ORM对象；
+    逐行生成(created_at, id, 任务字典)，前两项供分页游标和排序使用。
+    全部字段且非摘要时字典与Task.to_dict()完全一致；summary时content在SQL中截断为预览，
+    并附带content_truncated，完整内容通过GET /api/tasks/<id>获取
+    """
+    extra = [field for field in fields if field not in ('id', 'created_at')]
+    columns = [Task.created_at, Task.id] + [
+        db.func.substr(Task.content, 1, SUMMARY_CONTENT_LENGTH + 1) if field == 'content' and summary
+        else getattr(Task, field) for field in extra
+    ]
+    rows = query.with_entities(*columns).yield_per(TASK_LIST_BATCH)
+
+    if fields == TASK_FIELDS and not summary:
+        # 默认投影按固定列顺序直接解包，逐行开销最小
+        for created_at, task_id, title, content, category, completed, completed_at in rows:
+            yield created_at, task_id, {
+                'id': str(task_id),
+                'title': title,
+                'content': content,
+                'category': category,
+                'completed': completed,
+                'created_at': created_at.isoformat() if created_at else None,
+                'completed_at': completed_at.isoformat() if completed_at else None
+            }
+        return
+
+    with_created_at = 'created_at' in fields
+    for created_at, task_id, *values in rows:
+        task = {'id': str(task_id)}
+        if with_created_at:
+            task['created_at'] = created_at.isoformat() if created_at else None
+        for field, value in zip(extra, values):
+            if field == 'completed_at':
+                value = value.isoformat() if value else None
+            elif field == 'content' and summary:
+                task['content_truncated'] = value is not None and len(value) > SUMMARY_CONTENT_LENGTH
+                value = value[:SUMMARY_CONTENT_LENGTH] if value else value
+            task[field] = value
+        yield created_at, task_id, task
+
+
+def iter_task_dicts(query, fields=TASK_FIELDS, summary=False):
+    """按投影逐行生成任务字典，query的过滤、排序、分页条件保持不变"""
+    return (task for _, _, task in project_tasks(query, fields, summary))
+
+
+def encode_page_cursor(created_at, task_id):
+    """分页游标：对客户端不透明，内容为最后一条任务的(created_at, id)"""
+    raw = f'{created_at.isoformat()}|{task_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_cursor(cursor):
+    """解析分页游标，无效时抛出ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, task_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('无效的分页游标') from e
+
+
+def parse_page_limit(limit):
+    """解析每页条数，限制在1到MAX_PAGE_SIZE之间，无效时抛出ValueError"""
+    limit = int(limit)
+    if limit < 1:
+        raise ValueError('limit必须大于0')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def paginate_tasks(query, limit, cursor=None, fields=TASK_FIELDS, summary=False):
+    """
+    按(created_at, id)倒序的键集分页，返回(本页任务字典, 下一页游标)，没有下一页时游标为None
+    不使用OFFSET，翻到任意一页的耗时都与页大小相关而与总任务数无关
+    """
+    query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    if cursor:
+        created_at, task_id = decode_page_cursor(cursor)
+        query = query.filter(db.tuple_(Task.created_at, Task.id) < (created_at, task_id))
+    rows = list(project_tasks(query.limit(limit + 1), fields, summary))  # 多取一条判断是否还有下一页
+    tasks = [task for _, _, task in rows[:limit]]
+    if len(rows) > limit:
+        return tasks, encode_page_cursor(*rows[limit - 1][:2])
+    return tasks, None
+
+
+def list_tasks_cached(category=None, completed=None, limit=None, cursor=None):
+    """
+    由缓存返回默认投影的任务列表，返回(缓存条目, 下一页游标)，缓存不可用时返回None
+    条目为(排序键, 任务字典, JSON片段, 变更序号)；一致性检查模式下与数据库查询结果比较
+    """
+    if not refresh_task_cache():
+        return None
+    before = TaskCache.sort_key(*decode_page_cursor(cursor)) if cursor else None
+    entries, has_more = task_cache.list(category, completed, limit, before)
+    next_cursor = encode_page_cursor(*entries[-1][0]) if has_more else None
+
+    if task_cache.verify:
+        query = task_query(category, completed)
+        if limit is None:
+            expected = list(iter_task_dicts(query.order_by(Task.created_at.desc(), Task.id.desc()))), None
+        else:
+            expected = paginate_tasks(query, limit, cursor)
+        task_cache.check(([entry[1] for entry in entries], next_cursor), expected, '任务列表')
+    return entries, next_cursor
+
+
+def get_task_cached(task_id):
+    """由缓存返回单个任务字典，返回(是否使用了缓存, 任务字典或None)"""
+    if not refresh_task_cache():
+        return False, None
+    task = task_cache.get(task_id)
+    if task_cache.verify:
+        expected = db.session.get(Task, task_id)
+        task_cache.check(task, expected.to_dict() if expected else None, f'任务{task_id}')
+    return True, task
+
+
+def fetch_tasks_data(since=None, limit=None, page_cursor=None, fields=TASK_FIELDS, summary=False):
+    """
+    生成fetch_tasks的响应数据
+    since为空、无效或早于最近一次清空时返回全量列表（incremental为False），
+    否则只返回since之后变更的任务和被删除任务的ID，cursor为下次请求应携带的游标
+    全量列表可用limit/page_cursor分页，nextCursor为下一页的分页游标（没有下一页时为None）；
+    fields/summary为任务字段投影和摘要模式（见project_tasks）。分页参数无效时抛出ValueError
+    """
+    cursor = current_change_seq()
+
+    try:
+        since = int(since) if since is not None else None
+    except (TypeError, ValueError):
+        since = None
+
+    if since and since <= cursor:
+        changes = TaskChange.query.filter(TaskChange.seq > since).order_by(TaskChange.seq).all()
+        if not any(change.action == 'clear' for change in changes):
+            changed_ids = [change.task_id for change in changes if change.action != 'delete']
+            rows = []
+            for batch in id_batches(changed_ids):
+                rows.extend(project_tasks(Task.query.filter(Task.id.in_(batch)), fields, summary))
+            rows.sort(key=lambda row: row[0] or datetime.min, reverse=True)
+            return {
+                'tasks': [task for _, _, task in rows],
+                'deleted': [str(change.task_id) for change in changes if change.action == 'delete'],
+                'cursor': max([cursor] + [change.seq for change in changes]),
+                'incremental': True
+            }
+
+    if limit is not None or page_cursor:
+        limit = parse_page_limit(limit if limit is not None else DEFAULT_PAGE_SIZE)
+    cached = list_tasks_cached(limit=limit, cursor=page_cursor) if fields == TASK_FIELDS and not summary else None
+    if cached is not None:
+        tasks, next_cursor = [entry[1] for entry in cached[0]], cached[1]
+    elif limit is None:
+        tasks = list(iter_task_dicts(Task.query.order_by(Task.created_at.desc(), Task.id.desc()), fields, summary))
+        next_cursor = None
+    else:
+        tasks, next_cursor = paginate_tasks(Task.query, limit, page_cursor, fields, summary)
+    return {
+        'tasks': tasks,
+        'deleted': [],
+        'cursor': cursor,
+        'nextCursor': next_cursor,
+        'incremental': False
+    }
+
+
+def parse_client_time(value):
+    """解析客户端的ISO时间（可带Z或时区），统一转换为不带时区的UTC时间，无效时返回None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def apply_task_fields(task, task_data):
+    """把客户端提交的字段写入任务对象"""
+    if 'content' in task_data:
+        task.content = task_data['content']
+    if 'title' in task_data:
+        task.title = task_data['title']
+    if 'category' in task_data:
+        task.category = task_data['category']
+    if 'completed' in task_data:
+        task.completed = bool(task_data['completed'])
+        if task.completed:
+            task.completed_at = parse_client_time(task_data.get('completed_at')) or datetime.utcnow()
+        else:
+            task.completed_at = None
+
+
+def task_field_error(task_data, creating=False):
+    """
+    检查客户端提交的任务字段，不合法时返回(错误码, 说明)，合法时返回None
+    新建任务时content必填、category可省略；提交了的字段都要求类型正确，分类必须是TASK_CATEGORIES之一
+    """
+    if creating or 'content' in task_data:
+        content = task_data.get('content')
+        if not isinstance(content, str) or not content.strip():
+            return 'INVALID_TASK', 'content必须是非空字符串'
+    if task_data.get('title') is not None and not isinstance(task_data['title'], str):
+        return 'INVALID_TASK', 'title必须是字符串'
+    if 'category' in task_data and task_data['category'] not in TASK_CATEGORIES \
+            and not (creating and task_data['category'] is None):
+        return 'INVALID_CATEGORY', f'分类必须是{TASK_CATEGORIES}之一'
+    if 'completed' in task_data and not isinstance(task_data['completed'], bool):
+        return 'INVALID_TASK', 'completed必须是true/false'
+    return None
+
+
+def sync_tasks_data(items):
+    """
+    批量同步客户端离线积压的任务，在同一个事务中完成，返回(sync_result数据, 变更列表)
+    - id为服务器ID且任务存在时更新（deleted为true时删除），否则按新任务创建，原id作为tempId返回
+    - 冲突检测：客户端带updated_at且服务器在此之后修改过该任务时，以服务器为准并放入conflicts；
+      未带updated_at的修改按客户端优先直接应用
+    - 单条数据不合法（字段类型错误、分类无效、引用了本批次中已删除的任务）时记录到errors，不影响其它任务
+    """
+    errors = []
+    conflicts = []
+    synced = []
+    pending = []  # [(动作, 任务, 原始数据, 变更前的分类与状态)]
+    deleted_ids = set()  # 本批次中已删除的任务ID
+
+    def reject(index, item_id, code, message):
+        errors.append({'index': index, 'id': item_id, 'code': code, 'message': message})
+
+    if not isinstance(items, list):
+        raise ValueError('tasks必须是数组')
+
+    # 一次性预取涉及的任务和它们最近一次变更的时间
+    server_ids = set()
+    for item in items:
+        if isinstance(item, dict):
+            try:
+                server_ids.add(int(item.get('id')))
+            except (TypeError, ValueError):
+                pass
+    existing = {}
+    changed_at = {}
+    for batch in id_batches(server_ids):
+        existing.update((task.id, task) for task in Task.query.filter(Task.id.in_(batch)))
+        changed_at.update(db.session.query(TaskChange.task_id, TaskChange.changed_at)
+                          .filter(TaskChange.task_id.in_(batch)))
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            reject(index, None, 'INVALID_TASK', '任务格式错误')
+            continue
+
+        client_id = item.get('id')
+        try:
+            server_id = int(client_id)
+        except (TypeError, ValueError):
+            server_id = None
+        if server_id in deleted_ids:
+            reject(index, client_id, 'TASK_DELETED', '任务已在本次同步中删除')
+            continue
+        task = existing.get(server_id)
+
+        if task is not None:
+            previous = {'category': task.category, 'completed': task.completed}
+            client_time = parse_client_time(item.get('updated_at'))
+            server_time = changed_at.get(task.id)
+            if client_time and server_time and server_time > client_time:
+                conflicts.append({'index': index, 'id': str(task.id), 'task': task.to_dict()})
+                continue
+            if item.get('deleted'):
+                db.session.delete(task)
+                del existing[task.id]
+                deleted_ids.add(task.id)
+                pending.append(('delete', task, item, previous))
+                continue
+            error = task_field_error(item)
+            if error:
+                reject(index, client_id, *error)
+                continue
+            apply_task_fields(task, item)
+            pending.append(('update', task, item, previous))
+            continue
+
+        if item.get('deleted'):
+            # 客户端删除了服务器上已不存在的任务，视为已同步
+            continue
+        error = task_field_error(item, creating=True)
+        if error:
+            reject(index, client_id, *error)
+            continue
+        task = Task(
+            title=item.get('title'),
+            content=item['content'],
+            category=item.get('category') or '任务',
+            created_at=parse_client_time(item.get('created_at')) or datetime.utcnow()
+        )
+        apply_task_fields(task, {'completed': item.get('completed', False),
+                                 'completed_at': item.get('completed_at')})
+        db.session.add(task)
+        pending.append(('create', task, item, None))
+
+    changes = []
+    if pending:
+        record_task_changes([(action, task) for action, task, _, _ in pending])
+        db.session.flush()
+        # 在提交前序列化：提交后对象会过期，逐个访问会触发上千次重新查询
+        for action, task, item, previous in pending:
+            if action == 'delete':
+                changes.append({'action': 'delete', 'id': str(task.id), 'previous': previous})
+                continue
+            task_data = task.to_dict()
+            change = {'action': action, 'task': task_data}
+            if previous:
+                change['previous'] = previous
+            changes.append(change)
+            if action == 'create' and item.get('id') is not None:
+                task_data = {**task_data, 'tempId': str(item['id'])}
+            synced.append(task_data)
+    cursor = current_change_seq()
+    db.session.commit()
+
+    result = {
+        'success': not errors,
+        'syncedTasks': synced,
+        'deleted': [change['id'] for change in changes if change['action'] == 'delete'],
+        'conflicts': conflicts,
+        'errors': errors,
+        'cursor': cursor
+    }
+    return result, changes
+
+
+BATCH_OPERATIONS = ('create', 'update', 'complete', 'delete')
+MAX_BATCH_SIZE = 1000  # 单次批量请求的条目总数上限
+
+
+def batch_item_error(index, item_id, code, message):
+    return {'index': index, 'id': item_id, 'status': 'error', 'code': code, 'message': message}
+
+
+def apply_task_batch(data):
+    """
+    在同一个事务中批量创建、更新、完成/取消完成、删除任务，返回(每条结果, 变更列表)
+    data为 {"create": [...], "update": [...], "complete": [...], "delete": [...]}，按此顺序执行；
+    complete总是设置为明确的值而不是切换：条目为{"id", "completed"}，只给ID或省略completed表示true，
+    同一任务出现多次时按请求顺序以最后一条为准；
+    单条数据不合法时该条返回error，其它条目照常执行。格式错误时抛出ValueError
+    """
+    if not isinstance(data, dict):
+        raise ValueError('请求数据必须是对象')
+    operations = {operation: data.get(operation) or [] for operation in BATCH_OPERATIONS}
+    if any(not isinstance(items, list) for items in operations.values()):
+        raise ValueError(f'{"/".join(BATCH_OPERATIONS)}必须是数组')
+    if sum(len(items) for items in operations.values()) > MAX_BATCH_SIZE:
+        raise ValueError(f'单次最多{MAX_BATCH_SIZE}条')
+
+    def item_id(item):
+        value = item.get('id') if isinstance(item, dict) else item
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    # 一次性预取更新、完成、删除涉及的任务
+    task_ids = {item_id(item) for operation in ('update', 'complete', 'delete')
+                for item in operations[operation]} - {None}
+    existing = {}
+    for batch in id_batches(task_ids):
+        existing.update((task.id, task) for task in Task.query.filter(Task.id.in_(batch)))
+
+    results = {operation: [] for operation in BATCH_OPERATIONS}
+    previous = {}  # 任务ID -> 本批次修改前的分类与状态
+    final_action = {}  # 任务ID -> 本批次对它的最终动作，每个任务只记录一条变更
+    created = []
+
+    for index, item in enumerate(operations['create']):
+        if not isinstance(item, dict):
+            results['create'].append(batch_item_error(index, None, 'INVALID_TASK', '任务格式错误'))
+            continue
+        error = task_field_error(item, creating=True)
+        if error:
+            results['create'].append(batch_item_error(index, None, *error))
+            continue
+        task = Task(title=item.get('title'), content=item['content'], category=item.get('category') or '任务',
+                    completed=item.get('completed', False))
+        if task.completed:
+            task.completed_at = datetime.utcnow()
+        created.append((index, task))
+        results['create'].append(None)  # 拿到ID后填入
+    db.session.add_all([task for _, task in created])
+
+    def lookup(operation, index, item):
+        task = existing.get(item_id(item))
+        if task is None:
+            raw_id = item.get('id') if isinstance(item, dict) else item
+            results[operation].append(batch_item_error(index, raw_id, 'NOT_FOUND', '任务不存在'))
+            return None
+        previous.setdefault(task.id, {'category': task.category, 'completed': task.completed})
+        return task
+
+    for index, item in enumerate(operations['update']):
+        task = lookup('update', index, item) if isinstance(item, dict) else None
+        if task is None:
+            if not isinstance(item, dict):
+                results['update'].append(batch_item_error(index, None, 'INVALID_TASK', '任务格式错误'))
+            continue
+        fields = {key: item[key] for key in ('content', 'title', 'category') if key in item}
+        error = task_field_error(fields)
+        if error:
+            results['update'].append(batch_item_error(index, str(task.id), *error))
+            continue
+        apply_task_fields(task, fields)
+        final_action[task.id] = 'update'
+        results['update'].append({'index': index, 'id': str(task.id), 'status': 'ok'})
+
+    # 按请求顺序记录每个任务最终的完成状态，再按目标值分组，每组一条UPDATE语句
+    target = {}
+    for index, item in enumerate(operations['complete']):
+        task = lookup('complete', index, item)
+        if task is None:
+            continue
+        completed = item.get('completed', True) if isinstance(item, dict) else True
+        if not isinstance(completed, bool):
+            results['complete'].append(batch_item_error(index, str(task.id), 'INVALID_TASK', 'completed必须是true/false'))
+            continue
+        target[task.id] = completed
+        final_action[task.id] = 'update'
+        results['complete'].append({'index': index, 'id': str(task.id), 'status': 'ok'})
+    completion = {True: [], False: []}
+    for task_id, completed in target.items():
+        completion[completed].append(task_id)
+
+    db.session.flush()  # 先写入新建和修改的任务，再执行批量UPDATE/DELETE
+    now = datetime.utcnow()
+    for completed, ids in completion.items():
+        for batch in id_batches(ids):
+            Task.query.filter(Task.id.in_(batch)).update(
+                {'completed': completed, 'completed_at': now if completed else None},
+                synchronize_session='evaluate')  # 同步会话中已加载的对象，便于后面序列化
+
+    deleted = []
+    for index, item in enumerate(operations['delete']):
+        task = lookup('delete', index, item)
+        if task is None:
+            continue
+        if final_action.get(task.id) != 'delete':
+            deleted.append(task.id)
+        final_action[task.id] = 'delete'
+        results['delete'].append({'index': index, 'id': str(task.id), 'status': 'ok'})
+    for batch in id_batches(deleted):
+        Task.query.filter(Task.id.in_(batch)).delete(synchronize_session=False)
+
+    changes = []
+    pending = [('create', task) for _, task in created] + \
+              [(action, existing[task_id]) for task_id, action in final_action.items()]
+    if pending:
+        record_task_changes(pending)
+        db.session.flush()
+        # 在提交前序列化：提交后对象会过期，逐个访问会触发重新查询
+        for index, task in created:
+            task_data = task.to_dict()
+            results['create'][index] = {'index': index, 'id': task_data['id'], 'status': 'ok', 'task': task_data}
+            changes.append({'action': 'create', 'task': task_data})
+        for task_id, action in final_action.items():
+            if action == 'delete':
+                changes.append({'action': 'delete', 'id': str(task_id), 'previous': previous[task_id]})
+            else:
+                changes.append({'action': 'update', 'task': existing[task_id].to_dict(),
+                                'previous': previous[task_id]})
+        for operation in ('update', 'complete'):
+            for result in results[operation]:
+                if result['status'] == 'ok' and final_action[int(result['id'])] != 'delete':
+                    result['task'] = existing[int(result['id'])].to_dict()
+    db.session.commit()
+    return results, changes
+
+
+# 初始化全文搜索索引（需在create_all之前注册，新建任务表时一并创建索引）
+init_search(app, db, Task)
+
+# 旧版本数据库中created_at可以为空时，用触发器实现非空约束（SQLite不能给已有列加NOT NULL）
+CREATED_AT_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS task_created_at_{name} BEFORE {operation} ON task WHEN new.created_at IS NULL BEGIN
+        SELECT RAISE(ABORT, 'NOT NULL constraint failed: task.created_at');
+    END
+    """
+    for name, operation in (('bi', 'INSERT'), ('bu', 'UPDATE OF created_at'))
+]
+
+
+def require_task_created_at(connection):
+    """
+    迁移旧版本数据库：created_at为空的任务无法编码分页游标，也不满足(created_at, id)键集比较，会在翻页时丢失。
+    把空值补为datetime.min（排在列表最后，与缓存的排序键一致），列仍允许为空时再加上非空触发器
+    """
+    table = Task.__table__
+    connection.execute(table.update().where(table.c.created_at.is_(None)).values(created_at=datetime.min))
+    if connection.dialect.name != 'sqlite':
+        return
+    columns = connection.exec_driver_sql('PRAGMA table_info(task)').mappings()
+    if any(column['name'] == 'created_at' and not column['notnull'] for column in columns):
+        # 在搜索索引的触发器之后创建，见task_search.create_index
+        for trigger in CREATED_AT_TRIGGERS:
+            connection.exec_driver_sql(trigger)
+
+
 # 初始化数据库
 with app.app_context():
     db.create_all()
+    # create_all不会给已存在的表补建索引，旧数据库在这里补上分页索引
+    for index in Task.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    with db.engine.begin() as connection:
+        require_task_created_at(connection)
 
 def init_email_service_once():
     """延迟初始化邮件服务，防止Flask重启时重复调用"""
@@ -522,12 +2083,14 @@ def index():
                 'update_task': '/api/tasks/<id> (PUT)',
                 'delete_task': '/api/tasks/<id> (DELETE)',
                 'complete_task': '/api/tasks/<id>/complete (PUT)',
+                'websocket_stats': '/api/websocket/stats',
+                'websocket_connections': '/api/websocket/connections',
                 'test_email': '/api/send-test-email (POST)'
             },
             'websocket_events': [
                 'connect', 'disconnect', 'fetch_tasks',
                 'create_task', 'update_task', 'delete_task',
-                'toggle_complete', 'sync_tasks', 'ping'
+                'toggle_complete', 'sync_tasks', 'subscribe', 'search_tasks', 'ping'
             ]
         }
 
@@ -549,22 +2112,71 @@ def index():
 
 # API接口
 
-# 获取任务列表
-@app.route('/api/tasks', methods=['GET'])
-def get_tasks():
-    category = request.args.get('category', type=str)
-    completed = request.args.get('completed', type=lambda v: v.lower() == 'true')
+def task_filters(args):
+    """从查询参数中取出(category, completed)过滤条件，无效的分类视为不过滤"""
+    category = args.get('category', type=str)
+    completed = args.get('completed', type=lambda v: v.lower() == 'true')
+    return (category if category in TASK_CATEGORIES else None), completed
+
 
+def task_query(category=None, completed=None):
     query = Task.query
 
-    if category and category in TASK_CATEGORIES:
+    if category:
         query = query.filter_by(category=category)
 
     if completed is not None:
         query = query.filter_by(completed=completed)
+    return query
+
+
+def filter_tasks_query(args):
+    """按查询参数中的category、completed过滤任务（列表与导出接口共用）"""
+    return task_query(*task_filters(args))
+
+
+# 获取任务列表
+@app.route('/api/tasks', methods=['GET'])
+def get_tasks():
+    category, completed = task_filters(request.args)
+    query = task_query(category, completed)
+
+    # 未传limit和cursor时保持原来的全量数组格式
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    # fields=title,completed 只返回指定字段；summary=true 时content只返回预览
+    summary = request.args.get('summary', '').lower() in ('true', '1')
+    try:
+        fields = parse_task_fields(request.args.get('fields'))
+        if limit is not None or cursor:
+            limit = parse_page_limit(limit or DEFAULT_PAGE_SIZE)
+            if cursor:
+                decode_page_cursor(cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # ETag由全局变更序号和查询参数组成，数据未变化时直接返回304，不查询任务表
+    query_key = json.dumps(sorted(request.args.items(multi=True)), ensure_ascii=False)
+    etag = f'{task_version()}-{hashlib.sha1(query_key.encode("utf-8")).hexdigest()[:16]}'
+
+    def build():
+        cached = list_tasks_cached(category, completed, limit, cursor) if fields == TASK_FIELDS and not summary else None
+        if cached is not None:
+            # 直接拼接缓存中预先序列化好的JSON片段
+            entries, next_cursor = cached
+            body = '[' + ','.join(entry[2] for entry in entries) + ']'
+            if limit is not None or cursor:
+                body = f'{{"tasks":{body},"next_cursor":{TaskCache.encode(next_cursor)}}}'
+            return json_response(body)
+        if limit is None and not cursor:
+            return list(iter_task_dicts(query.order_by(Task.created_at.desc(), Task.id.desc()), fields, summary))
+        tasks, next_cursor = paginate_tasks(query, limit, cursor, fields, summary)
+        return {
+            'tasks': tasks,
+            'next_cursor': next_cursor
+        }
 
-    tasks = query.order_by(Task.created_at.desc()).all()
-    return jsonify([task.to_dict() for task in tasks])
+    return conditional_json(etag, build)
 
 
 # 创建新任务
@@ -586,16 +2198,27 @@ def create_task():
     )
 
     db.session.add(new_task)
+    record_task_change('create', new_task)
     db.session.commit()
 
-    return jsonify(new_task.to_dict()), 201
+    task_data = new_task.to_dict()
+    broadcast_task_change('create', task_data)
+    return jsonify(task_data), 201
 
 
 # 获取单个任务
 @app.route('/api/tasks/<int:task_id>', methods=['GET'])
 def get_task(task_id):
-    task = Task.query.get_or_404(task_id)
-    return jsonify(task.to_dict())
+    def build():
+        cached, task = get_task_cached(task_id)
+        if not cached:
+            return Task.query.get_or_404(task_id).to_dict()
+        if task is None:
+            abort(404)
+        return task
+
+    # 任务未变化时按该任务的变更序号返回304，不查询任务表
+    return conditional_json(str(task_version(task_id)), build)
 
 
 # 更新任务
@@ -607,6 +2230,8 @@ def update_task(task_id):
     if not data:
         return jsonify({'error': '请求数据为空'}), 400
 
+    previous = {'category': task.category, 'completed': task.completed}
+
     if 'content' in data:
         task.content = data['content']
 
@@ -618,16 +2243,24 @@ def update_task(task_id):
             return jsonify({'error': '无效的分类'}), 400
         task.category = data['category']
 
+    record_task_change('update', task)
     db.session.commit()
-    return jsonify(task.to_dict())
+
+    task_data = task.to_dict()
+    broadcast_task_change('update', task_data, previous)
+    return jsonify(task_data)
 
 
 # 删除任务
 @app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
     task = Task.query.get_or_404(task_id)
+    task_data = task.to_dict()
     db.session.delete(task)
+    record_task_change('delete', task)
     db.session.commit()
+
+    broadcast_task_change('delete', task_data)
     return jsonify({'message': '任务删除成功'})
 
 
@@ -638,6 +2271,7 @@ def complete_task(task_id):
     data = request.get_json()
 
     completed = data.get('completed', not task.completed)
+    previous = {'category': task.category, 'completed': task.completed}
     task.completed = completed
 
     if completed:
@@ -645,8 +2279,103 @@ def complete_task(task_id):
     else:
         task.completed_at = None
 
+    record_task_change('update', task)
     db.session.commit()
-    return jsonify(task.to_dict())
+
+    task_data = task.to_dict()
+    broadcast_task_change('update', task_data, previous)
+    return jsonify(task_data)
+
+
+# 流式导出任务（NDJSON或CSV），过滤条件与获取任务列表相同
+@app.route('/api/tasks/export', methods=['GET'])
+def export_tasks():
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': '不支持的导出格式，可选ndjson或csv'}), 400
+    try:
+        fields = parse_task_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = filter_tasks_query(request.args).order_by(Task.created_at.desc(), Task.id.desc())
+
+    def generate():
+        # 按批流式读取并逐块输出，内存占用与任务总数无关；第一块在查询读完之前就会发出
+        rows = []
+        if export_format == 'csv':
+            yield '\ufeff' + ','.join(fields) + '\r\n'  # 带BOM，Excel才能正确识别中文
+        for task in iter_task_dicts(query, fields):
+            if export_format == 'csv':
+                rows.append([str(value).lower() if isinstance(value, bool) else value
+                             for value in (task[field] for field in fields)])
+            else:
+                rows.append(json.dumps(task, ensure_ascii=False) + '\n')
+            if len(rows) >= EXPORT_CHUNK_ROWS:
+                yield encode_export_chunk(export_format, rows)
+                rows = []
+        if rows:
+            yield encode_export_chunk(export_format, rows)
+
+    filename = f'tasks-{datetime.now().strftime("%Y%m%d-%H%M%S")}.{export_format}'
+    mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+    # 不设置Content-Length，HTTP/1.1下以分块传输编码发送
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def encode_export_chunk(export_format, rows):
+    if export_format == 'ndjson':
+        return ''.join(rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+# 搜索任务标题和内容（空格分隔多个关键词，须全部包含），按相关度排序
+@app.route('/api/tasks/search', methods=['GET'])
+def search_tasks_api():
+    completed = request.args.get('completed')
+    params = {
+        'query': request.args.get('q', ''),
+        'category': request.args.get('category'),
+        'completed': completed.lower() == 'true' if completed else None,
+        'limit': request.args.get('limit'),
+        'offset': request.args.get('offset'),
+    }
+    try:
+        tasks, next_offset = search_tasks_data(params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'tasks': [task.to_dict() for task in tasks],
+        'next_offset': next_offset
+    })
+
+
+# 批量创建、更新、完成、删除任务（单个事务，一条合并的实时通知）
+@app.route('/api/tasks/batch', methods=['POST'])
+def batch_tasks():
+    try:
+        results, changes = apply_task_batch(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    broadcast_task_changes(changes)
+    return jsonify({
+        'success': all(result['status'] == 'ok' for items in results.values() for result in items),
+        'results': results
+    })
+
+
+# WebSocket服务器运行统计（连接数、消息处理延迟分位数）
+@app.route('/api/websocket/stats', methods=['GET'])
+def websocket_stats():
+    return jsonify(websocket_server.get_stats())
+
+
+@app.route('/api/websocket/connections', methods=['GET'])
+def websocket_connections():
+    return jsonify(websocket_server.get_connection_stats())
 
 
 # 添加一个辅助函数来手动触发邮件发送（用于测试）
@@ -660,8 +2389,11 @@ def send_test_email():
 
 
 # 广播函数，用于在任务变更时通知所有客户端
-def broadcast_task_change(action, task_data):
-    """通过原生WebSocket广播任务变更给所有连接的客户端"""
+def broadcast_task_change(action, task_data, previous=None):
+    """
+    把任务变更发布到变更总线，由持有WebSocket连接的进程广播给订阅的客户端
+    多个HTTP工作进程时每个进程都发布到同一条本机总线
+    """
     message = {
         'type': 'sync_notification',
         'data': {
@@ -669,7 +2401,15 @@ def broadcast_task_change(action, task_data):
             'task': task_data
         }
     }
-    websocket_server.broadcast_to_all(message)
+    if previous:
+        message['data']['previous'] = previous
+    change_bus.publish(message)
+
+
+def broadcast_task_changes(changes):
+    """把一批任务变更合并为一条batch通知发布到变更总线"""
+    if changes:
+        change_bus.publish({'type': 'sync_notification', 'data': {'action': 'batch', 'changes': changes}})
 
 
 # 启动应用
@@ -680,8 +2420,12 @@ if __name__ == '__main__':
     # 启动前自动备份数据库
     auto_backup()
     
-    # 启动原生WebSocket服务器
+    # 启动原生WebSocket服务器，并接收其它进程发布到变更总线的任务变更
     websocket_server.start()
+    try:
+        change_bus.serve(websocket_server.broadcast_to_all)
+    except OSError as e:
+        print(f'变更总线启动失败，其它进程的HTTP写操作不会实时推送: {e}')
     time.sleep(1)  # 等待WebSocket服务器启动
 
     # 启动Flask应用（仅用于HTTP API）
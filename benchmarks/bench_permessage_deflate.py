@@ -0,0 +1,63 @@
+"""
+permessage-deflate 压缩效果基准
+用接近真实数据的任务列表（中文内容、重复的键名）测量tasks_data消息的压缩率与每条消息的CPU耗时
+
+运行: python benchmarks/bench_permessage_deflate.py
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from websocket_deflate import PerMessageDeflate
+
+CATEGORIES = ['任务', '想尝试', '提醒']
+PHRASES = ['整理周报', '给妈妈打电话', '学习Vue组件通信', '周末去爬山', '买牛奶和鸡蛋',
+           '预约牙医', '读完《人类简史》', '修好自行车', '准备项目答辩', '背二十个单词']
+
+
+def make_tasks_message(count, seed=0):
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(count, 0, -1):
+        completed = rng.random() < 0.4
+        tasks.append({
+            'id': str(i),
+            'title': rng.choice(PHRASES) if rng.random() < 0.5 else None,
+            'content': '，'.join(rng.sample(PHRASES, 3)),
+            'category': rng.choice(CATEGORIES),
+            'completed': completed,
+            'created_at': f'2025-11-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00',
+            'completed_at': '2025-11-28T12:00:00' if completed else None
+        })
+    return json.dumps({'type': 'tasks_data', 'data': {'tasks': tasks}}).encode('utf-8')
+
+
+def measure(payload, context_takeover, repeat=20):
+    deflate = PerMessageDeflate(server_context_takeover=context_takeover)
+    sizes = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        sizes.append(len(deflate.compress(payload)))
+    elapsed = (time.perf_counter() - started) / repeat
+    # 保留上下文时后续消息可以引用前一条消息的内容，取最后一次的大小
+    return sizes[-1], elapsed * 1000
+
+
+def main():
+    print(f'{"任务数":>8}{"原始大小":>12}{"压缩后":>10}{"压缩率":>8}{"耗时(ms)":>10}{"保留上下文":>12}{"耗时(ms)":>10}')
+    for count in (100, 1000, 5000):
+        payload = make_tasks_message(count)
+        size, cost = measure(payload, context_takeover=False)
+        size_ctx, cost_ctx = measure(payload, context_takeover=True)
+        print(f'{count:>8}{len(payload):>12}{size:>10}{len(payload) / size:>7.1f}x{cost:>10.2f}'
+              f'{size_ctx:>12}{cost_ctx:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+WebSocket子协议编码基准
+对比JSON、MessagePack与CBOR在tasks_data消息上的编码/解码耗时与消息大小
+
+运行: python benchmarks/bench_subprotocol_codec.py
+"""
+
+import json
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from websocket_codec import JSON_CODEC, SUBPROTOCOLS
+from bench_permessage_deflate import make_tasks_message
+
+
+def measure(codec, message, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = codec.encode(message)
+    encode_cost = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        codec.decode(payload)
+    decode_cost = (time.perf_counter() - started) / repeat
+    return len(payload), encode_cost * 1000, decode_cost * 1000
+
+
+def main():
+    codecs = [JSON_CODEC, *SUBPROTOCOLS.values()]
+    if len(codecs) == 1:
+        print('未安装msgpack/cbor2，只能测量JSON')
+
+    print(f'{"任务数":>8}{"编码":>10}{"大小":>12}{"相对JSON":>10}{"编码(ms)":>10}{"解码(ms)":>10}')
+    for count in (100, 1000, 5000):
+        message = json.loads(make_tasks_message(count))
+        baseline = None
+        for codec in codecs:
+            size, encode_cost, decode_cost = measure(codec, message)
+            baseline = baseline or size
+            print(f'{count:>8}{codec.name:>10}{size:>12}{size / baseline:>9.0%} {encode_cost:>10.2f}{decode_cost:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+任务搜索基准
+在临时SQLite库中写入10万条任务，分别测量3字以上（FTS5 trigram）、1~2个字（二元组索引）的常见词与少见词的查询耗时，
+并与关闭索引、全部用LIKE扫描的结果和耗时对比
+
+运行: python benchmarks/bench_task_search.py
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 必须在导入app之前指定临时数据库
+WORKDIR = tempfile.mkdtemp(prefix='bench-search-')
+os.environ['TODO_DATABASE_URI'] = f'sqlite:///{os.path.join(WORKDIR, "bench.db")}'
+os.environ['TODO_CHANGE_BUS'] = os.path.join(WORKDIR, 'change-bus.sock')
+
+import task_search
+from app import app, db, Task
+
+TASK_COUNT = 100_000
+CATEGORIES = ['任务', '想尝试', '提醒']
+PHRASES = ['整理周报', '给妈妈打电话', '学习Vue组件通信', '周末去爬山', '买牛奶和鸡蛋',
+           '预约牙医', '读完《人类简史》', '修好自行车', '准备项目答辩', '背二十个单词']
+# 每条任务附带两个从RARE_CHARS中随机选取的字：单字约出现在400条任务中，两字组合大多只出现一次
+RARE_CHARS = [chr(0x5000 + i) for i in range(500)]
+QUERIES = ['牙医', '周报', '爬', '自行车', '组件通信', '牛奶 鸡蛋', '周末 山', 'Vue',
+           RARE_CHARS[7], RARE_CHARS[7] + RARE_CHARS[42], '牙医 ' + RARE_CHARS[7], '不存在', '无']
+
+
+def fill_tasks(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(count):
+        rows.append({
+            'title': rng.choice(PHRASES) if rng.random() < 0.5 else None,
+            'content': '，'.join(rng.sample(PHRASES, 3)) + '（' + ''.join(rng.sample(RARE_CHARS, 2)) + '）',
+            'category': rng.choice(CATEGORIES),
+            'completed': rng.random() < 0.4,
+            'created_at': start + timedelta(seconds=i * 37)
+        })
+    started = time.perf_counter()
+    db.session.execute(Task.__table__.insert(), rows)
+    db.session.commit()
+    return time.perf_counter() - started
+
+
+def measure(query, repeat=5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = [task.id for task in task_search.search_tasks(query, limit=20)[0]]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        db.session.expunge_all()
+    return best, result
+
+
+def main():
+    try:
+        with app.app_context():
+            db.create_all()
+            elapsed = fill_tasks(TASK_COUNT)
+            print(f'写入{TASK_COUNT}条任务（含索引触发器）: {elapsed:.1f}s')
+            print(f'{"查询":<12}{"索引(ms)":>10}{"LIKE(ms)":>10}{"加速比":>8}')
+            for query in QUERIES:
+                indexed_time, indexed_result = measure(query)
+                fts_enabled, gram_enabled = task_search.fts_enabled, task_search.gram_enabled
+                task_search.fts_enabled = task_search.gram_enabled = False
+                try:
+                    like_time, like_result = measure(query)
+                finally:
+                    task_search.fts_enabled, task_search.gram_enabled = fts_enabled, gram_enabled
+                # FTS按相关度排序，LIKE按创建时间排序，只有纯二元组查询的结果顺序一致
+                if all(task_search.is_short_cjk(term) for term in query.split()):
+                    assert indexed_result == like_result, f'{query}: 二元组索引结果与LIKE不一致'
+                print(f'{query:<12}{indexed_time * 1000:>10.2f}{like_time * 1000:>10.2f}'
+                      f'{like_time / indexed_time:>8.1f}x')
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+任务列表序列化基准
+在临时SQLite库中写入1万/10万条任务，对比构造ORM对象再调用to_dict()与按列流式读取（iter_task_dicts）
+生成完整任务列表的耗时，并校验两者输出一致
+
+运行: python benchmarks/bench_task_serialization.py
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 必须在导入app之前指定临时数据库
+WORKDIR = tempfile.mkdtemp(prefix='bench-serialize-')
+os.environ['TODO_DATABASE_URI'] = f'sqlite:///{os.path.join(WORKDIR, "bench.db")}'
+
+from app import app, db, Task, iter_task_dicts
+
+CATEGORIES = ['任务', '想尝试', '提醒']
+PHRASES = ['整理周报', '给妈妈打电话', '学习Vue组件通信', '周末去爬山', '买牛奶和鸡蛋',
+           '预约牙医', '读完《人类简史》', '修好自行车', '准备项目答辩', '背二十个单词']
+
+
+def fill_tasks(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    db.session.execute(Task.__table__.delete())
+    rows = []
+    for i in range(count):
+        completed = rng.random() < 0.4
+        created_at = start + timedelta(seconds=i * 37, microseconds=rng.choice([0, rng.randint(1, 999999)]))
+        rows.append({
+            'title': rng.choice(PHRASES) if rng.random() < 0.5 else None,
+            'content': '，'.join(rng.sample(PHRASES, 3)),
+            'category': rng.choice(CATEGORIES),
+            'completed': completed,
+            'created_at': created_at,
+            'completed_at': created_at + timedelta(hours=5) if completed else None
+        })
+    db.session.execute(Task.__table__.insert(), rows)
+    db.session.commit()
+
+
+def orm_listing():
+    return [task.to_dict() for task in Task.query.order_by(Task.created_at.desc(), Task.id.desc()).all()]
+
+
+def fast_listing():
+    return list(iter_task_dicts(Task.query.order_by(Task.created_at.desc(), Task.id.desc())))
+
+
+def measure(fn, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        db.session.expunge_all()  # 每次都从数据库重新读取，不复用会话中已加载的对象
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    print(f'{"行数":>8}{"ORM+to_dict(ms)":>18}{"按列读取(ms)":>16}{"加速比":>8}')
+    try:
+        with app.app_context():
+            for count in (10_000, 100_000):
+                fill_tasks(count)
+                orm_time, orm_result = measure(orm_listing)
+                fast_time, fast_result = measure(fast_listing)
+                assert orm_result == fast_result, '快速路径输出与to_dict不一致'
+                print(f'{count:>8}{orm_time * 1000:>18.1f}{fast_time * 1000:>16.1f}{orm_time / fast_time:>8.2f}x')
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+WebSocket帧编解码微基准
+对比逐字节掩码解码与整字异或解码、拼接整帧与只编码帧头（分散写）的耗时
+
+运行: python benchmarks/bench_websocket_frame.py
+"""
+
+import os
+import sys
+import timeit
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from websocket_frame import unmask, encode_frame_parts
+
+SIZES = [('1 KB', 1024), ('64 KB', 64 * 1024), ('1 MB', 1024 * 1024)]
+MASK = b'\x9a\x01\xff\x37'
+
+
+def unmask_bytewise(payload, mask):
+    """原实现：逐字节列表推导"""
+    return bytes([b ^ mask[i % 4] for i, b in enumerate(payload)])
+
+
+def encode_frame_copy(payload):
+    """原实现：bytearray拼接后再复制为bytes"""
+    length = len(payload)
+    frame = bytearray()
+    frame.append(0x81)
+    if length < 126:
+        frame.append(length)
+    elif length < 65536:
+        frame.append(126)
+        frame.extend(length.to_bytes(2, 'big'))
+    else:
+        frame.append(127)
+        frame.extend(length.to_bytes(8, 'big'))
+    frame.extend(payload)
+    return bytes(frame)
+
+
+def best_of(func, repeat=5):
+    """返回单次调用的最短耗时（微秒）"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main():
+    print(f'{"操作":<10}{"负载":>8}{"原实现(us)":>16}{"新实现(us)":>16}{"加速比":>10}')
+    for label, size in SIZES:
+        payload = os.urandom(size)
+        old = best_of(lambda: unmask_bytewise(payload, MASK))
+        new = best_of(lambda: unmask(payload, MASK))
+        print(f'{"掩码解码":<10}{label:>8}{old:>16.1f}{new:>16.1f}{old / new:>9.1f}x')
+
+    for label, size in SIZES:
+        payload = os.urandom(size)
+        old = best_of(lambda: encode_frame_copy(payload))
+        new = best_of(lambda: encode_frame_parts(payload))
+        print(f'{"帧编码":<10}{label:>8}{old:>16.1f}{new:>16.1f}{old / new:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
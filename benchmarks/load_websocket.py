@@ -0,0 +1,427 @@
+"""
+WebSocket压测工具
+在独立进程中启动SimpleWebSocketServer（使用临时SQLite库），用N个并发的原始WebSocket客户端按配置的比例
+发送fetch_tasks/create_task/update_task/ping，统计请求到响应的延迟、广播送达延迟（p50/p95/p99）、吞吐量
+以及服务器进程的CPU与内存，结果写入JSON文件，便于在不同提交之间对比
+
+运行: python benchmarks/load_websocket.py --clients 50 --duration 10 --mode selector
+      python benchmarks/load_websocket.py --port 5001 --server-pid 1234   # 压测已在运行的服务器
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录到路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from websocket_frame import FrameDecoder, OPCODE_TEXT, OPCODE_PING, OPCODE_PONG, OPCODE_CLOSE
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 请求事件 -> 对应的响应类型
+RESPONSE_TYPES = {
+    'fetch_tasks': 'tasks_data',
+    'create_task': 'task_created',
+    'update_task': 'task_updated',
+    'ping': 'pong',
+}
+DEFAULT_MIX = 'fetch_tasks=1,create_task=2,update_task=3,ping=4'
+CATEGORIES = ['任务', '想尝试', '提醒']
+
+
+def parse_mix(text):
+    """解析 事件=权重 列表"""
+    mix = []
+    for item in text.split(','):
+        event, _, weight = item.partition('=')
+        event = event.strip()
+        if event not in RESPONSE_TYPES:
+            raise ValueError(f'不支持的事件: {event}')
+        mix.append((event, float(weight or 1)))
+    return mix
+
+
+def summarize(samples):
+    """延迟样本（毫秒）的分位数"""
+    if not samples:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    samples = sorted(samples)
+
+    def percentile(pct):
+        return round(samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))], 3)
+
+    return {'count': len(samples), 'p50': percentile(50), 'p95': percentile(95),
+            'p99': percentile(99), 'max': round(samples[-1], 3)}
+
+
+def encode_client_frame(payload, opcode=OPCODE_TEXT):
+    """客户端帧必须带掩码"""
+    mask = os.urandom(4)
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x80 | opcode, 0x80 | length])
+    elif length < 65536:
+        header = bytes([0x80 | opcode, 0x80 | 126]) + length.to_bytes(2, 'big')
+    else:
+        header = bytes([0x80 | opcode, 0x80 | 127]) + length.to_bytes(8, 'big')
+    key = (mask * ((length + 3) // 4))[:length]
+    masked = (int.from_bytes(payload, 'little') ^ int.from_bytes(key, 'little')).to_bytes(length, 'little')
+    return header + mask + masked
+
+
+class ProcessMonitor:
+    """定期采样进程的CPU时间和常驻内存（优先psutil，否则读取/proc）"""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.rss_peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_cpu = None
+        self._start_time = None
+        self._process = psutil.Process(pid) if psutil else None
+
+    def read(self):
+        """返回(CPU秒数, 常驻内存字节)，无法读取时返回None"""
+        try:
+            if self._process is not None:
+                times = self._process.cpu_times()
+                return times.user + times.system, self._process.memory_info().rss
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            ticks = os.sysconf('SC_CLK_TCK')
+            cpu = (int(fields[11]) + int(fields[12])) / ticks
+            with open(f'/proc/{self.pid}/status') as f:
+                rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:'))
+            return cpu, rss
+        except Exception:
+            return None
+
+    def start(self):
+        usage = self.read()
+        if usage is None:
+            return
+        self._start_cpu = usage[0]
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            usage = self.read()
+            if usage:
+                self.rss_peak = max(self.rss_peak, usage[1])
+
+    def stop(self):
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        usage = self.read()
+        if usage is None:
+            return None
+        elapsed = time.perf_counter() - self._start_time
+        cpu = usage[0] - self._start_cpu
+        return {
+            'cpu_seconds': round(cpu, 3),
+            'cpu_percent': round(cpu / elapsed * 100, 1) if elapsed else None,
+            'rss_mb_peak': round(max(self.rss_peak, usage[1]) / 1024 / 1024, 1),
+            'rss_mb_end': round(usage[1] / 1024 / 1024, 1),
+        }
+
+
+class Results:
+    """所有客户端共享的统计（都在同一个asyncio线程中更新）"""
+
+    def __init__(self):
+        self.latencies = {event: [] for event in RESPONSE_TYPES}
+        self.broadcast_latencies = []
+        self.sent = 0
+        self.responses = 0
+        self.broadcasts = 0
+        self.errors = {}
+        self.connect_failures = 0
+
+
+class LoadClient:
+    """一个原始WebSocket客户端：按固定速率发送请求，并记录响应与广播"""
+
+    def __init__(self, index, host, port, mix, rate, results, seed):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.events = [event for event, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.rate = rate
+        self.results = results
+        self.rng = random.Random(seed)
+        self.pending = {}  # requestId -> (事件, 发送时间)，按发送顺序
+        self.task_ids = []
+        self.reader = None
+        self.writer = None
+        self._counter = 0
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        self.writer.write((
+            f'GET / HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nUpgrade: websocket\r\n'
+            f'Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'
+        ).encode('ascii'))
+        response = await self.reader.readuntil(b'\r\n\r\n')
+        if not response.startswith(b'HTTP/1.1 101'):
+            raise ConnectionError('握手失败')
+
+    def build_request(self):
+        event = self.rng.choices(self.events, self.weights)[0]
+        if event == 'update_task' and not self.task_ids:
+            event = 'create_task'
+        self._counter += 1
+        request_id = f'{self.index}-{self._counter}'
+        # 标题中带发送时间和客户端编号，其它客户端收到广播时据此计算送达延迟
+        marker = f'lt:{time.time()}:{self.index}'
+        if event == 'create_task':
+            data = {'task': {'title': marker, 'content': f'压测任务 {request_id}',
+                             'category': self.rng.choice(CATEGORIES)}}
+        elif event == 'update_task':
+            data = {'id': self.rng.choice(self.task_ids), 'title': marker, 'content': f'压测修改 {request_id}'}
+        else:
+            data = {}
+        return event, request_id, {'type': event, 'data': data, 'requestId': request_id}
+
+    async def run(self, deadline):
+        receiver = asyncio.create_task(self.receive())
+        interval = 1 / self.rate
+        try:
+            while time.perf_counter() < deadline:
+                event, request_id, message = self.build_request()
+                self.pending[request_id] = (event, time.perf_counter())
+                self.writer.write(encode_client_frame(json.dumps(message).encode('utf-8')))
+                self.results.sent += 1
+                # 加入抖动，避免所有客户端同时发送
+                await asyncio.sleep(interval * self.rng.uniform(0.5, 1.5))
+            # 等待尚未返回的响应
+            drain_deadline = time.perf_counter() + 5
+            while self.pending and time.perf_counter() < drain_deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            receiver.cancel()
+            self.writer.close()
+
+    async def receive(self):
+        decoder = FrameDecoder()
+        while True:
+            data = await self.reader.read(65536)
+            if not data:
+                return
+            for opcode, payload in decoder.feed(data):
+                if opcode == OPCODE_TEXT:
+                    self.handle(json.loads(payload))
+                elif opcode == OPCODE_PING:
+                    self.writer.write(encode_client_frame(payload, OPCODE_PONG))
+                elif opcode == OPCODE_CLOSE:
+                    return
+
+    def handle(self, message):
+        now = time.perf_counter()
+        message_type = message.get('type')
+        data = message.get('data') or {}
+
+        if message_type == 'sync_notification':
+            self.results.broadcasts += 1
+            changes = data.get('changes') if data.get('action') == 'batch' else [data]
+            for change in changes:
+                title = (change.get('task') or {}).get('title') or ''
+                if title.startswith('lt:'):
+                    _, sent_at, origin = title.split(':')
+                    if int(origin) != self.index:
+                        self.results.broadcast_latencies.append((time.time() - float(sent_at)) * 1000)
+            return
+
+        request_id = data.get('requestId')
+        if message_type == 'error':
+            code = data.get('code', 'UNKNOWN')
+            self.results.errors[code] = self.results.errors.get(code, 0) + 1
+            self.pending.pop(request_id, None)
+            return
+
+        if request_id not in self.pending:
+            # tasks_data和pong不带requestId，按发送顺序匹配第一个同类请求
+            request_id = next((rid for rid, (event, _) in self.pending.items()
+                               if RESPONSE_TYPES[event] == message_type), None)
+            if request_id is None:
+                return
+        event, sent_at = self.pending.pop(request_id)
+        self.results.latencies[event].append((now - sent_at) * 1000)
+        self.results.responses += 1
+        if message_type == 'task_created':
+            self.task_ids.append(data['task']['id'])
+
+
+async def run_clients(args, mix, port):
+    results = Results()
+    clients = [LoadClient(i, args.host, port, mix, args.rate, results, args.seed + i) for i in range(args.clients)]
+    connected = []
+    for client in clients:
+        try:
+            await client.connect()
+            connected.append(client)
+        except (OSError, asyncio.IncompleteReadError, ConnectionError):
+            results.connect_failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client.run(started + args.duration) for client in connected))
+    return results, time.perf_counter() - started
+
+
+def start_server_process(args):
+    """在子进程中启动服务器，返回(进程, 端口, 临时目录)"""
+    workdir = tempfile.mkdtemp(prefix='ws-load-')
+    env = dict(os.environ, TODO_DATABASE_URI=f'sqlite:///{os.path.join(workdir, "load.db")}',
+               TODO_CHANGE_BUS=os.path.join(workdir, 'bus.sock'))
+    command = [sys.executable, os.path.abspath(__file__), '--serve', '--mode', args.mode,
+               '--loop-count', str(args.loop_count), '--coalesce-ms', str(args.coalesce_ms)]
+    if args.rate_limit:
+        command.append('--rate-limit')
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
+    for line in process.stdout:
+        # 线程模式下其它线程的输出可能与就绪行交错
+        match = re.search(r'READY (\d+)', line)
+        if match:
+            port = int(match.group(1))
+            break
+    else:
+        raise RuntimeError('服务器进程启动失败')
+    # 持续读取服务器输出，避免管道写满阻塞服务器
+    threading.Thread(target=lambda: [None for _ in process.stdout], daemon=True).start()
+    return process, port, workdir
+
+
+def serve(args):
+    """子进程入口：运行服务器直到标准输入关闭"""
+    from app import app, SimpleWebSocketServer
+
+    options = {}
+    if not args.rate_limit:
+        options.update(rate_limits={}, global_rate_limits={})
+    server = SimpleWebSocketServer(app, host=args.host, port=0, mode=args.mode, loop_count=args.loop_count,
+                                   coalesce_window_ms=args.coalesce_ms, **options)
+    server.start()
+    if not server.ready.wait(10):
+        sys.exit(1)
+    print(f'READY {server.port}', flush=True)
+    sys.stdin.read()
+    server.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SimpleWebSocketServer 压测')
+    parser.add_argument('--clients', type=int, default=50, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=10, help='发送请求的时长（秒）')
+    parser.add_argument('--rate', type=float, default=5, help='每个客户端每秒请求数')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='事件比例，如 fetch_tasks=1,create_task=2')
+    parser.add_argument('--mode', default='selector', choices=['thread', 'selector', 'asyncio'])
+    parser.add_argument('--loop-count', type=int, default=1)
+    parser.add_argument('--coalesce-ms', type=float, default=0)
+    parser.add_argument('--rate-limit', action='store_true', help='启用服务器默认限流（默认关闭以测量处理能力）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help='压测已在运行的服务器，不再启动子进程')
+    parser.add_argument('--server-pid', type=int, help='配合--port统计已有服务器进程的CPU与内存')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果JSON文件路径，默认 benchmarks/results/ 下按时间命名')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    mix = parse_mix(args.mix)
+    process = None
+    if args.port:
+        port, pid = args.port, args.server_pid
+    else:
+        process, port, workdir = start_server_process(args)
+        pid = process.pid
+
+    monitor = ProcessMonitor(pid) if pid else None
+    if monitor:
+        monitor.start()
+    try:
+        results, elapsed = asyncio.run(run_clients(args, mix, port))
+    finally:
+        server_usage = monitor.stop() if monitor else None
+        if process:
+            process.stdin.close()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    all_latencies = [sample for samples in results.latencies.values() for sample in samples]
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'clients': args.clients, 'duration': args.duration, 'rate_per_client': args.rate,
+            'mix': dict(mix), 'mode': args.mode, 'loop_count': args.loop_count,
+            'coalesce_ms': args.coalesce_ms, 'rate_limit': args.rate_limit,
+        },
+        'requests_sent': results.sent,
+        'responses': results.responses,
+        'errors': results.errors,
+        'connect_failures': results.connect_failures,
+        'throughput_rps': round(results.responses / elapsed, 1) if elapsed else None,
+        'broadcasts_received': results.broadcasts,
+        'latency_ms': {
+            'all': summarize(all_latencies),
+            **{event: summarize(samples) for event, samples in results.latencies.items() if samples}
+        },
+        'broadcast_latency_ms': summarize(results.broadcast_latencies),
+        'server': server_usage,
+    }
+
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f'load_{args.mode}_{time.strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f'{"事件":>14}{"次数":>8}{"p50(ms)":>10}{"p95(ms)":>10}{"p99(ms)":>10}')
+    for name, stats in report['latency_ms'].items():
+        print(f'{name:>14}{stats["count"]:>8}{stats["p50"]!s:>10}{stats["p95"]!s:>10}{stats["p99"]!s:>10}')
+    broadcast = report['broadcast_latency_ms']
+    print(f'{"broadcast":>14}{broadcast["count"]:>8}{broadcast["p50"]!s:>10}{broadcast["p95"]!s:>10}'
+          f'{broadcast["p99"]!s:>10}')
+    print(f'吞吐量: {report["throughput_rps"]} 请求/秒, 错误: {results.errors or 0}, 服务器: {server_usage}')
+    print(f'结果已写入 {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+跨进程任务变更总线
+多个HTTP工作进程把任务变更发布到本机总线，持有WebSocket连接的进程订阅总线并转发给客户端。
+支持Unix域套接字的系统使用AF_UNIX数据报，套接字放在只有当前用户可访问的目录中（权限0700，套接字0600），
+其它用户无法向客户端推送消息；否则（Windows）使用本机回环UDP，没有身份验证，本机任何进程都能发布。
+消息过大或接收方积压导致发送失败时改发resync_required，让客户端重新拉取，而不是静默丢弃
+"""
+
+import errno
+import json
+import os
+import socket
+import threading
+
+HAS_AF_UNIX = hasattr(socket, 'AF_UNIX')
+DEFAULT_UDP_ADDRESS = ('127.0.0.1', 5002)
+MAX_DATAGRAM_SIZE = 60000  # 超过该大小的变更改为发布resync_required，让客户端重新拉取
+# macOS的Unix域数据报默认上限只有2048字节（net.local.dgram.maxdgram），按缓冲区大小放宽
+SOCKET_BUFFER_SIZE = 4 * MAX_DATAGRAM_SIZE
+RESYNC_DATA = json.dumps({'type': 'resync_required', 'data': {}}).encode('utf-8')
+
+
+def default_address(base_dir=None):
+    """
+    默认总线地址，可通过环境变量 TODO_CHANGE_BUS 覆盖（Unix套接字路径或 host:port）
+    Unix套接字放在base_dir（应用传入instance目录，使用同一数据目录的进程共用一条总线）下的私有子目录中
+    """
+    configured = os.environ.get('TODO_CHANGE_BUS')
+    if configured:
+        host, sep, port = configured.rpartition(':')
+        if sep and port.isdigit() and not configured.startswith('/'):
+            return host, int(port)
+        return configured
+    if HAS_AF_UNIX:
+        return os.path.join(base_dir or os.getcwd(), 'run', 'change-bus.sock')
+    return DEFAULT_UDP_ADDRESS
+
+
+def socket_in_use(path):
+    """该路径上是否有进程正在接收（残留的套接字文件会拒绝连接）"""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        probe.connect(path)
+        return True
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+    except OSError:
+        return True  # 无法判断时按占用处理，不删除别人的套接字
+    finally:
+        probe.close()
+
+
+def set_buffer_size(sock, option):
+    """把套接字缓冲区放大到至少SOCKET_BUFFER_SIZE，系统不允许时保持默认"""
+    try:
+        if sock.getsockopt(socket.SOL_SOCKET, option) < SOCKET_BUFFER_SIZE:
+            sock.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUFFER_SIZE)
+    except OSError:
+        pass
+
+
+class ChangeBus:
+    """
+    本机发布/订阅总线
+    publish()在任意进程调用，不阻塞请求；serve(handler)在持有WebSocket连接的进程中调用一次，
+    收到的消息交给handler。同一进程内已在serve时直接调用handler，不经过套接字
+    """
+
+    def __init__(self, address=None):
+        self.address = address or default_address()
+        self.family = socket.AF_INET if isinstance(self.address, tuple) else socket.AF_UNIX
+        self.handler = None
+        self.published = 0
+        self.dropped = 0  # 没有订阅进程或接收缓冲区已满时丢弃的消息
+        self.resyncs = 0  # 因过大或发送失败改为resync_required的消息
+        self.received = 0
+        self._resync_owed = False  # 接收方积压时丢了消息，下次发布前先补发resync_required（由_sock_lock保护）
+        self._sock = None
+        self._sock_lock = threading.Lock()
+        self._server_sock = None
+        self._stop = threading.Event()
+
+    def _publisher_socket(self):
+        """发布用的非阻塞套接字（调用方持有_sock_lock）"""
+        if self._sock is None:
+            self._sock = socket.socket(self.family, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+            set_buffer_size(self._sock, socket.SO_SNDBUF)
+        return self._sock
+
+    def publish(self, message):
+        """
+        发布一条变更消息，返回是否成功送出
+        消息过大时改发resync_required；接收方积压时丢弃，并在下次发布前先补发resync_required
+        """
+        self.published += 1
+        if self.handler is not None:
+            self._dispatch(message)
+            return True
+
+        data = json.dumps(message).encode('utf-8')
+        if len(data) > MAX_DATAGRAM_SIZE:
+            data = RESYNC_DATA
+            self.resyncs += 1
+        with self._sock_lock:
+            if self._resync_owed:
+                if self._send(RESYNC_DATA) is not None:
+                    self.dropped += 1
+                    return False
+                self._resync_owed = False
+            error = self._send(data)
+            if error == errno.EMSGSIZE and data is not RESYNC_DATA:
+                # 超过系统的数据报上限（如macOS），消息本身送不出去，通知客户端重新拉取
+                self.resyncs += 1
+                error = self._send(RESYNC_DATA)
+            if error is None:
+                return True
+            self.dropped += 1
+            if error not in (errno.ENOENT, errno.ECONNREFUSED):
+                # 没有订阅进程时无需补发（客户端连上新进程时会重新拉取），积压等其它错误需要补发
+                self._resync_owed = True
+            return False
+
+    def _send(self, data):
+        """发送一个数据报，成功返回None，失败返回errno"""
+        try:
+            self._publisher_socket().sendto(data, self.address)
+            return None
+        except OSError as e:
+            return e.errno
+
+    def serve(self, handler):
+        """绑定总线地址并在后台线程接收消息；地址已被其它进程占用时抛出OSError"""
+        if self.family == socket.AF_UNIX:
+            self._prepare_unix_address()
+        sock = socket.socket(self.family, socket.SOCK_DGRAM)
+        set_buffer_size(sock, socket.SO_RCVBUF)
+        try:
+            sock.bind(self.address)
+            if self.family == socket.AF_UNIX:
+                os.chmod(self.address, 0o600)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(0.5)  # 定期检查停止标志，关闭套接字不一定能唤醒阻塞的recv
+        if self.family == socket.AF_INET and self.address[1] == 0:
+            self.address = sock.getsockname()
+        self._server_sock = sock
+        self.handler = handler
+        thread = threading.Thread(target=self._receive_loop, args=(sock,), name='change-bus', daemon=True)
+        thread.start()
+        print(f'任务变更总线已启动: {self.address}')
+        return thread
+
+    def _prepare_unix_address(self):
+        """创建只有当前用户可访问的目录，并清理上次异常退出留下的套接字文件（不删除仍在使用的套接字）"""
+        directory = os.path.dirname(self.address)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        if socket_in_use(self.address):
+            raise OSError(f'变更总线已被其它进程占用: {self.address}')
+        try:
+            os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+
+    def _receive_loop(self, sock):
+        while not self._stop.is_set():
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                message = json.loads(data.decode('utf-8'))
+            except ValueError as e:
+                print(f'变更总线消息解析失败: {e}')
+                continue
+            self.received += 1
+            self._dispatch(message)
+
+    def _dispatch(self, message):
+        try:
+            self.handler(message)
+        except Exception as e:
+            print(f'变更总线消息处理失败: {e}')
+
+    def close(self):
+        self._stop.set()
+        self.handler = None
+        if self._server_sock is not None:
+            try:
+                self._server_sock.close()
+            except OSError:
+                pass
+            if self.family == socket.AF_UNIX:
+                try:
+                    os.unlink(self.address)
+                except OSError:
+                    pass
+            self._server_sock = None
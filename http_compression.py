@@ -0,0 +1,124 @@
+"""
+HTTP响应压缩模块
+按Accept-Encoding协商br/gzip压缩JSON、文本等响应，小于阈值、已编码或流式的响应不处理；
+带强ETag的响应按(地址, ETag, 编码)缓存压缩结果，轮询同一版本时不重复压缩。
+压缩后的表示使用带编码后缀的ETag（如 "12-ab-gzip"），保持强ETag的语义
+"""
+
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)  # 同等q值时优先br
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+
+def representation_etags(etag):
+    """同一数据各个编码表示的ETag（未压缩的在前），供条件请求比较"""
+    return [etag] + [f'{etag}-{encoding}' for encoding in ENCODINGS]
+
+
+def negotiate_encoding(accept_encoding):
+    """从Accept-Encoding中选出服务器支持、客户端q值最高的编码，没有时返回None"""
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name] = quality
+
+    best = None
+    for encoding in ENCODINGS:
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+class ResponseCompressor:
+    """
+    after_request压缩中间件
+    min_size: 小于该字节数的响应不压缩；gzip_level: gzip压缩级别(1-9)；
+    brotli_quality: brotli质量(0-11)；cache_size: 缓存的压缩结果条数
+    """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5, cache_size=128):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)  # mtime固定，相同内容输出相同
+
+    def compressible(self, response):
+        mimetype = response.mimetype or ''
+        return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+    def compress_response(self, response):
+        if response.direct_passthrough or response.is_streamed or not self.compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (request.full_path, etag, encoding) if etag and not weak else None
+        compressed = self._cache_get(key)
+        if compressed is None:
+            compressed = self.compress(data, encoding)
+            self._cache_put(key, compressed)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
+
+    def _cache_get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            compressed = self._cache.get(key)
+            if compressed is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+            return compressed
+
+    def _cache_put(self, key, compressed):
+        if key is None or not self.cache_size:
+            return
+        with self._lock:
+            self._cache[key] = compressed
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
@@ -0,0 +1,223 @@
+"""
+任务内存缓存模块
+按id保存任务字典和预先序列化好的JSON片段，按分类、完成状态建立索引，并维护按(created_at, id)排序的键列表，
+列表和单个任务的读取直接由内存返回。写入在提交后直写进缓存（由app.py根据变更日志调用apply）；
+缓存记录已应用到的变更序号，其它进程写入导致序号不连续时由app.py按变更日志增量追上。
+每条缓存记录带有它对应的变更序号，并发线程的直写即使乱序到达也不会用旧数据覆盖新数据
+"""
+
+import bisect
+import json
+import threading
+from datetime import datetime
+
+
+class CacheInconsistencyError(AssertionError):
+    """一致性检查模式下缓存结果与数据库不一致"""
+
+
+class TaskCache:
+    """
+    任务缓存
+    max_tasks: 任务数超过该值时不再缓存，读取退回数据库；verify: 一致性检查模式，
+    每次由缓存返回的结果都与数据库查询结果比较，不一致时抛出CacheInconsistencyError（用于测试）
+    """
+
+    def __init__(self, enabled=False, max_tasks=100000, verify=False):
+        self.enabled = enabled
+        self.max_tasks = max_tasks
+        self.verify = verify
+        self.loaded = False
+        self.oversized_at = None  # 超过上限时的变更序号，序号变化前不再尝试加载
+        self.seq = 0  # 已应用到的变更序号
+        self._entries = {}  # 任务ID -> (排序键, 任务字典, JSON片段, 变更序号)
+        self._tombstones = {}  # 已删除任务ID -> 删除时的变更序号
+        self._floor = 0  # 早于该序号的变更都已体现在缓存中（清空或整体加载时推进）
+        self._order = []  # 按(created_at, id)升序排列的排序键
+        self._by_category = {}  # 分类 -> 任务ID集合
+        self._by_completed = {}  # 完成状态 -> 任务ID集合
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.reloads = 0
+        self.catch_ups = 0
+
+    @staticmethod
+    def sort_key(created_at, task_id):
+        return (created_at or datetime.min, task_id)
+
+    @staticmethod
+    def encode(task):
+        return json.dumps(task, ensure_ascii=False, separators=(',', ':'))
+
+    def _is_stale(self, task_id, seq):
+        """该变更是否早于缓存中已有的同一任务记录、删除或清空"""
+        entry = self._entries.get(task_id)
+        if entry is not None and entry[3] > seq:
+            return True
+        return seq < max(self._tombstones.get(task_id, 0), self._floor)
+
+    def _put(self, row, seq):
+        created_at, task_id, task = row
+        if self._is_stale(task_id, seq):
+            return
+        self._remove(task_id)
+        self._tombstones.pop(task_id, None)
+        key = self.sort_key(created_at, task_id)
+        self._entries[task_id] = (key, task, self.encode(task), seq)
+        bisect.insort(self._order, key)
+        self._by_category.setdefault(task['category'], set()).add(task_id)
+        self._by_completed.setdefault(task['completed'], set()).add(task_id)
+
+    def _delete(self, task_id, seq):
+        if self._is_stale(task_id, seq):
+            return
+        self._remove(task_id)
+        self._tombstones[task_id] = seq
+
+    def _clear_before(self, seq):
+        for task_id in [task_id for task_id, entry in self._entries.items() if entry[3] < seq]:
+            self._remove(task_id)
+        self._tombstones.clear()
+        self._floor = max(self._floor, seq)
+
+    def _remove(self, task_id):
+        entry = self._entries.pop(task_id, None)
+        if entry is None:
+            return
+        key, task, _, _ = entry
+        index = bisect.bisect_left(self._order, key)
+        if index < len(self._order) and self._order[index] == key:
+            del self._order[index]
+        self._by_category.get(task['category'], set()).discard(task_id)
+        self._by_completed.get(task['completed'], set()).discard(task_id)
+
+    def _clear(self):
+        self._entries.clear()
+        self._order.clear()
+        self._by_category.clear()
+        self._by_completed.clear()
+        self._tombstones.clear()
+        self._floor = 0
+
+    def invalidate(self):
+        """丢弃缓存内容，下次读取时重新加载"""
+        with self._lock:
+            self._clear()
+            self.loaded = False
+            self.oversized_at = None
+            self.seq = 0
+
+    def reset(self, rows, seq):
+        """用[(created_at, id, 任务字典)]整体替换缓存内容，seq为读取前的变更序号"""
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._put(row, seq)
+            self._floor = seq + 1  # 迟到的更早直写不再生效，避免已删除的任务重新出现
+            self.seq = seq
+            self.loaded = True
+            self.oversized_at = None
+            self.reloads += 1
+
+    def mark_oversized(self, seq):
+        with self._lock:
+            self._clear()
+            self.loaded = False
+            self.oversized_at = seq
+
+    def _apply(self, changes):
+        for seq, action, task_id, row in changes:
+            if action == 'clear':
+                self._clear_before(seq)
+            elif action == 'delete' or row is None:
+                self._delete(task_id, seq)
+            else:
+                self._put(row, seq)
+
+    def apply(self, changes):
+        """
+        直写一批刚提交的变更[(变更序号, 动作, 任务ID, (created_at, id, 任务字典)或None)]
+        只有紧接在已应用序号之后时才推进序号，否则说明其它进程的写入尚未应用，留给读取前的增量追赶
+        """
+        with self._lock:
+            if not self.loaded or not changes:
+                return
+            self._apply(changes)
+            seqs = sorted(change[0] for change in changes)
+            if len(self._entries) > self.max_tasks:
+                self.mark_oversized(seqs[-1])
+            elif seqs[0] == self.seq + 1 and seqs[-1] - seqs[0] == len(seqs) - 1:
+                self.seq = seqs[-1]
+
+    def catch_up(self, changes, seq):
+        """应用从变更日志读出的变更（格式同apply），并把已应用序号推进到seq"""
+        with self._lock:
+            if not self.loaded:
+                return
+            self._apply(changes)
+            self.catch_ups += 1
+            if len(self._entries) > self.max_tasks:
+                self.mark_oversized(seq)
+            else:
+                self.seq = max(self.seq, seq)
+
+    def get(self, task_id):
+        """返回任务字典，不存在时返回None（调用方需先确认缓存可用）"""
+        with self._lock:
+            entry = self._entries.get(task_id)
+            self.hits += 1
+            return entry[1] if entry else None
+
+    def list(self, category=None, completed=None, limit=None, before=None):
+        """
+        按(created_at, id)倒序返回[(排序键, 任务字典, JSON片段, 变更序号)]和是否还有更多
+        category/completed为过滤条件，before为键集分页的(created_at, id)，只返回排在它之后的任务
+        """
+        with self._lock:
+            self.hits += 1
+            ids = None
+            if category is not None:
+                ids = self._by_category.get(category, set())
+            if completed is not None:
+                matched = self._by_completed.get(completed, set())
+                ids = matched if ids is None else ids & matched
+            end = bisect.bisect_left(self._order, before) if before else len(self._order)
+            wanted = end if limit is None else limit + 1
+
+            if ids is None:
+                keys = self._order[max(0, end - wanted):end][::-1]
+            elif len(ids) * 8 < len(self._order):
+                # 过滤后的任务较少时直接对它们排序
+                keys = sorted((self._entries[task_id][0] for task_id in ids), reverse=True)
+                keys = [key for key in keys if not before or key < before][:wanted]
+            else:
+                keys = []
+                for index in range(end - 1, -1, -1):
+                    key = self._order[index]
+                    if key[1] in ids:
+                        keys.append(key)
+                        if len(keys) == wanted:
+                            break
+
+            entries = [self._entries[key[1]] for key in keys]
+        if limit is not None and len(entries) > limit:
+            return entries[:limit], True
+        return entries, False
+
+    def check(self, cached, expected, what):
+        """一致性检查模式下比较缓存与数据库的结果"""
+        if cached != expected:
+            raise CacheInconsistencyError(f'任务缓存与数据库不一致（{what}）: {cached!r} != {expected!r}')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'loaded': self.loaded,
+                'tasks': len(self._entries),
+                'max_tasks': self.max_tasks,
+                'seq': self.seq,
+                'hits': self.hits,
+                'reloads': self.reloads,
+                'catch_ups': self.catch_ups,
+            }
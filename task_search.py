@@ -0,0 +1,243 @@
+"""
+任务全文搜索模块
+SQLite FTS5外部内容表索引任务的title和content，trigram分词按任意连续3个字符匹配，适合中文；
+索引由触发器与任务表保持同步。1~2个字的中日韩查询词（日常中文搜索最常见的情况）trigram无法匹配，
+改查二元组索引表：记录每个中日韩字符起始的两字片段，先按片段取候选任务，再用LIKE确认。
+数据库不支持FTS5或其它短查询词退回LIKE子串匹配
+"""
+
+from sqlalchemy import column, event, func, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+
+FTS_TABLE = 'task_fts'
+MIN_TERM_LENGTH = 3  # trigram分词下短于3个字符的词无法走索引
+
+CREATE_FTS_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    title, content, content='task', content_rowid='id', tokenize='trigram'
+)
+"""
+
+# 外部内容表需要在任务表变化时手动更新索引；只改完成状态、分类时不触发
+FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON task BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, content ON task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+fts_table = table(FTS_TABLE, column('rowid'), column('rank'))
+
+# 二元组索引：gram为从某个中日韩字符开始的两个字符（文本末尾为单个字符），单字查询按前缀范围匹配
+GRAM_TABLE = 'task_gram'
+GRAM_POSITIONS_TABLE = 'task_gram_pos'  # 1..GRAM_MAX_POSITIONS的序号表，触发器中不能用递归CTE切分文本
+GRAM_MAX_POSITIONS = 4096  # 超过此长度的文本不切分，只记录空片段，查询时始终作为候选交给LIKE确认
+CJK_MIN_CODEPOINT = 0x2E80  # 中日韩部首及之后的字符（含假名、谚文、全角符号）建立二元组
+# 候选任务达到此数量的常见词不走二元组索引：按创建时间顺序LIKE扫描很快就能凑满一页，
+# 而取出全部候选再排序反而更慢
+GRAM_CANDIDATE_LIMIT = 2000
+
+
+def gram_select(row, source=None):
+    """
+    返回(gram, task_id)行的查询：row（触发器中的new/old，或source中任务表的别名）的标题与内容的所有二元组，
+    超长文本另外返回空片段
+    """
+    positions = f'{source}, {GRAM_POSITIONS_TABLE} p' if source else f'{GRAM_POSITIONS_TABLE} p'
+    parts = [
+        f"""SELECT substr({row}.{field}, p.i, 2) AS gram, {row}.id AS task_id FROM {positions}
+            WHERE p.i <= length({row}.{field}) AND unicode(substr({row}.{field}, p.i, 1)) >= {CJK_MIN_CODEPOINT}"""
+        for field in ('title', 'content')
+    ]
+    parts.append(f"""SELECT '' AS gram, {row}.id AS task_id{f' FROM {source}' if source else ''}
+            WHERE max(length({row}.content), coalesce(length({row}.title), 0))
+                > (SELECT max(i) FROM {GRAM_POSITIONS_TABLE})""")
+    return '\n            UNION '.join(parts)
+
+
+GRAM_INSERT = f"INSERT OR IGNORE INTO {GRAM_TABLE}(gram, task_id) SELECT gram, task_id FROM ({gram_select('new')});"
+GRAM_DELETE = f"DELETE FROM {GRAM_TABLE} WHERE task_id = old.id AND gram IN (SELECT gram FROM ({gram_select('old')}));"
+
+CREATE_GRAM_TABLES = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {GRAM_TABLE} (
+        gram TEXT NOT NULL, task_id INTEGER NOT NULL, PRIMARY KEY (gram, task_id)
+    ) WITHOUT ROWID
+    """,
+    f"CREATE TABLE IF NOT EXISTS {GRAM_POSITIONS_TABLE} (i INTEGER PRIMARY KEY)",
+]
+
+GRAM_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {GRAM_TABLE}_ai AFTER INSERT ON task BEGIN
+        {GRAM_INSERT}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {GRAM_TABLE}_ad AFTER DELETE ON task BEGIN
+        {GRAM_DELETE}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {GRAM_TABLE}_au AFTER UPDATE OF title, content ON task BEGIN
+        {GRAM_DELETE}
+        {GRAM_INSERT}
+    END
+    """,
+]
+
+gram_table = table(GRAM_TABLE, column('gram'), column('task_id'))
+
+# 延迟导入，避免循环依赖
+db = None
+Task = None
+fts_enabled = False
+gram_enabled = False
+
+
+def init_app(flask_app, flask_db, task_model):
+    """
+    初始化搜索模块：任务表创建时一并创建索引、删除时一并删除（包括测试中的create_all/drop_all），
+    并为已存在的数据库补建索引
+    """
+    global db, Task
+    db = flask_db
+    Task = task_model
+    event.listen(Task.__table__, 'after_create', lambda target, connection, **kw: create_index(connection))
+    event.listen(Task.__table__, 'before_drop', lambda target, connection, **kw: drop_index(connection))
+
+    with flask_app.app_context():
+        with db.engine.begin() as connection:
+            if connection.dialect.has_table(connection, Task.__tablename__):
+                create_index(connection)
+
+
+def create_index(connection):
+    """创建FTS表、二元组表和同步触发器（已存在时跳过），新建的索引从任务表重建；返回FTS是否可用"""
+    global fts_enabled
+    if connection.dialect.name != 'sqlite':
+        fts_enabled = False
+        return False
+    try:
+        exists = connection.exec_driver_sql(
+            f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'").first()
+        connection.exec_driver_sql(CREATE_FTS_TABLE)
+        for trigger in FTS_TRIGGERS:
+            connection.exec_driver_sql(trigger)
+        if not exists:
+            connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        fts_enabled = True
+    except OperationalError as e:
+        print(f'SQLite不支持FTS5 trigram分词，搜索将使用LIKE匹配: {e}')
+        fts_enabled = False
+    # 二元组触发器必须在FTS触发器之后创建：SQLite 3.40中先建的普通触发器与后建的FTS5触发器同在任务表上时，
+    # 其它连接修改表结构后本连接重新加载结构时插入任务会报"no such table: task"
+    create_gram_index(connection)
+    return fts_enabled
+
+
+def create_gram_index(connection):
+    """创建二元组表、序号表和同步触发器，新建时从任务表回填"""
+    global gram_enabled
+    try:
+        exists = connection.exec_driver_sql(
+            f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{GRAM_TABLE}'").first()
+        for statement in CREATE_GRAM_TABLES:
+            connection.exec_driver_sql(statement)
+        for trigger in GRAM_TRIGGERS:
+            connection.exec_driver_sql(trigger)
+        if not exists:
+            connection.exec_driver_sql(
+                f"""WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {GRAM_MAX_POSITIONS})
+                INSERT OR IGNORE INTO {GRAM_POSITIONS_TABLE}(i) SELECT i FROM n""")
+            connection.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {GRAM_TABLE}(gram, task_id) SELECT gram, task_id FROM ({gram_select('t', 'task t')})")
+    except OperationalError as e:
+        print(f'创建二元组索引失败，1~2个字的搜索将使用LIKE匹配: {e}')
+        gram_enabled = False
+        return False
+    gram_enabled = True
+    return True
+
+
+def drop_index(connection):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {GRAM_TABLE}')
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {GRAM_POSITIONS_TABLE}')
+
+
+def fts_phrase(term):
+    """把用户输入转为FTS5短语，避免其中的引号、运算符被当作查询语法"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def like_pattern(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def is_short_cjk(term):
+    """1~2个字且都是中日韩字符的查询词，可以走二元组索引"""
+    return len(term) < MIN_TERM_LENGTH and all(ord(char) >= CJK_MIN_CODEPOINT for char in term)
+
+
+def gram_candidates(term):
+    """可能包含该词的任务ID：单字按前缀匹配二元组，两字精确匹配；超长未切分的任务始终是候选"""
+    if len(term) == 1:
+        match = gram_table.c.gram.between(term, term + chr(0x10FFFF))
+    else:
+        match = gram_table.c.gram == term
+    return select(gram_table.c.task_id).where(or_(match, gram_table.c.gram == ''))
+
+
+def gram_is_selective(term):
+    """该词的候选任务是否少于GRAM_CANDIDATE_LIMIT（最多计数到上限，代价有界）"""
+    sample = gram_candidates(term).limit(GRAM_CANDIDATE_LIMIT).subquery()
+    return db.session.execute(select(func.count()).select_from(sample)).scalar() < GRAM_CANDIDATE_LIMIT
+
+
+def search_tasks(query, category=None, completed=None, limit=20, offset=0):
+    """
+    搜索标题或内容包含所有关键词（空格分隔）的任务，返回(本页任务, 是否还有下一页)
+    走索引时按bm25相关度排序（相同时按ID），否则按创建时间倒序
+    """
+    terms = query.split()
+    if not terms:
+        raise ValueError('搜索关键词不能为空')
+
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH] if fts_enabled else []
+    grams = [term for term in terms if is_short_cjk(term) and gram_is_selective(term)] if gram_enabled else []
+    scanned = [term for term in terms if term not in indexed]
+
+    tasks = Task.query
+    if indexed:
+        tasks = tasks.join(fts_table, fts_table.c.rowid == Task.id) \
+            .filter(text(f'{FTS_TABLE} MATCH :match').bindparams(match=' '.join(map(fts_phrase, indexed))))
+    for term in grams:
+        tasks = tasks.filter(Task.id.in_(gram_candidates(term)))
+    for term in scanned:  # 二元组索引只筛选候选任务，仍由LIKE确认
+        pattern = like_pattern(term)
+        tasks = tasks.filter(or_(Task.title.like(pattern, escape='\\'), Task.content.like(pattern, escape='\\')))
+    if category:
+        tasks = tasks.filter(Task.category == category)
+    if completed is not None:
+        tasks = tasks.filter(Task.completed == completed)
+
+    if indexed:
+        tasks = tasks.order_by(fts_table.c.rank, Task.id)  # 相关度相同时按ID排序，保证分页稳定
+    else:
+        tasks = tasks.order_by(Task.created_at.desc(), Task.id.desc())
+    page = tasks.offset(offset).limit(limit + 1).all()
+    return page[:limit], len(page) > limit
@@ -0,0 +1,15 @@
+"""
+测试公共配置
+必须在导入app之前设置环境变量：数据库与变更总线都使用临时目录，
+测试中的drop_all不会清空开发者的任务数据库，也不会向正在运行的服务器推送消息
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix='todoapp-test-')
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+os.environ['TODO_DATABASE_URI'] = f'sqlite:///{os.path.join(TEST_DIR, "test.db")}'
+os.environ['TODO_CHANGE_BUS'] = os.path.join(TEST_DIR, 'change-bus.sock')
@@ -7,11 +7,18 @@ import json
 import tempfile
 import os
 import sys
+import csv
+import io
+from datetime import datetime, timedelta
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app, db, Task
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db, Task, iter_task_dicts, require_task_created_at
+import task_search
 
 class TestTodoAPI:
     """TodoApp API 测试类"""
@@ -157,5 +164,321 @@ class TestTodoAPI:
         assert data['completed'] is True
         assert data['completed_at'] is not None
 
+    def test_get_tasks_pagination(self):
+        """测试按游标分页获取任务（创建时间相同时按ID排序）"""
+        with app.app_context():
+            created_at = datetime(2024, 1, 1, 12, 0, 0)
+            db.session.add_all([Task(content=f'内容{i}', category='任务', created_at=created_at) for i in range(5)])
+            db.session.add(Task(content='较新的任务', category='提醒', created_at=created_at + timedelta(hours=1)))
+            db.session.commit()
+
+        pages = []
+        cursor = None
+        while True:
+            url = '/api/tasks?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            response = self.client.get(url)
+            assert response.status_code == 200
+            page = json.loads(response.data)
+            pages.append([task['content'] for task in page['tasks']])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        assert pages == [['较新的任务', '内容4'], ['内容3', '内容2'], ['内容1', '内容0']]
+
+        # 分页与过滤条件可以组合
+        response = self.client.get('/api/tasks?category=任务&limit=10')
+        page = json.loads(response.data)
+        assert len(page['tasks']) == 5 and page['next_cursor'] is None
+
+        assert self.client.get('/api/tasks?cursor=无效').status_code == 400
+        assert self.client.get('/api/tasks?limit=0').status_code == 400
+
+    def test_legacy_null_created_at_migrated(self):
+        """测试旧数据库中为空的created_at补为最早时间、之后不能再写入空值，补齐的任务分页时排在最后"""
+        engine = create_engine('sqlite://')
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                'CREATE TABLE task (id INTEGER PRIMARY KEY, title VARCHAR(200), content TEXT NOT NULL, '
+                'category VARCHAR(50) NOT NULL, completed BOOLEAN, created_at DATETIME, completed_at DATETIME)')
+            connection.exec_driver_sql("INSERT INTO task (content, category) VALUES ('旧任务', '任务')")
+            require_task_created_at(connection)
+            assert connection.exec_driver_sql('SELECT created_at FROM task').scalar() == '0001-01-01 00:00:00.000000'
+        with pytest.raises(IntegrityError):
+            with engine.begin() as connection:
+                connection.exec_driver_sql("INSERT INTO task (content, category) VALUES ('空时间', '任务')")
+        with pytest.raises(IntegrityError):
+            with engine.begin() as connection:
+                connection.exec_driver_sql('UPDATE task SET created_at = NULL')
+
+        with app.app_context():
+            db.session.add_all([Task(content='未知时间', category='任务', created_at=datetime.min),
+                                Task(content='新任务', category='任务')])
+            db.session.commit()
+        pages, cursor = [], None
+        while True:
+            page = json.loads(self.client.get('/api/tasks?limit=1' + (f'&cursor={cursor}' if cursor else '')).data)
+            pages.extend(task['content'] for task in page['tasks'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        assert pages == ['新任务', '未知时间']
+
+    def test_conditional_get(self):
+        """测试ETag与If-None-Match：数据未变化时返回304，任何写入后重新返回数据"""
+        response = self.client.post('/api/tasks', data=json.dumps({'content': '任务一', 'category': '任务'}),
+                                    content_type='application/json')
+        task_id = json.loads(response.data)['id']
+        other = self.client.post('/api/tasks', data=json.dumps({'content': '任务二', 'category': '提醒'}),
+                                 content_type='application/json')
+        other_id = json.loads(other.data)['id']
+
+        response = self.client.get('/api/tasks')
+        etag = response.headers['ETag']
+        assert not etag.startswith('W/')
+        response = self.client.get('/api/tasks', headers={'If-None-Match': etag})
+        assert response.status_code == 304 and response.data == b''
+        # 不同的查询参数对应不同的ETag
+        assert self.client.get('/api/tasks?category=任务').headers['ETag'] != etag
+
+        task_etag = self.client.get(f'/api/tasks/{task_id}').headers['ETag']
+        assert self.client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': task_etag}).status_code == 304
+
+        # 修改其它任务不影响单个任务的ETag，但会改变列表的ETag
+        self.client.put(f'/api/tasks/{other_id}/complete', data=json.dumps({'completed': True}),
+                        content_type='application/json')
+        assert self.client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': task_etag}).status_code == 304
+        response = self.client.get('/api/tasks', headers={'If-None-Match': etag})
+        assert response.status_code == 200 and len(json.loads(response.data)) == 2
+
+        self.client.put(f'/api/tasks/{task_id}', data=json.dumps({'content': '已修改'}),
+                        content_type='application/json')
+        response = self.client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': task_etag})
+        assert response.status_code == 200 and json.loads(response.data)['content'] == '已修改'
+
+        self.client.delete(f'/api/tasks/{task_id}')
+        assert self.client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': task_etag}).status_code == 404
+
+    def test_batch_tasks(self):
+        """测试批量创建、更新、完成、删除，并返回每条结果"""
+        with app.app_context():
+            tasks = [Task(content=f'内容{i}', category='任务') for i in range(4)]
+            db.session.add_all(tasks)
+            db.session.commit()
+            ids = [task.id for task in tasks]
+
+        payload = {
+            'create': [{'content': '新任务', 'category': '提醒'}, {'content': ''}, {'content': '分类错误', 'category': '无'}],
+            'update': [{'id': ids[0], 'title': '新标题', 'category': '想尝试'}, {'id': 99999, 'content': '不存在'}],
+            'complete': [{'id': ids[0], 'completed': True}, {'id': ids[1]}, ids[2]],
+            'delete': [ids[3], str(ids[2])]
+        }
+        response = self.client.post('/api/tasks/batch', data=json.dumps(payload), content_type='application/json')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        results = data['results']
+        assert data['success'] is False
+        assert [result['status'] for result in results['create']] == ['ok', 'error', 'error']
+        assert results['create'][1]['code'] == 'INVALID_TASK'
+        assert results['create'][2]['code'] == 'INVALID_CATEGORY'
+        assert results['create'][0]['task']['category'] == '提醒'
+        assert results['update'][1]['code'] == 'NOT_FOUND'
+        assert results['update'][0]['task']['completed'] is True
+        assert all(result['status'] == 'ok' for result in results['complete'] + results['delete'])
+
+        tasks = {task['id']: task for task in json.loads(self.client.get('/api/tasks').data)}
+        assert set(tasks) == {str(ids[0]), str(ids[1]), results['create'][0]['id']}
+        assert tasks[str(ids[0])]['title'] == '新标题' and tasks[str(ids[0])]['category'] == '想尝试'
+        assert tasks[str(ids[0])]['completed'] and tasks[str(ids[0])]['completed_at']
+        assert tasks[str(ids[1])]['completed'] is True  # 未指定completed时标记为完成
+
+        response = self.client.post('/api/tasks/batch', data=json.dumps({'delete': 'abc'}),
+                                    content_type='application/json')
+        assert response.status_code == 400
+
+    def test_batch_complete_sets_in_request_order(self):
+        """测试批量complete总是设置明确的值（不切换），同一任务出现多次时以请求中最后一条为准"""
+        with app.app_context():
+            tasks = [Task(content='已完成', category='任务', completed=True), Task(content='未完成', category='任务')]
+            db.session.add_all(tasks)
+            db.session.commit()
+            done, todo = [str(task.id) for task in tasks]
+
+        payload = {'complete': [{'id': done}, {'id': todo, 'completed': True}, todo, {'id': todo, 'completed': False}]}
+        results = json.loads(self.client.post('/api/tasks/batch', data=json.dumps(payload),
+                                              content_type='application/json').data)['results']
+        assert [result['task']['completed'] for result in results['complete']] == [True, False, False, False]
+
+        tasks = {task['id']: task['completed'] for task in json.loads(self.client.get('/api/tasks').data)}
+        assert tasks == {done: True, todo: False}
+
+    def test_batch_rejects_invalid_field_types(self):
+        """测试批量创建、更新时字段类型错误逐条返回INVALID_TASK，不做类型转换"""
+        payload = {'create': [{'content': '字符串完成状态', 'completed': 'false'}, {'content': 5},
+                              {'content': '正常', 'title': ['列表']}, {'content': '正常'}]}
+        response = self.client.post('/api/tasks/batch', data=json.dumps(payload), content_type='application/json')
+        results = json.loads(response.data)['results']['create']
+        assert [result.get('code') for result in results] == ['INVALID_TASK'] * 3 + [None]
+        task_id = results[3]['id']
+
+        payload = {'update': [{'id': task_id, 'content': 5}, {'id': task_id, 'title': '标题'}]}
+        response = self.client.post('/api/tasks/batch', data=json.dumps(payload), content_type='application/json')
+        results = json.loads(response.data)['results']['update']
+        assert [result['status'] for result in results] == ['error', 'ok']
+        assert results[0]['code'] == 'INVALID_TASK'
+
+        tasks = json.loads(self.client.get('/api/tasks').data)
+        assert [(task['content'], task['title'], task['completed']) for task in tasks] == [('正常', '标题', False)]
+
+    def test_search_tasks(self):
+        """测试全文搜索：中文子串、多关键词、短关键词、过滤、随修改删除同步"""
+        with app.app_context():
+            tasks = [
+                Task(title='周末计划', content='和朋友去爬山，记得带水', category='想尝试'),
+                Task(title=None, content='给客户写项目周报邮件', category='任务'),
+                Task(title='买菜', content='周末去超市买水果和蔬菜', category='提醒', completed=True),
+            ]
+            db.session.add_all(tasks)
+            db.session.commit()
+            ids = [task.id for task in tasks]
+
+        def search(query_string):
+            response = self.client.get(f'/api/tasks/search?{query_string}')
+            assert response.status_code == 200
+            return json.loads(response.data)
+
+        assert [task['id'] for task in search('q=项目周报')['tasks']] == [str(ids[1])]
+        assert {task['id'] for task in search('q=周末')['tasks']} == {str(ids[0]), str(ids[2])}
+        assert [task['id'] for task in search('q=超市 水果')['tasks']] == [str(ids[2])]
+        assert search('q=周末&completed=false')['tasks'][0]['id'] == str(ids[0])
+        assert search('q=周末&category=任务')['tasks'] == []
+
+        page = search('q=周末&limit=1')
+        assert len(page['tasks']) == 1 and page['next_offset'] == 1
+        assert search('q=周末&limit=1&offset=1')['next_offset'] is None
+
+        # 修改和删除后索引同步更新
+        self.client.put(f'/api/tasks/{ids[1]}', data=json.dumps({'content': '整理会议纪要'}),
+                        content_type='application/json')
+        assert search('q=项目周报')['tasks'] == []
+        assert [task['id'] for task in search('q=会议纪要')['tasks']] == [str(ids[1])]
+        self.client.delete(f'/api/tasks/{ids[0]}')
+        assert [task['id'] for task in search('q=周末')['tasks']] == [str(ids[2])]
+
+        assert self.client.get('/api/tasks/search?q=').status_code == 400
+        assert self.client.get('/api/tasks/search?q=周末&category=无').status_code == 400
+
+    def test_search_short_cjk_terms(self):
+        """测试1~2个字的中文关键词走二元组索引，结果与LIKE扫描一致，并随修改删除同步"""
+        contents = ['买菜做饭', '做饭', '饭后散步', '明天买菜', 'buy 菜', '长' * task_search.GRAM_MAX_POSITIONS + '饭']
+        with app.app_context():
+            tasks = [Task(title='周报' if i % 2 else None, content=content, category='任务')
+                     for i, content in enumerate(contents)]
+            db.session.add_all(tasks)
+            db.session.commit()
+            ids = [str(task.id) for task in tasks]
+
+        def search(query):
+            return {task['id'] for task in json.loads(self.client.get(f'/api/tasks/search?q={query}').data)['tasks']}
+
+        queries = ['饭', '买菜', '做饭', '菜', '周报', '周', '饭 买', '散步 饭后']
+        with app.app_context():
+            assert task_search.gram_enabled and task_search.gram_is_selective('饭')
+        indexed = [search(query) for query in queries]
+        task_search.gram_enabled = False
+        try:
+            assert [search(query) for query in queries] == indexed
+        finally:
+            task_search.gram_enabled = True
+        assert search('饭') == {ids[0], ids[1], ids[2], ids[5]}
+        assert search('周报') == {ids[1], ids[3], ids[5]}
+
+        self.client.put(f'/api/tasks/{ids[1]}', data=json.dumps({'content': '洗碗'}), content_type='application/json')
+        self.client.delete(f'/api/tasks/{ids[0]}')
+        assert search('饭') == {ids[2], ids[5]}
+        assert search('碗') == {ids[1]}
+
+    def test_search_pagination_with_equal_rank(self):
+        """测试相关度相同的搜索结果分页时不重复、不遗漏"""
+        with app.app_context():
+            tasks = [Task(content='准备季度报告', category='任务') for _ in range(10)]
+            db.session.add_all(tasks)
+            db.session.commit()
+            ids = [str(task.id) for task in tasks]
+
+        found, offset = [], 0
+        while offset is not None:
+            page = json.loads(self.client.get(f'/api/tasks/search?q=季度报告&limit=3&offset={offset}').data)
+            found.extend(task['id'] for task in page['tasks'])
+            offset = page['next_offset']
+        assert found == ids
+
+    def test_fast_listing_matches_to_dict(self):
+        """测试按列读取的列表序列化与to_dict输出一致"""
+        with app.app_context():
+            db.session.add_all([
+                Task(title='标题', content='内容1', category='任务', created_at=datetime(2024, 1, 1, 8, 0, 0)),
+                Task(title=None, content='内容2', category='提醒', completed=True,
+                     created_at=datetime(2024, 1, 2, 8, 0, 0, 123456), completed_at=datetime(2024, 1, 3)),
+            ])
+            db.session.commit()
+            query = Task.query.order_by(Task.created_at.desc(), Task.id.desc())
+            expected = [task.to_dict() for task in query.all()]
+            assert list(iter_task_dicts(query)) == expected
+
+        assert json.loads(self.client.get('/api/tasks').data) == expected
+
+    def test_field_projection_and_summary(self):
+        """测试fields投影与摘要模式（content截断为预览）"""
+        long_content = '长' * 300
+        with app.app_context():
+            db.session.add_all([
+                Task(title='长笔记', content=long_content, category='任务', created_at=datetime(2024, 1, 2)),
+                Task(title='短笔记', content='短', category='提醒', created_at=datetime(2024, 1, 1)),
+            ])
+            db.session.commit()
+
+        tasks = json.loads(self.client.get('/api/tasks?fields=title,completed').data)
+        assert tasks == [{'id': tasks[0]['id'], 'title': '长笔记', 'completed': False},
+                         {'id': tasks[1]['id'], 'title': '短笔记', 'completed': False}]
+
+        tasks = json.loads(self.client.get('/api/tasks?summary=true').data)
+        assert tasks[0]['content'] == '长' * 100 and tasks[0]['content_truncated'] is True
+        assert tasks[1]['content'] == '短' and tasks[1]['content_truncated'] is False
+        assert tasks[0]['category'] == '任务' and tasks[0]['created_at'] == '2024-01-02T00:00:00'
+        # 完整内容按需获取
+        assert json.loads(self.client.get(f'/api/tasks/{tasks[0]["id"]}').data)['content'] == long_content
+
+        # 投影不含created_at时分页游标依然有效
+        page = json.loads(self.client.get('/api/tasks?fields=title&limit=1').data)
+        page = json.loads(self.client.get(f'/api/tasks?fields=title&limit=1&cursor={page["next_cursor"]}').data)
+        assert page['tasks'][0]['title'] == '短笔记' and page['next_cursor'] is None
+
+        assert self.client.get('/api/tasks?fields=title,secret').status_code == 400
+
+    def test_export_tasks(self):
+        """测试以NDJSON和CSV流式导出任务，并支持过滤"""
+        with app.app_context():
+            db.session.add_all([
+                Task(title='标题, 带逗号', content='第一行\n第二行', category='任务', created_at=datetime(2024, 1, 2)),
+                Task(title=None, content='已完成', category='提醒', completed=True, created_at=datetime(2024, 1, 1)),
+            ])
+            db.session.commit()
+
+        response = self.client.get('/api/tasks/export?format=ndjson')
+        assert response.status_code == 200 and response.is_streamed
+        assert response.mimetype == 'application/x-ndjson'
+        assert 'attachment' in response.headers['Content-Disposition']
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert lines == json.loads(self.client.get('/api/tasks').data)
+
+        response = self.client.get('/api/tasks/export?format=csv&completed=false')
+        rows = list(csv.reader(io.StringIO(response.get_data(as_text=True).lstrip('\ufeff'))))
+        assert rows[0] == ['id', 'title', 'content', 'category', 'completed', 'created_at', 'completed_at']
+        assert rows[1][1:6] == ['标题, 带逗号', '第一行\n第二行', '任务', 'false', '2024-01-02T00:00:00']
+        assert len(rows) == 2
+
+        assert self.client.get('/api/tasks/export?format=xml').status_code == 400
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
\ No newline at end of file
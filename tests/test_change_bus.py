@@ -0,0 +1,199 @@
+"""
+TodoApp 变更总线测试文件
+"""
+
+import pytest
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, db
+from change_bus import ChangeBus, HAS_AF_UNIX, MAX_DATAGRAM_SIZE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestChangeBus:
+    """变更总线测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        if HAS_AF_UNIX:
+            self.address = os.path.join(tempfile.mkdtemp(), 'bus.sock')
+        else:
+            self.address = ('127.0.0.1', 0)
+        self.bus = ChangeBus(self.address)
+        self.received = []
+        self.event = threading.Event()
+        self.bus.serve(self.on_message)
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        self.bus.close()
+
+    def on_message(self, message):
+        self.received.append(message)
+        self.event.set()
+
+    def test_publish_from_other_process(self):
+        """测试其它进程发布的变更被订阅进程收到"""
+        message = {'type': 'sync_notification', 'data': {'action': 'create', 'task': {'id': '1'}}}
+        code = (f'from change_bus import ChangeBus; '
+                f'assert ChangeBus({self.bus.address!r}).publish({message!r})')
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, timeout=30)
+        assert self.event.wait(5)
+        assert self.received == [message]
+
+    def test_oversized_message_becomes_resync(self):
+        """测试超过数据报上限的变更改为通知客户端重新同步"""
+        publisher = ChangeBus(self.bus.address)
+        publisher.publish({'type': 'sync_notification', 'data': {'blob': 'x' * MAX_DATAGRAM_SIZE}})
+        assert self.event.wait(5)
+        assert self.received == [{'type': 'resync_required', 'data': {}}]
+
+    def test_same_process_dispatches_directly(self):
+        """测试订阅进程内发布直接调用处理函数"""
+        assert self.bus.publish({'type': 'ping'})
+        assert self.received == [{'type': 'ping'}]
+        assert self.bus.received == 0
+
+    @pytest.mark.skipif(not HAS_AF_UNIX, reason='需要Unix域套接字')
+    def test_live_socket_is_private_and_not_taken_over(self):
+        """测试套接字只有当前用户可访问，仍在使用的总线不会被第二个进程抢占"""
+        assert stat.S_IMODE(os.stat(self.address).st_mode) == 0o600
+        with pytest.raises(OSError):
+            ChangeBus(self.address).serve(lambda message: None)
+
+        assert ChangeBus(self.address).publish({'type': 'ping'})
+        assert self.event.wait(5)
+        assert self.received == [{'type': 'ping'}]
+
+    @pytest.mark.skipif(not HAS_AF_UNIX, reason='需要Unix域套接字')
+    def test_stale_socket_is_replaced(self):
+        """测试异常退出留下的套接字文件在下次启动时被清理"""
+        address = os.path.join(tempfile.mkdtemp(), 'run', 'bus.sock')
+        os.makedirs(os.path.dirname(address))
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        stale.bind(address)
+        stale.close()  # 不删除套接字文件，模拟异常退出
+
+        bus = ChangeBus(address)
+        try:
+            bus.serve(lambda message: None)
+        finally:
+            bus.close()
+
+    @pytest.mark.skipif(not HAS_AF_UNIX, reason='需要Unix域套接字')
+    def test_datagram_over_system_limit_becomes_resync(self):
+        """测试消息未超过MAX_DATAGRAM_SIZE但超过系统数据报上限（如macOS）时改发resync_required"""
+        publisher = ChangeBus(self.bus.address)
+        with publisher._sock_lock:
+            publisher._publisher_socket().setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        assert publisher.publish({'type': 'sync_notification', 'data': {'blob': 'x' * (MAX_DATAGRAM_SIZE // 2)}})
+        assert self.event.wait(5)
+        assert self.received == [{'type': 'resync_required', 'data': {}}]
+        assert publisher.resyncs == 1 and publisher.dropped == 0
+
+    @pytest.mark.skipif(not HAS_AF_UNIX, reason='需要Unix域套接字')
+    def test_backlog_drop_is_followed_by_resync(self):
+        """测试接收方积压丢弃消息后，下一次发布前先补发resync_required"""
+        address = os.path.join(tempfile.mkdtemp(), 'bus.sock')
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(address)
+        receiver.settimeout(5)
+        publisher = ChangeBus(address)
+        try:
+            sent = 0
+            while publisher.publish({'type': 'ping', 'data': {'blob': 'x' * 1000}}):
+                sent += 1
+                assert sent < 100000
+            assert publisher.dropped == 1
+            for _ in range(sent):
+                receiver.recv(65536)
+
+            assert publisher.publish({'type': 'pong', 'data': {}})
+            assert json.loads(receiver.recv(65536)) == {'type': 'resync_required', 'data': {}}
+            assert json.loads(receiver.recv(65536)) == {'type': 'pong', 'data': {}}
+        finally:
+            receiver.close()
+
+    def test_no_subscriber_is_dropped(self):
+        """测试没有订阅进程时发布不会抛出异常"""
+        self.bus.close()
+        publisher = ChangeBus(self.bus.address)
+        publisher.publish({'type': 'ping'})
+        if HAS_AF_UNIX:
+            assert publisher.dropped == 1
+
+
+class TestRestBroadcast:
+    """HTTP接口发布变更测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.published = []
+        app_module.change_bus.handler = self.published.append
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        app_module.change_bus.handler = None
+        with app.app_context():
+            db.drop_all()
+
+    def test_tests_use_temporary_bus(self):
+        """测试测试进程使用conftest指定的临时总线，不会向正在运行的服务器推送"""
+        assert app_module.change_bus.address == os.environ['TODO_CHANGE_BUS']
+
+    def test_tests_use_temporary_database(self):
+        """测试测试进程使用conftest指定的临时数据库，drop_all不会清空开发者的数据"""
+        with app.app_context():
+            assert str(db.engine.url) == os.environ['TODO_DATABASE_URI']
+
+    def test_rest_writes_publish_changes(self):
+        """测试创建、更新、完成、删除任务都会发布变更"""
+        response = self.client.post('/api/tasks', data=json.dumps({'content': '任务', 'category': '提醒'}),
+                                    content_type='application/json')
+        task_id = json.loads(response.data)['id']
+        self.client.put(f'/api/tasks/{task_id}', data=json.dumps({'category': '任务'}),
+                        content_type='application/json')
+        self.client.put(f'/api/tasks/{task_id}/complete', data=json.dumps({'completed': True}),
+                        content_type='application/json')
+        self.client.delete(f'/api/tasks/{task_id}')
+
+        changes = [message['data'] for message in self.published]
+        assert [change['action'] for change in changes] == ['create', 'update', 'update', 'delete']
+        assert changes[1]['previous'] == {'category': '提醒', 'completed': False}
+        assert changes[2]['task']['completed'] is True
+        assert changes[3]['task']['id'] == task_id
+
+    def test_batch_publishes_one_notification(self):
+        """测试批量接口只发布一条合并的变更通知"""
+        response = self.client.post('/api/tasks', data=json.dumps({'content': '任务', 'category': '提醒'}),
+                                    content_type='application/json')
+        task_id = json.loads(response.data)['id']
+        self.published.clear()
+
+        payload = {'create': [{'content': '新任务'}], 'complete': [{'id': task_id, 'completed': True}],
+                   'delete': [task_id]}
+        self.client.post('/api/tasks/batch', data=json.dumps(payload), content_type='application/json')
+
+        assert len(self.published) == 1
+        data = self.published[0]['data']
+        assert data['action'] == 'batch'
+        # 同一任务先完成后删除，只推送最终的删除
+        assert [change['action'] for change in data['changes']] == ['create', 'delete']
+        assert data['changes'][1] == {'action': 'delete', 'id': task_id,
+                                      'previous': {'category': '提醒', 'completed': False}}
@@ -0,0 +1,81 @@
+"""
+TodoApp HTTP响应压缩测试文件
+"""
+
+import gzip
+import json
+import os
+import sys
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Task, response_compressor
+from http_compression import ENCODINGS, negotiate_encoding
+
+
+class TestResponseCompression:
+    """HTTP响应压缩测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([
+                Task(title=f'任务{i}', content='整理周报，给妈妈打电话，周末去爬山', category='任务',
+                     created_at=datetime(2024, 1, 1, 0, 0, i % 60))
+                for i in range(200)
+            ])
+            db.session.commit()
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        with app.app_context():
+            db.drop_all()
+
+    def test_negotiate_encoding(self):
+        """测试按q值协商编码"""
+        assert negotiate_encoding('gzip, deflate') == 'gzip'
+        assert negotiate_encoding('gzip;q=0, identity') is None
+        assert negotiate_encoding('') is None
+        assert negotiate_encoding('*') == ENCODINGS[0]
+        if 'br' in ENCODINGS:
+            assert negotiate_encoding('gzip, br') == 'br'
+            assert negotiate_encoding('gzip;q=1, br;q=0.5') == 'gzip'
+
+    def test_large_listing_is_gzipped(self):
+        """测试大列表按gzip压缩，内容不变"""
+        plain = self.client.get('/api/tasks')
+        assert 'Content-Encoding' not in plain.headers
+        assert 'Accept-Encoding' in plain.headers['Vary']
+
+        response = self.client.get('/api/tasks', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert int(response.headers['Content-Length']) == len(response.data)
+        assert json.loads(gzip.decompress(response.data)) == json.loads(plain.data)
+        assert len(plain.data) / len(response.data) > 5
+
+    def test_small_response_not_compressed(self):
+        """测试小于阈值的响应不压缩"""
+        task_id = json.loads(self.client.get('/api/tasks?limit=1').data)['tasks'][0]['id']
+        response = self.client.get(f'/api/tasks/{task_id}', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_etag_and_cached_compression(self):
+        """测试压缩表示使用带后缀的强ETag，条件请求命中304，重复请求复用压缩结果"""
+        headers = {'Accept-Encoding': 'gzip'}
+        first = self.client.get('/api/tasks', headers=headers)
+        etag = first.headers['ETag']
+        assert etag.endswith('-gzip"') and not etag.startswith('W/')
+
+        hits = response_compressor.cache_hits
+        second = self.client.get('/api/tasks', headers=headers)
+        assert second.data == first.data
+        assert response_compressor.cache_hits == hits + 1
+
+        not_modified = self.client.get('/api/tasks', headers={**headers, 'If-None-Match': etag})
+        assert not_modified.status_code == 304
+        assert not_modified.headers['ETag'] == etag
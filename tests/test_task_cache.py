@@ -0,0 +1,153 @@
+"""
+TodoApp 任务内存缓存测试文件
+"""
+
+import pytest
+import json
+import os
+import sys
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Task, TaskChange, SimpleWebSocketServer, task_cache
+from task_cache import CacheInconsistencyError
+
+
+class TestTaskCache:
+    """任务缓存测试类（一致性检查模式下运行，每次由缓存返回的结果都与数据库比较）"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.server = SimpleWebSocketServer(app, host='127.0.0.1', port=0)
+        task_cache.invalidate()
+        task_cache.enabled = True
+        task_cache.verify = True
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        task_cache.enabled = False
+        task_cache.verify = False
+        task_cache.max_tasks = 100000
+        task_cache.invalidate()
+        with app.app_context():
+            db.drop_all()
+
+    def create(self, content, category='任务'):
+        response = self.client.post('/api/tasks', data=json.dumps({'content': content, 'category': category}),
+                                    content_type='application/json')
+        return json.loads(response.data)['id']
+
+    def test_reads_served_from_cache(self):
+        """测试列表、分页、过滤与单个任务由缓存返回，结果与数据库一致"""
+        with app.app_context():
+            db.session.add_all([Task(content=f'内容{i}', category=['任务', '提醒'][i % 2], completed=i % 3 == 0,
+                                     created_at=datetime(2024, 1, 1, 0, 0, i % 5)) for i in range(30)])
+            db.session.commit()
+
+        reloads = task_cache.reloads
+        tasks = json.loads(self.client.get('/api/tasks').data)
+        assert len(tasks) == 30 and task_cache.loaded and task_cache.reloads == reloads + 1
+
+        pages, cursor = [], None
+        while True:
+            url = '/api/tasks?limit=7&category=提醒&completed=false' + (f'&cursor={cursor}' if cursor else '')
+            data = json.loads(self.client.get(url).data)
+            pages.extend(data['tasks'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        assert pages == [task for task in tasks if task['category'] == '提醒' and not task['completed']]
+
+        task = json.loads(self.client.get(f'/api/tasks/{tasks[0]["id"]}').data)
+        assert task == tasks[0]
+        assert self.client.get('/api/tasks/99999').status_code == 404
+        assert task_cache.reloads == reloads + 1
+
+    def test_same_bytes_under_same_etag(self):
+        """测试缓存与数据库两条路径在同一ETag下返回完全相同的响应字节"""
+        for i in range(3):
+            self.create(f'内容{i}', ['任务', '提醒'][i % 2])
+        task_id = json.loads(self.client.get('/api/tasks').data)[0]['id']
+        urls = ['/api/tasks', '/api/tasks?limit=2', '/api/tasks?category=提醒', f'/api/tasks/{task_id}']
+
+        cached = [self.client.get(url) for url in urls]
+        task_cache.enabled = False
+        uncached = [self.client.get(url) for url in urls]
+        for first, second in zip(cached, uncached):
+            assert first.headers['ETag'] == second.headers['ETag']
+            assert first.data == second.data
+
+    def test_write_through(self):
+        """测试HTTP、WebSocket、批量接口与清空的写入直写进缓存，不需要重新加载"""
+        first = self.create('第一条')
+        self.client.get('/api/tasks')
+        seq, reloads, catch_ups = task_cache.seq, task_cache.reloads, task_cache.catch_ups
+
+        second = self.create('第二条', '提醒')
+        self.client.put(f'/api/tasks/{first}', data=json.dumps({'title': '标题'}), content_type='application/json')
+        response, _ = self.server.process_message({'type': 'update_task_completed',
+                                                   'data': {'id': int(second), 'completed': True}})
+        assert response['type'] == 'task_completed_updated'
+        self.server.process_message({'type': 'create_task', 'data': {'task': {'content': 'WebSocket'}}})
+        self.client.post('/api/tasks/batch', data=json.dumps({'create': [{'content': '批量'}], 'delete': [first]}),
+                         content_type='application/json')
+        assert task_cache.seq > seq and task_cache.catch_ups == catch_ups
+
+        tasks = json.loads(self.client.get('/api/tasks').data)
+        assert {task['content'] for task in tasks} == {'第二条', 'WebSocket', '批量'}
+        assert [task['completed'] for task in tasks if task['content'] == '第二条'] == [True]
+        assert (task_cache.reloads, task_cache.catch_ups) == (reloads, catch_ups)
+
+        self.server.process_message({'type': 'clear_all_tasks', 'data': {}})
+        assert json.loads(self.client.get('/api/tasks').data) == []
+        assert (task_cache.reloads, task_cache.catch_ups) == (reloads, catch_ups)
+
+    def test_catch_up_external_write(self):
+        """测试其它进程直接写库后，读取前按变更日志增量追上"""
+        task_id = int(self.create('原内容'))
+        self.create('保留')
+        self.client.get('/api/tasks')
+        reloads, catch_ups = task_cache.reloads, task_cache.catch_ups
+
+        with app.app_context():
+            with db.engine.begin() as connection:  # 不经过会话，模拟另一个进程的写入
+                connection.execute(Task.__table__.update().where(Task.id == task_id).values(content='外部修改'))
+                connection.execute(TaskChange.__table__.insert().values(task_id=task_id, action='update'))
+
+        task = json.loads(self.client.get(f'/api/tasks/{task_id}').data)
+        assert task['content'] == '外部修改'
+        assert (task_cache.reloads, task_cache.catch_ups) == (reloads, catch_ups + 1)
+
+        response = self.server.process_message({'type': 'fetch_tasks', 'data': {}})[0]
+        assert sorted(task['content'] for task in response['data']['tasks']) == ['保留', '外部修改']
+
+    def test_inconsistency_detected(self):
+        """测试一致性检查模式能发现未记录变更日志的写入"""
+        task_id = int(self.create('原内容'))
+        self.client.get('/api/tasks')
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(Task.__table__.update().where(Task.id == task_id).values(content='漏记'))
+
+        with pytest.raises(CacheInconsistencyError):
+            self.client.get(f'/api/tasks/{task_id}')
+
+    def test_oversized_falls_back(self):
+        """测试任务数超过上限时不缓存，读取直接查询数据库"""
+        task_cache.max_tasks = 2
+        for i in range(3):
+            self.create(f'内容{i}')
+
+        assert len(json.loads(self.client.get('/api/tasks').data)) == 3
+        assert not task_cache.loaded and task_cache.stats()['tasks'] == 0
+
+        self.client.delete(f'/api/tasks/{self.create("再删掉")}')
+        self.server.process_message({'type': 'clear_all_tasks', 'data': {}})
+        assert json.loads(self.client.get('/api/tasks').data) == []
+        assert task_cache.loaded
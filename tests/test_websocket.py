@@ -0,0 +1,1181 @@
+"""
+TodoApp WebSocket 测试文件
+"""
+
+import pytest
+import json
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+import zlib
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Task, TaskChange, SimpleWebSocketServer
+from websocket_loop import EventLoop, SELECT_MAX_CONNECTIONS, send_parts
+from websocket_coalesce import BroadcastCoalescer
+from websocket_heartbeat import TimerWheel
+from websocket_codec import JSON_CODEC, SUBPROTOCOLS, negotiate_subprotocol
+from websocket_ratelimit import RateLimiter, TokenBucket
+from websocket_workers import DBWorkerPool, PoolBusy, JobTimeout
+from websocket_deflate import DeflateError, negotiate as negotiate_deflate
+from websocket_frame import (
+    FrameDecoder, FrameError, unmask, encode_frame, encode_frame_header, OPCODE_TEXT, OPCODE_BINARY, OPCODE_CONTINUATION,
+    OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG
+)
+
+
+def ws_handshake(port, extra_headers=''):
+    """建立原始WebSocket连接并完成握手，返回(socket, 响应头文本)"""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    sock.sendall((
+        'GET / HTTP/1.1\r\n'
+        'Host: 127.0.0.1\r\n'
+        'Upgrade: websocket\r\n'
+        'Connection: Upgrade\r\n'
+        'Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n'
+        'Sec-WebSocket-Version: 13\r\n' + extra_headers + '\r\n'
+    ).encode('utf-8'))
+    response = b''
+    while b'\r\n\r\n' not in response:
+        response += sock.recv(1)
+    assert response.startswith(b'HTTP/1.1 101')
+    return sock, response.decode('utf-8')
+
+
+def ws_connect(port):
+    """建立原始WebSocket连接并完成握手"""
+    return ws_handshake(port)[0]
+
+
+def ws_frame(payload, opcode=0x1, fin=True, mask=b'\x01\x02\x03\x04', rsv1=False):
+    """构造客户端发往服务器的带掩码数据帧"""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    header = bytearray([(0x80 if fin else 0) | (0x40 if rsv1 else 0) | opcode])
+    length = len(payload)
+    if length < 126:
+        header.append(0x80 | length)
+    elif length < 65536:
+        header.append(0x80 | 126)
+        header.extend(length.to_bytes(2, 'big'))
+    else:
+        header.append(0x80 | 127)
+        header.extend(length.to_bytes(8, 'big'))
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + mask + masked
+
+
+def ws_send(sock, message):
+    sock.sendall(ws_frame(json.dumps(message)))
+
+
+def ws_recv_frame(sock):
+    """读取一个服务器帧，返回(操作码, 负载)"""
+    first, payload = ws_recv_raw_frame(sock)
+    return first & 0x0f, payload
+
+
+def ws_recv_raw_frame(sock):
+    """读取一个服务器帧，返回(首字节, 负载)"""
+    def recv_exact(n):
+        data = b''
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError('连接已关闭')
+            data += chunk
+        return data
+
+    first, second = recv_exact(2)
+    length = second & 0x7f
+    if length == 126:
+        length = int.from_bytes(recv_exact(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(recv_exact(8), 'big')
+    return first, recv_exact(length)
+
+
+def ws_recv(sock, expected_type=None):
+    """读取下一条JSON消息，可跳过类型不匹配的消息（如广播通知）"""
+    while True:
+        opcode, payload = ws_recv_frame(sock)
+        message = json.loads(payload.decode('utf-8'))
+        if expected_type is None or message['type'] == expected_type:
+            return message
+
+
+class TestWebSocketServer:
+    """WebSocket 服务器测试类"""
+
+    mode = 'selector'
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+        self.server = SimpleWebSocketServer(app, host='127.0.0.1', port=0, mode=self.mode)
+        self.server.start()
+        assert self.server.ready.wait(5)
+        self.sockets = []
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        for sock in self.sockets:
+            sock.close()
+        self.server.stop()
+        with app.app_context():
+            db.drop_all()
+
+    def connect(self):
+        sock = ws_connect(self.server.port)
+        self.sockets.append(sock)
+        return sock
+
+    def test_ping_pong(self):
+        """测试心跳消息"""
+        sock = self.connect()
+        ws_send(sock, {'type': 'ping', 'data': {}})
+        assert ws_recv(sock) == {'type': 'pong', 'data': {}}
+
+    def test_create_and_fetch_tasks(self):
+        """测试创建任务后拉取任务列表"""
+        sock = self.connect()
+        ws_send(sock, {'type': 'create_task', 'data': {'task': {'content': '内容', 'category': '任务'}},
+                       'requestId': 'r1'})
+        created = ws_recv(sock, 'task_created')
+        assert created['data']['requestId'] == 'r1'
+        assert created['data']['task']['content'] == '内容'
+
+        ws_send(sock, {'type': 'fetch_tasks', 'data': {}})
+        tasks = ws_recv(sock, 'tasks_data')['data']['tasks']
+        assert [task['content'] for task in tasks] == ['内容']
+
+    def test_split_and_pipelined_frames(self):
+        """测试分多次到达的帧以及一次到达的多个帧"""
+        sock = self.connect()
+        frame = ws_frame(json.dumps({'type': 'ping', 'data': {}}))
+        sock.sendall(frame[:3])
+        sock.sendall(frame[3:] + frame)
+        assert ws_recv(sock)['type'] == 'pong'
+        assert ws_recv(sock)['type'] == 'pong'
+
+    def test_long_handshake_with_pipelined_frame(self):
+        """测试超过1024字节的握手请求头，以及与握手同一次发送的帧不会丢失"""
+        sock = socket.create_connection(('127.0.0.1', self.server.port), timeout=5)
+        self.sockets.append(sock)
+        sock.sendall((
+            'GET / HTTP/1.1\r\n'
+            'Host: 127.0.0.1\r\n'
+            'Cookie: ' + 'x' * 2000 + '\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            'Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n'
+            'Sec-WebSocket-Version: 13\r\n\r\n'
+        ).encode('utf-8') + ws_frame(json.dumps({'type': 'ping', 'data': {}})))
+        response = b''
+        while b'\r\n\r\n' not in response:
+            response += sock.recv(1)
+        assert response.startswith(b'HTTP/1.1 101')
+        assert ws_recv(sock)['type'] == 'pong'
+
+    def test_large_message(self):
+        """测试超过单次recv大小的消息不会被截断"""
+        sock = self.connect()
+        content = '长内容' * 50000
+        ws_send(sock, {'type': 'create_task', 'data': {'task': {'content': content}}})
+        created = ws_recv(sock, 'task_created')
+        assert created['data']['task']['content'] == content
+
+    def test_fragmented_message_and_control_frames(self):
+        """测试分片消息中间穿插ping，以及关闭握手"""
+        sock = self.connect()
+        text = json.dumps({'type': 'ping', 'data': {}}).encode('utf-8')
+        sock.sendall(ws_frame(text[:5], OPCODE_TEXT, fin=False) +
+                     ws_frame(b'hi', OPCODE_PING) +
+                     ws_frame(text[5:], OPCODE_CONTINUATION))
+        assert ws_recv_frame(sock) == (OPCODE_PONG, b'hi')
+        assert ws_recv(sock)['type'] == 'pong'
+
+        sock.sendall(ws_frame((1000).to_bytes(2, 'big'), OPCODE_CLOSE))
+        assert ws_recv_frame(sock) == (OPCODE_CLOSE, (1000).to_bytes(2, 'big'))
+        assert sock.recv(1) == b''
+
+    def test_subscription_filters_broadcasts(self):
+        """测试订阅分类后只收到该分类任务的推送，任务移出分类时仍会收到通知"""
+        watcher = self.connect()
+        ws_send(watcher, {'type': 'subscribe', 'data': {'categories': ['提醒']}})
+        assert ws_recv(watcher, 'subscribed')['data']['categories'] == ['提醒']
+
+        writer = self.connect()
+        ws_send(writer, {'type': 'create_task', 'data': {'task': {'content': '普通任务', 'category': '任务'}}})
+        ws_recv(writer, 'task_created')
+        ws_send(writer, {'type': 'create_task', 'data': {'task': {'content': '提醒事项', 'category': '提醒'}}})
+        task = ws_recv(writer, 'task_created')['data']['task']
+
+        notification = ws_recv(watcher, 'sync_notification')
+        assert notification['data']['task']['content'] == '提醒事项'
+
+        ws_send(writer, {'type': 'update_task', 'data': {'id': task['id'], 'category': '任务'}})
+        notification = ws_recv(watcher, 'sync_notification')
+        assert notification['data']['task']['category'] == '任务'
+        assert notification['data']['previous']['category'] == '提醒'
+
+    def test_batch_broadcast_filtered_per_subscriber(self):
+        """测试跨分类的批量推送按订阅过滤，订阅者只收到自己分类的变更"""
+        watcher = self.connect()
+        ws_send(watcher, {'type': 'subscribe', 'data': {'categories': ['提醒']}})
+        ws_recv(watcher, 'subscribed')
+        everything = self.connect()
+
+        writer = self.connect()
+        ws_send(writer, {'type': 'sync_tasks', 'data': {'tasks': [
+            {'id': 'a', 'content': '普通任务', 'category': '任务'},
+            {'id': 'b', 'content': '提醒事项', 'category': '提醒'}
+        ]}})
+        ws_recv(writer, 'sync_result')
+
+        notification = ws_recv(watcher, 'sync_notification')
+        assert [change['task']['content'] for change in notification['data']['changes']] == ['提醒事项']
+        notification = ws_recv(everything, 'sync_notification')
+        assert [change['task']['content'] for change in notification['data']['changes']] == ['普通任务', '提醒事项']
+
+    def test_invalid_subscription(self):
+        """测试订阅不存在的分类返回错误"""
+        sock = self.connect()
+        ws_send(sock, {'type': 'subscribe', 'data': {'categories': ['不存在']}})
+        assert ws_recv(sock)['data']['code'] == 'INVALID_SUBSCRIPTION'
+
+    def test_binary_subprotocols(self):
+        """测试协商MessagePack/CBOR子协议后收发二进制帧，广播按各连接的编码分别发送"""
+        msgpack = pytest.importorskip('msgpack')
+        cbor2 = pytest.importorskip('cbor2')
+        packed, response = ws_handshake(self.server.port, 'Sec-WebSocket-Protocol: msgpack, json\r\n')
+        cbor, cbor_response = ws_handshake(self.server.port, 'Sec-WebSocket-Protocol: cbor\r\n')
+        self.sockets.extend([packed, cbor])
+        assert 'Sec-WebSocket-Protocol: msgpack' in response
+        assert 'Sec-WebSocket-Protocol: cbor' in cbor_response
+        self.wait_for_clients(2)
+
+        request = {'type': 'create_task', 'data': {'task': {'content': '二进制'}}, 'requestId': 'b1'}
+        packed.sendall(ws_frame(msgpack.packb(request), OPCODE_BINARY))
+        for _ in range(2):  # 广播通知与创建响应
+            opcode, payload = ws_recv_frame(packed)
+            assert opcode == OPCODE_BINARY
+            message = msgpack.unpackb(payload)
+            assert message['data']['task']['content'] == '二进制'
+        assert message['type'] == 'task_created' and message['data']['requestId'] == 'b1'
+
+        opcode, payload = ws_recv_frame(cbor)
+        assert opcode == OPCODE_BINARY
+        assert cbor2.loads(payload)['type'] == 'sync_notification'
+
+        # 二进制子协议下仍接受JSON文本帧
+        ws_send(cbor, {'type': 'ping', 'data': {}})
+        assert cbor2.loads(ws_recv_frame(cbor)[1]) == {'type': 'pong', 'data': {}}
+
+    def test_unknown_subprotocol_falls_back_to_json(self):
+        """测试不支持的子协议不返回协议头，仍使用JSON文本帧"""
+        sock, response = ws_handshake(self.server.port, 'Sec-WebSocket-Protocol: protobuf\r\n')
+        self.sockets.append(sock)
+        assert 'Sec-WebSocket-Protocol' not in response
+        ws_send(sock, {'type': 'ping', 'data': {}})
+        assert ws_recv_frame(sock)[0] == OPCODE_TEXT
+
+    def test_rate_limited_before_db_work(self):
+        """测试超过限流的请求直接被拒绝，不影响其它事件类型"""
+        sock = self.connect()
+        for i in range(8):
+            ws_send(sock, {'type': 'fetch_tasks', 'data': {}, 'requestId': f'f{i}'})
+        replies = [ws_recv(sock) for _ in range(8)]
+        limited = [reply for reply in replies if reply['type'] == 'error']
+        assert len(limited) == 3
+        assert limited[0]['data']['code'] == 'RATE_LIMITED'
+        assert limited[0]['data']['requestId'] == 'f5'
+        assert limited[0]['data']['retryAfter'] > 0
+        assert self.server.get_stats()['rate_limited'] == {'fetch_tasks': 3}
+
+        ws_send(sock, {'type': 'ping', 'data': {}})
+        assert ws_recv(sock)['type'] == 'pong'
+
+    def test_busy_when_db_pool_saturated(self):
+        """测试数据库线程池排满时立即返回繁忙错误，I/O线程不被阻塞"""
+        server = SimpleWebSocketServer(app, host='127.0.0.1', port=0, mode=self.mode,
+                                       db_workers=1, db_queue_limit=1)
+        process_message = server.process_message
+
+        def slow_process(message, client=None):
+            time.sleep(0.3)
+            return process_message(message, client)
+
+        server.process_message = slow_process
+        server.start()
+        try:
+            assert server.ready.wait(5)
+            sockets = [ws_connect(server.port) for _ in range(3)]
+            self.sockets.extend(sockets)
+            for i, sock in enumerate(sockets):
+                ws_send(sock, {'type': 'ping', 'data': {}, 'requestId': f'p{i}'})
+                time.sleep(0.02)
+            replies = [ws_recv(sock) for sock in sockets]
+            assert [reply['type'] for reply in replies] == ['pong', 'pong', 'error']
+            assert replies[2]['data']['code'] == 'SERVER_BUSY'
+            assert replies[2]['data']['requestId'] == 'p2'
+            assert server.get_stats()['db_pool']['rejected_busy'] == 1
+        finally:
+            server.stop()
+
+    def test_frame_size_limit(self):
+        """测试超过帧大小上限的帧以1009关闭连接"""
+        self.server.max_frame_size = 1024
+        sock = self.connect()
+        sock.sendall(ws_frame(b'x' * 2048))
+        assert ws_recv_frame(sock) == (OPCODE_CLOSE, (1009).to_bytes(2, 'big'))
+
+    def test_heartbeat_reaps_silent_clients(self):
+        """测试服务器主动ping：回应的连接保留并记录往返时间，不回应的连接被断开"""
+        server = SimpleWebSocketServer(app, host='127.0.0.1', port=0, mode=self.mode,
+                                       ping_interval=0.2, pong_timeout=0.2)
+        server.start()
+        try:
+            assert server.ready.wait(5)
+            alive = ws_connect(server.port)
+            silent = ws_connect(server.port)
+            self.sockets.extend([alive, silent])
+
+            def answer_pings():
+                try:
+                    while True:
+                        if ws_recv_frame(alive)[0] == OPCODE_PING:
+                            alive.sendall(ws_frame(b'', OPCODE_PONG))
+                except OSError:
+                    pass
+
+            threading.Thread(target=answer_pings, daemon=True).start()
+            deadline = time.time() + 5
+            while server.idle_clients_reaped < 1 and time.time() < deadline:
+                time.sleep(0.02)
+            time.sleep(0.1)
+            assert server.idle_clients_reaped == 1
+
+            connections = server.get_connection_stats()
+            assert len(connections) == 1
+            assert connections[0]['pings_sent'] >= 1
+            assert connections[0]['last_rtt_ms'] is not None
+            # 被断开的连接先收到ping，随后读到连接关闭
+            assert ws_recv_frame(silent)[0] == OPCODE_PING
+            silent.settimeout(2)
+            assert silent.recv(1) == b''
+        finally:
+            server.stop()
+
+    def wait_for_clients(self, count):
+        deadline = time.time() + 5
+        while len(self.server.clients) != count and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(self.server.clients) == count
+
+    def flood_until(self, condition):
+        """持续广播大消息直到条件满足，返回广播次数"""
+        message = {'type': 'sync_notification', 'data': {'blob': 'x' * 100000}}
+        for sent in range(1, 2001):
+            self.server.broadcast_to_all(message)
+            if condition():
+                return sent
+            time.sleep(0.002)
+        raise AssertionError('条件未满足')
+
+    def test_slow_client_dropped(self):
+        """测试不读取数据的慢客户端超过高水位后被断开，广播不会被其阻塞"""
+        self.server.send_high_water_mark = 256 * 1024
+        slow = self.connect()
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.wait_for_clients(1)
+
+        self.flood_until(lambda: self.server.slow_clients_dropped)
+        self.wait_for_clients(0)
+
+        sock = self.connect()
+        ws_send(sock, {'type': 'ping', 'data': {}})
+        assert ws_recv(sock, 'pong')['type'] == 'pong'
+
+    def test_slow_client_resync(self):
+        """测试resync策略：积压期间暂停推送，消化后收到重新同步通知"""
+        self.server.send_high_water_mark = 256 * 1024
+        self.server.slow_client_policy = 'resync'
+        slow = self.connect()
+        self.wait_for_clients(1)
+
+        self.flood_until(lambda: self.server._resync_pending)
+        assert self.server.slow_clients_dropped == 0
+
+        # 客户端恢复读取后，积压消化即收到resync_required，不需要等下一次广播
+        assert ws_recv(slow, 'resync_required')['type'] == 'resync_required'
+        assert self.server.slow_clients_resynced == 1
+        assert not self.server._resync_pending
+
+    def test_permessage_deflate(self):
+        """测试压缩协商、大消息压缩发送、小消息不压缩以及接收客户端压缩消息"""
+        sock, response = ws_handshake(self.server.port,
+                                      'Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits\r\n')
+        self.sockets.append(sock)
+        assert 'Sec-WebSocket-Extensions: permessage-deflate' in response
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        decompressor = zlib.decompressobj(-15)
+        content = '每天背二十个单词，' * 500
+        body = json.dumps({'type': 'create_task', 'data': {'task': {'content': content}}}).encode('utf-8')
+        compressed = compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        sock.sendall(ws_frame(compressed[:-4], rsv1=True))
+
+        for _ in range(2):  # 广播通知与创建响应
+            first, payload = ws_recv_raw_frame(sock)
+            assert first & 0x40
+            assert len(payload) < len(content)
+            message = json.loads(decompressor.decompress(payload + b'\x00\x00\xff\xff'))
+            assert message['data']['task']['content'] == content
+
+        ws_send(sock, {'type': 'ping', 'data': {}})
+        first, payload = ws_recv_raw_frame(sock)
+        assert not first & 0x40
+        assert json.loads(payload)['type'] == 'pong'
+        assert self.server.get_stats()['compression']['messages_compressed'] >= 2
+
+    def test_deflate_no_context_takeover(self):
+        """测试客户端要求server_no_context_takeover时每条消息可独立解压"""
+        sock, response = ws_handshake(self.server.port,
+                                      'Sec-WebSocket-Extensions: permessage-deflate; server_no_context_takeover\r\n')
+        self.sockets.append(sock)
+        assert 'server_no_context_takeover' in response
+        message = {'type': 'sync_notification', 'data': {'content': '提醒' * 2000}}
+        self.wait_for_clients(1)
+        for _ in range(2):
+            self.server.broadcast_to_all(message)
+            first, payload = ws_recv_raw_frame(sock)
+            assert first & 0x40
+            decompressed = zlib.decompressobj(-15).decompress(payload + b'\x00\x00\xff\xff')
+            assert json.loads(decompressed) == message
+
+
+    def test_concurrent_sends_keep_frame_order(self):
+        """测试I/O线程与其它线程同时发送时帧不交错、压缩上下文按发送顺序到达"""
+        sock, response = ws_handshake(self.server.port, 'Sec-WebSocket-Extensions: permessage-deflate\r\n')
+        self.sockets.append(sock)
+        assert 'permessage-deflate' in response
+        self.wait_for_clients(1)
+        conn = next(iter(self.server.clients))
+        count = 100
+
+        def send_all(source):
+            for i in range(count):
+                self.server.send_to_client(conn, {'type': 'sync_notification',
+                                                  'data': {'source': source, 'n': i, 'content': '提醒' * 400}})
+
+        # 连接所在的事件循环线程内发送（每客户端一个线程模式下没有循环，两边都是普通线程）
+        loop = getattr(conn, 'loop', None)
+        if loop is not None:
+            loop.call_soon_threadsafe(send_all, 'loop')
+        else:
+            threading.Thread(target=send_all, args=('loop',)).start()
+        threading.Thread(target=send_all, args=('thread',)).start()
+
+        decompressor = zlib.decompressobj(-15)
+        received = {'loop': [], 'thread': []}
+        for _ in range(count * 2):
+            first, payload = ws_recv_raw_frame(sock)
+            assert first & 0x40
+            message = json.loads(decompressor.decompress(payload + b'\x00\x00\xff\xff'))
+            received[message['data']['source']].append(message['data']['n'])
+        assert received == {'loop': list(range(count)), 'thread': list(range(count))}
+
+
+class TestThreadWebSocketServer(TestWebSocketServer):
+    """每客户端一个线程模式下运行同一组测试"""
+
+    mode = 'thread'
+
+
+class TestSubscriptionIndex:
+    """订阅索引测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        self.server = SimpleWebSocketServer(app, host='127.0.0.1', port=0)
+
+    def add(self, categories=(), completed=()):
+        client = object()
+        self.server.add_client(client)
+        self.server.subscribe(client, categories, completed)
+        return client
+
+    def test_fan_out_visits_only_subscribers(self):
+        """测试广播只访问订阅了相关分类的连接"""
+        for _ in range(1000):
+            self.add(['任务'])
+        reminder = self.add(['提醒'])
+        everything = self.add()
+
+        assert set(self.server.subscribers_for({('提醒', False)})) == {reminder, everything}
+        assert len(self.server.subscribers_for({('任务', False)})) == 1001
+        assert len(self.server.subscribers_for(None)) == 1002
+
+    def test_completed_view_and_resubscribe(self):
+        """测试完成状态视图过滤以及重新订阅替换旧订阅"""
+        done = self.add(completed=[True])
+        todo_tasks = self.add(['任务'], [False])
+
+        assert self.server.subscribers_for({('任务', True)}) == [done]
+        assert self.server.subscribers_for({('任务', False)}) == [todo_tasks]
+        # 任务从未完成变为完成，两个视图都需要收到
+        assert set(self.server.subscribers_for({('任务', False), ('任务', True)})) == {done, todo_tasks}
+
+        self.server.subscribe(todo_tasks, ['想尝试'])
+        assert self.server.subscribers_for({('任务', False)}) == []
+        self.server.remove_client(todo_tasks)
+        assert self.server.subscribers_for({('想尝试', False)}) == []
+        assert '想尝试' not in self.server._category_index
+
+    def test_message_topics(self):
+        """测试从推送消息中取出涉及的分类与状态"""
+        topics = SimpleWebSocketServer.message_topics
+        assert topics({'type': 'resync_required', 'data': {}}) is None
+        assert topics({'type': 'sync_notification', 'data': {
+            'action': 'batch',
+            'changes': [{'action': 'create', 'task': {'category': '任务', 'completed': False}},
+                        {'action': 'delete', 'id': '1', 'previous': {'category': '提醒', 'completed': True}}]
+        }}) == {('任务', False), ('提醒', True)}
+
+
+class TestSubprotocolCodec:
+    """子协议编码测试类"""
+
+    def test_negotiate_in_client_order(self):
+        """测试按客户端给出的顺序选择第一个支持的子协议"""
+        if not SUBPROTOCOLS:
+            pytest.skip('未安装二进制编码依赖')
+        first = next(iter(SUBPROTOCOLS))
+        codec, header = negotiate_subprotocol(f'unknown, {first}, json')
+        assert header == first and codec is SUBPROTOCOLS[first]
+        assert negotiate_subprotocol('json, msgpack') == (JSON_CODEC, 'json')
+        assert negotiate_subprotocol(None) == (JSON_CODEC, None)
+
+    def test_round_trip(self):
+        """测试各编码对任务列表消息的往返"""
+        message = {'type': 'tasks_data', 'data': {'tasks': [
+            {'id': '1', 'title': None, 'content': '内容', 'completed': False, 'created_at': '2024-01-01T12:00:00'}
+        ], 'cursor': 3, 'incremental': False}}
+        for codec in [JSON_CODEC, *SUBPROTOCOLS.values()]:
+            assert codec.decode(codec.encode(message)) == message
+
+
+class TestRateLimiter:
+    """令牌桶限流测试类"""
+
+    def test_bucket_refill(self):
+        """测试令牌按速率补充"""
+        bucket = TokenBucket(rate=2, capacity=2, now=0)
+        assert bucket.take(0) == 0 and bucket.take(0) == 0
+        assert bucket.take(0) == pytest.approx(0.5)
+        assert bucket.take(0.5) == 0
+
+    def test_connection_and_global_limits(self):
+        """测试连接级限流互不影响，全局限流作用于所有连接，未配置的事件共用'*'桶"""
+        limiter = RateLimiter({'fetch_tasks': (0.001, 2), '*': (0.001, 1)}, {'fetch_tasks': (0.001, 3)})
+        first, second = object(), object()
+        assert [limiter.check(first, 'fetch_tasks') for _ in range(3)][:2] == [0, 0]
+        assert limiter.check(first, 'fetch_tasks') > 0
+        assert limiter.check(second, 'fetch_tasks') == 0
+        assert limiter.check(second, 'fetch_tasks') > 0  # 全局桶已用完
+        assert limiter.check(first, 'ping') == 0
+        assert limiter.check(first, 'create_task') > 0
+        assert limiter.rejected == {'fetch_tasks': 3, '*': 1}
+
+    def test_disabled(self):
+        """测试限流配置为空字典时关闭限流"""
+        server = SimpleWebSocketServer(app, port=0, rate_limits={}, global_rate_limits={})
+        assert server.rate_limiter is None
+        assert server.check_rate_limit(object(), {"type": "fetch_tasks"}) == ({"type": "fetch_tasks"}, None)
+
+
+class TestDBWorkerPool:
+    """数据库线程池测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        self.pool = DBWorkerPool(max_workers=2, max_queue=2, timeouts={'*': 5, 'fast': 0.05})
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        self.pool.shutdown()
+
+    def test_same_connection_runs_in_order(self):
+        """测试同一连接的任务按提交顺序串行执行"""
+        order = []
+
+        def job(i):
+            time.sleep(0.02 if i == 0 else 0)
+            order.append(i)
+            return i
+
+        futures = [self.pool.submit('conn', 'event', job, i) for i in range(4)]
+        assert [future.result(5) for future in futures] == [0, 1, 2, 3]
+        assert order == [0, 1, 2, 3]
+
+    def test_queue_limit(self):
+        """测试排队任务达到上限后抛出PoolBusy"""
+        gate = threading.Event()
+        futures = [self.pool.submit(i, 'event', gate.wait, 5) for i in range(4)]
+        with pytest.raises(PoolBusy):
+            self.pool.submit('other', 'event', gate.wait, 5)
+        gate.set()
+        assert all(future.result(5) for future in futures)
+        assert self.pool.stats()['rejected_busy'] == 1
+        self.pool.submit('other', 'event', lambda: None).result(5)
+
+    def test_expired_in_queue_is_not_run(self):
+        """测试排队超过时间预算的任务不再执行"""
+        gate = threading.Event()
+        ran = []
+        blocker = self.pool.submit('conn', 'event', gate.wait, 5)
+        late = self.pool.submit('conn', 'fast', ran.append, 1)
+        time.sleep(0.1)
+        gate.set()
+        blocker.result(5)
+        with pytest.raises(JobTimeout):
+            late.result(5)
+        assert ran == []
+        assert self.pool.stats()['timed_out'] == 1
+
+
+class TestTimerWheel:
+    """哈希时间轮测试类"""
+
+    def test_expiry_order_and_rounds(self):
+        """测试定时按tick到期，超过一圈的定时按圈数等待"""
+        wheel = TimerWheel(tick=1, size=8)
+        wheel.schedule('a', 1)
+        wheel.schedule('b', 2.5)
+        wheel.schedule('c', 8)
+        wheel.schedule('d', 20)
+        fired = {}
+        for tick in range(1, 25):
+            for item in wheel.advance():
+                fired[item] = tick
+        assert fired == {'a': 1, 'b': 3, 'c': 8, 'd': 20}
+
+    def test_zero_delay_fires_next_tick(self):
+        """测试不足一个tick的定时在下一个tick到期"""
+        wheel = TimerWheel(tick=1, size=4)
+        wheel.schedule('x', 0)
+        assert wheel.advance() == ['x']
+
+
+class TestBroadcastCoalescer:
+    """广播合并测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        self.sent = []
+        self.coalescer = BroadcastCoalescer(lambda message: self.sent.append(message) or 10, 0.02)
+
+    def notify(self, action, task_id, **task):
+        data = {'action': action}
+        if action == 'delete':
+            data['id'] = task_id
+        else:
+            data['task'] = {'id': task_id, **task}
+        self.coalescer.add({'type': 'sync_notification', 'data': data})
+
+    def wait_for_flush(self):
+        deadline = time.time() + 5
+        while not self.sent and time.time() < deadline:
+            time.sleep(0.005)
+        assert self.sent
+
+    def test_merge_same_task(self):
+        """测试窗口内同一任务的多次变更合并为一条"""
+        self.coalescer.add({'type': 'sync_notification', 'data': {
+            'action': 'update', 'task': {'id': '1', 'completed': True},
+            'previous': {'category': '任务', 'completed': False}}})
+        self.notify('update', '1', completed=False)
+        self.notify('update', '2', completed=True)
+        self.wait_for_flush()
+
+        assert len(self.sent) == 1
+        changes = self.sent[0]['data']['changes']
+        assert [change['task']['id'] for change in changes] == ['1', '2']
+        assert changes[0]['task']['completed'] is False
+        assert changes[0]['previous'] == {'category': '任务', 'completed': False}
+
+        stats = self.coalescer.stats.to_dict()
+        assert stats['changes_received'] == 3
+        assert stats['changes_merged'] == 1
+        assert stats['frames_saved'] == 20
+        assert stats['added_latency_ms']['max'] >= 0
+
+    def test_create_then_delete_cancels(self):
+        """测试创建后又删除的任务不再推送，单条变更保持原格式"""
+        self.notify('create', '1', content='临时')
+        self.notify('delete', '1')
+        self.notify('create', '2', content='保留')
+        self.notify('update', '2', content='修改后')
+        self.wait_for_flush()
+
+        assert self.sent[0]['data'] == {'action': 'create', 'task': {'id': '2', 'content': '修改后'}}
+
+    def test_accepts_only_task_changes(self):
+        """测试只合并带任务ID的推送"""
+        assert not BroadcastCoalescer.accepts({'type': 'resync_required', 'data': {}})
+        assert not BroadcastCoalescer.accepts({'type': 'sync_notification', 'data': {'blob': 'x'}})
+        assert BroadcastCoalescer.accepts({'type': 'sync_notification',
+                                           'data': {'action': 'delete', 'id': '3'}})
+
+
+class TestCoalescingServer:
+    """开启广播合并窗口时的端到端测试"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+        self.server = SimpleWebSocketServer(app, host='127.0.0.1', port=0, coalesce_window_ms=30)
+        self.server.start()
+        assert self.server.ready.wait(5)
+        self.sockets = []
+
+    teardown_method = TestWebSocketServer.teardown_method
+    connect = TestWebSocketServer.connect
+    wait_for_clients = TestWebSocketServer.wait_for_clients
+
+    def test_bulk_ticking_is_batched(self):
+        """测试连续勾选多个任务只产生一条批量推送"""
+        writer = self.connect()
+        ws_send(writer, {'type': 'sync_tasks', 'data': {'tasks': [{'content': f'任务{i}'} for i in range(50)]}})
+        task_ids = [task['id'] for task in ws_recv(writer, 'sync_result')['data']['syncedTasks']]
+        ws_recv(writer, 'sync_notification')
+
+        watcher = self.connect()
+        self.wait_for_clients(2)
+        for task_id in task_ids:
+            ws_send(writer, {'type': 'update_task_completed', 'data': {'id': task_id, 'completed': True}})
+        received = notifications = 0
+        while received < 50:
+            data = ws_recv(watcher, 'sync_notification')['data']
+            received += len(data['changes']) if data['action'] == 'batch' else 1
+            notifications += 1
+        assert notifications < 50
+        assert self.server.get_stats()['coalescing']['frames_saved'] > 0
+
+
+class TestSearchEvent:
+    """search_tasks 事件测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+        self.server = SimpleWebSocketServer(app, host='127.0.0.1', port=0)
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        with app.app_context():
+            db.drop_all()
+
+    def test_search_event(self):
+        """测试通过WebSocket搜索任务并分页"""
+        for content in ['准备季度报告', '季度报告评审', '买牛奶']:
+            self.server.process_message({'type': 'create_task', 'data': {'task': {'content': content}}})
+
+        response, _ = self.server.process_message(
+            {'type': 'search_tasks', 'data': {'query': '季度报告', 'limit': 1}, 'requestId': 's1'})
+        assert response['type'] == 'search_results'
+        assert response['data']['requestId'] == 's1'
+        assert len(response['data']['tasks']) == 1 and response['data']['nextOffset'] == 1
+
+        response, _ = self.server.process_message({'type': 'search_tasks', 'data': {'query': '  '}})
+        assert response['data']['code'] == 'INVALID_QUERY'
+
+
+class TestDeltaSync:
+    """fetch_tasks 增量同步测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.server = SimpleWebSocketServer(app, host='127.0.0.1', port=0)
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        with app.app_context():
+            db.drop_all()
+
+    def request(self, event_type, data=None):
+        response, _ = self.server.process_message(json.dumps({'type': event_type, 'data': data or {}}))
+        return response['data']
+
+    def test_incremental_fetch(self):
+        """测试游标之后只返回变更的任务与删除墓碑"""
+        ids = [self.request('create_task', {'task': {'content': f'任务{i}'}})['task']['id'] for i in range(3)]
+        full = self.request('fetch_tasks')
+        assert full['incremental'] is False
+        assert len(full['tasks']) == 3
+
+        self.request('update_task', {'id': ids[0], 'content': '已修改'})
+        self.request('delete_task', {'id': ids[1]})
+        # HTTP接口的写入同样记录变更
+        self.client.put(f'/api/tasks/{ids[2]}/complete', data=json.dumps({'completed': True}),
+                        content_type='application/json')
+
+        delta = self.request('fetch_tasks', {'since': full['cursor']})
+        assert delta['incremental'] is True
+        assert {task['id']: task['content'] for task in delta['tasks']} == {ids[0]: '已修改', ids[2]: '任务2'}
+        assert delta['deleted'] == [ids[1]]
+        assert delta['cursor'] > full['cursor']
+
+        unchanged = self.request('fetch_tasks', {'since': delta['cursor']})
+        assert unchanged['tasks'] == [] and unchanged['deleted'] == []
+        assert unchanged['cursor'] == delta['cursor']
+
+    def test_paginated_fetch(self):
+        """测试全量拉取按limit/cursor分页"""
+        for i in range(5):
+            self.request('create_task', {'task': {'content': f'任务{i}'}})
+
+        first = self.request('fetch_tasks', {'limit': 3})
+        assert len(first['tasks']) == 3 and first['nextCursor']
+        second = self.request('fetch_tasks', {'limit': 3, 'cursor': first['nextCursor']})
+        assert second['nextCursor'] is None
+        contents = [task['content'] for task in first['tasks'] + second['tasks']]
+        assert sorted(contents) == [f'任务{i}' for i in range(5)]
+
+        response, _ = self.server.process_message({'type': 'fetch_tasks', 'data': {'cursor': 'abc'}})
+        assert response['data']['code'] == 'INVALID_CURSOR'
+        for limit in ('abc', 0, [3]):
+            response, _ = self.server.process_message({'type': 'fetch_tasks', 'data': {'limit': limit}})
+            assert response['data']['code'] == 'INVALID_LIMIT'
+
+    def test_fetch_projection(self):
+        """测试fetch_tasks的字段投影与摘要模式，增量拉取同样适用"""
+        task_id = self.request('create_task', {'task': {'content': '笔' * 150, 'title': '笔记'}})['task']['id']
+        full = self.request('fetch_tasks', {'fields': ['title']})
+        assert full['tasks'] == [{'id': task_id, 'title': '笔记'}]
+
+        self.request('update_task', {'id': task_id, 'content': '记' * 150})
+        delta = self.request('fetch_tasks', {'since': full['cursor'], 'summary': True, 'fields': 'content'})
+        assert delta['tasks'] == [{'id': task_id, 'content': '记' * 100, 'content_truncated': True}]
+
+        response, _ = self.server.process_message({'type': 'fetch_tasks', 'data': {'fields': ['password']}})
+        assert response['data']['code'] == 'INVALID_FIELDS'
+
+    def test_clear_and_stale_cursor_fall_back_to_full(self):
+        """测试清空后或游标超前时返回全量数据"""
+        self.request('create_task', {'task': {'content': '任务'}})
+        cursor = self.request('fetch_tasks')['cursor']
+        self.request('clear_all_tasks')
+        self.request('create_task', {'task': {'content': '新任务'}})
+
+        after_clear = self.request('fetch_tasks', {'since': cursor})
+        assert after_clear['incremental'] is False
+        assert [task['content'] for task in after_clear['tasks']] == ['新任务']
+
+        stale = self.request('fetch_tasks', {'since': after_clear['cursor'] + 100})
+        assert stale['incremental'] is False
+
+    def test_change_log_is_compacted(self):
+        """测试反复修改同一任务时变更日志只保留一条"""
+        task_id = self.request('create_task', {'task': {'content': '任务'}})['task']['id']
+        for i in range(10):
+            self.request('update_task', {'id': task_id, 'content': f'第{i}次'})
+        with app.app_context():
+            assert TaskChange.query.count() == 1
+
+
+class TestSyncTasks:
+    """sync_tasks 批量同步测试类"""
+
+    def setup_method(self):
+        """每个测试方法前执行"""
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+        self.server = SimpleWebSocketServer(app, host='127.0.0.1', port=0)
+
+    def teardown_method(self):
+        """每个测试方法后执行"""
+        with app.app_context():
+            db.drop_all()
+
+    def sync(self, tasks):
+        return self.server.process_message(json.dumps({'type': 'sync_tasks', 'data': {'tasks': tasks}}))
+
+    def test_bulk_create_single_broadcast(self):
+        """测试1000条离线任务一次同步完成，只产生一条合并广播"""
+        tasks = [{'id': f'temp-{i}', 'content': f'离线任务{i}', 'category': '提醒'} for i in range(1000)]
+        response, broadcast = self.sync(tasks)
+
+        assert response['type'] == 'sync_result'
+        result = response['data']
+        assert result['success'] is True
+        assert len(result['syncedTasks']) == 1000
+        assert result['syncedTasks'][0]['tempId'] == 'temp-0'
+        assert broadcast['data']['action'] == 'batch'
+        assert len(broadcast['data']['changes']) == 1000
+        with app.app_context():
+            assert Task.query.count() == 1000
+            assert TaskChange.query.count() == 1000
+
+    def test_update_delete_and_errors(self):
+        """测试更新、删除与单条错误互不影响"""
+        response, _ = self.sync([{'id': 'a', 'content': '任务A'}, {'id': 'b', 'content': '任务B'}])
+        first, second = (task['id'] for task in response['data']['syncedTasks'])
+
+        response, broadcast = self.sync([
+            {'id': first, 'content': '已修改', 'completed': True},
+            {'id': second, 'deleted': True},
+            {'id': 'c', 'content': '   '},
+            'not a task'
+        ])
+        result = response['data']
+        assert result['success'] is False
+        assert [error['index'] for error in result['errors']] == [2, 3]
+        assert result['deleted'] == [second]
+        assert result['syncedTasks'][0]['content'] == '已修改'
+        assert result['syncedTasks'][0]['completed'] is True
+        assert [change['action'] for change in broadcast['data']['changes']] == ['update', 'delete']
+
+    def test_invalid_items_reported_individually(self):
+        """测试字段类型错误、无效分类与引用本批次已删除的任务逐条报错，其它任务照常同步"""
+        response, _ = self.sync([{'id': 'a', 'content': '任务A'}])
+        task_id = response['data']['syncedTasks'][0]['id']
+
+        response, _ = self.sync([
+            {'id': 'b', 'content': ['列表']},
+            {'id': 'c', 'content': '标题错误', 'title': 5},
+            {'id': 'd', 'content': '分类错误', 'category': '不存在的分类'},
+            {'id': task_id, 'deleted': True},
+            {'id': task_id, 'content': '删除后又修改'},
+            {'id': 'e', 'content': '正常'}
+        ])
+        result = response['data']
+        assert [(error['index'], error['code']) for error in result['errors']] == [
+            (0, 'INVALID_TASK'), (1, 'INVALID_TASK'), (2, 'INVALID_CATEGORY'), (4, 'TASK_DELETED')]
+        assert result['deleted'] == [task_id]
+        assert [task['tempId'] for task in result['syncedTasks']] == ['e']
+        with app.app_context():
+            assert [task.content for task in Task.query.all()] == ['正常']
+
+    def test_server_wins_newer_change(self):
+        """测试服务器在客户端修改之后又修改过的任务以服务器为准"""
+        response, _ = self.sync([{'id': 'a', 'content': '服务器版本'}])
+        task_id = response['data']['syncedTasks'][0]['id']
+
+        response, broadcast = self.sync([
+            {'id': task_id, 'content': '过期的离线修改', 'updated_at': '2000-01-01T00:00:00Z'}
+        ])
+        result = response['data']
+        assert result['syncedTasks'] == []
+        assert result['conflicts'][0]['task']['content'] == '服务器版本'
+        assert broadcast is None
+
+        # 客户端时间更新时客户端优先
+        response, _ = self.sync([
+            {'id': task_id, 'content': '新的离线修改', 'updated_at': '2999-01-01T00:00:00+08:00'}
+        ])
+        assert response['data']['syncedTasks'][0]['content'] == '新的离线修改'
+
+
+class TestFrameDecoder:
+    """增量帧解码器测试类"""
+
+    def test_byte_by_byte(self):
+        """测试逐字节喂入"""
+        decoder = FrameDecoder()
+        frame = ws_frame('你好')
+        messages = []
+        for i in range(len(frame)):
+            messages.extend(decoder.feed(frame[i:i + 1]))
+        assert messages == [(OPCODE_TEXT, '你好'.encode('utf-8'))]
+        assert len(decoder.buffer) == 0
+
+    def test_many_frames_in_one_chunk(self):
+        """测试一次到达多个帧，且末尾带半个帧"""
+        decoder = FrameDecoder()
+        frames = b''.join(ws_frame(str(i)) for i in range(100))
+        tail = ws_frame('tail')
+        messages = decoder.feed(frames + tail[:4])
+        assert [payload for _, payload in messages] == [str(i).encode() for i in range(100)]
+        assert decoder.feed(tail[4:]) == [(OPCODE_TEXT, b'tail')]
+
+    def test_binary_fragments(self):
+        """测试二进制分片重组"""
+        decoder = FrameDecoder()
+        data = decoder.feed(ws_frame(b'\x00\x01', OPCODE_BINARY, fin=False) +
+                            ws_frame(b'\x02', OPCODE_CONTINUATION, fin=False) +
+                            ws_frame(b'\x03', OPCODE_CONTINUATION))
+        assert data == [(OPCODE_BINARY, b'\x00\x01\x02\x03')]
+
+    def test_protocol_errors(self):
+        """测试非法续帧与超长消息"""
+        with pytest.raises(FrameError):
+            FrameDecoder().feed(ws_frame(b'x', OPCODE_CONTINUATION))
+        with pytest.raises(FrameError):
+            FrameDecoder(max_message_size=10).feed(ws_frame(b'x' * 11))
+
+
+class TestFrameCodec:
+    """帧编码与掩码测试类"""
+
+    def test_unmask_matches_bytewise(self):
+        """测试整字异或与逐字节异或结果一致（含非4字节对齐长度）"""
+        mask = b'\x9a\x01\xff\x37'
+        for length in list(range(0, 13)) + [1000, 65537]:
+            payload = os.urandom(length)
+            expected = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            assert unmask(payload, mask) == expected
+            assert unmask(memoryview(payload), memoryview(mask)) == expected
+
+    def test_frame_header_lengths(self):
+        """测试三种负载长度编码"""
+        assert encode_frame_header(125) == b'\x81\x7d'
+        assert encode_frame_header(126) == b'\x81\x7e\x00\x7e'
+        assert encode_frame_header(65536) == b'\x81\x7f' + (65536).to_bytes(8, 'big')
+        assert encode_frame(b'ab') == b'\x81\x02ab'
+
+    def test_send_parts(self):
+        """测试分散写发送帧头与负载"""
+        left, right = socket.socketpair()
+        try:
+            payload = os.urandom(200000)
+            header = encode_frame_header(len(payload))
+            right.settimeout(5)
+            received = bytearray()
+            sender = threading.Thread(target=send_parts, args=(left, [header, payload]))
+            sender.start()
+            while len(received) < len(header) + len(payload):
+                received.extend(right.recv(65536))
+            sender.join()
+            assert bytes(received) == header + payload
+        finally:
+            left.close()
+            right.close()
+
+
+class TestDeflateNegotiation:
+    """permessage-deflate 协商测试类"""
+
+    def test_negotiate(self):
+        """测试多个报价、非法窗口与服务器配置"""
+        deflate, header = negotiate_deflate('x-webkit-deflate-frame, permessage-deflate; server_max_window_bits=8, '
+                                            'permessage-deflate; server_max_window_bits=10')
+        assert header == 'permessage-deflate; server_max_window_bits=10'
+        assert deflate.server_window_bits == 10
+
+        deflate, header = negotiate_deflate('permessage-deflate', {'server_context_takeover': False})
+        assert header == 'permessage-deflate; server_no_context_takeover'
+        assert negotiate_deflate('x-webkit-deflate-frame') == (None, None)
+
+    def test_round_trip_and_limit(self):
+        """测试压缩解压往返以及解压炸弹保护"""
+        sender, _ = negotiate_deflate('permessage-deflate')
+        receiver, _ = negotiate_deflate('permessage-deflate')
+        for text in (b'a' * 5000, b'b' * 5000):
+            assert receiver.decompress(sender.compress(text), 10000) == text
+        with pytest.raises(DeflateError):
+            receiver.decompress(sender.compress(b'c' * 5000), 100)
+
+
+class TestSelectorServerScale:
+    """事件循环模式连接数测试"""
+
+    def test_many_idle_connections(self):
+        """测试单个事件循环承载大量空闲连接"""
+        server = SimpleWebSocketServer(app, host='127.0.0.1', port=0, mode='selector', loop_count=2)
+        server.start()
+        assert server.ready.wait(5)
+        sockets = [ws_connect(server.port) for _ in range(200)]
+        try:
+            ws_send(sockets[-1], {'type': 'ping', 'data': {}})
+            assert ws_recv(sockets[-1])['type'] == 'pong'
+            assert len(server.clients) == 200
+        finally:
+            for sock in sockets:
+                sock.close()
+            server.stop()
+
+    def test_connections_over_limit_refused(self):
+        """测试所有事件循环都满时拒绝新连接，已有连接不受影响，连接关闭后名额归还"""
+        server = SimpleWebSocketServer(app, host='127.0.0.1', port=0, mode='selector', max_connections_per_loop=2)
+        server.start()
+        assert server.ready.wait(5)
+        sockets = [ws_connect(server.port) for _ in range(2)]
+        try:
+            refused = socket.create_connection(('127.0.0.1', server.port), timeout=5)
+            sockets.append(refused)
+            try:
+                assert refused.recv(1) == b''
+            except ConnectionResetError:
+                pass
+            assert server.get_stats()['connections_refused'] == 1
+
+            ws_send(sockets[0], {'type': 'ping', 'data': {}})
+            assert ws_recv(sockets[0])['type'] == 'pong'
+
+            sockets[1].close()
+            deadline = time.time() + 5
+            while server.loops[0].connections > 1 and time.time() < deadline:
+                time.sleep(0.01)
+            sockets.append(ws_connect(server.port))
+        finally:
+            for sock in sockets:
+                sock.close()
+            server.stop()
+
+    def test_select_failure_does_not_stop_loop(self, monkeypatch):
+        """测试select()因失效socket出错时移除该socket并继续运行（模拟Windows上基于select的选择器）"""
+        monkeypatch.setattr(selectors, 'DefaultSelector', selectors.SelectSelector)
+        loop = EventLoop()
+        assert loop.max_connections == SELECT_MAX_CONNECTIONS
+        broken, peer = socket.socketpair()
+        discarded = threading.Event()
+        loop.register(broken, selectors.EVENT_READ, lambda mask: discarded.set())
+        loop.start()
+        try:
+            broken.close()  # 仍注册在选择器中的socket被关闭，下一次select()会失败
+            loop.call_soon_threadsafe(lambda: None)
+            assert discarded.wait(5)
+
+            ran = threading.Event()
+            loop.call_soon_threadsafe(ran.set)
+            assert ran.wait(5)
+        finally:
+            loop.stop()
+            peer.close()
+
+
+class TestAsyncioWebSocketServer(TestWebSocketServer):
+    """asyncio 模式下运行同一组测试"""
+
+    mode = 'asyncio'
+
+    def test_stats(self):
+        """测试运行统计"""
+        sock = self.connect()
+        for _ in range(2):
+            ws_send(sock, {'type': 'ping', 'data': {}})
+            ws_recv(sock)
+        # 耗时在回复发出后才记录，第二次回复到达时第一条必然已计入
+        stats = self.server.get_stats()
+        assert stats['mode'] == 'asyncio'
+        assert stats['connections'] == 1
+        assert stats['messages_handled'] >= 1
+        assert stats['latency_ms']['p99'] is not None
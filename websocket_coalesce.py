@@ -0,0 +1,142 @@
+"""
+WebSocket广播合并模块
+在短时间窗口内收集任务变更推送，同一任务的多次变更合并为一条，窗口结束时发出一条批量sync_notification
+"""
+
+import threading
+import time
+
+
+def change_key(change):
+    """变更对应的任务ID，无法识别时返回None"""
+    task = change.get('task')
+    if task and task.get('id') is not None:
+        return str(task['id'])
+    if change.get('id') is not None:
+        return str(change['id'])
+    return None
+
+
+def merge_changes(earlier, later):
+    """
+    合并同一任务先后两次变更，返回合并结果，None表示两者相互抵消
+    保留最早的previous，使原视图的订阅者仍能收到任务离开的通知
+    """
+    if earlier['action'] == 'create':
+        if later['action'] == 'delete':
+            return None  # 创建后又删除，其它客户端无需感知
+        merged = {**later, 'action': 'create'}
+        merged.pop('previous', None)
+        return merged
+    merged = dict(later)
+    if 'previous' in earlier:
+        merged['previous'] = earlier['previous']
+    return merged
+
+
+class CoalescingStats:
+    """合并效果统计：节省的帧数与引入的额外延迟"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.changes_received = 0
+        self.changes_merged = 0  # 与同一任务的前一次变更合并掉的数量
+        self.batches_sent = 0
+        self.frames_saved = 0
+        self.delay_seconds = 0.0
+        self.max_delay_seconds = 0.0
+
+    def record_received(self, merged):
+        with self._lock:
+            self.changes_received += 1
+            if merged:
+                self.changes_merged += 1
+
+    def record_flush(self, changes_in, recipients, delays):
+        with self._lock:
+            self.batches_sent += 1
+            # 不合并时每条变更都会给每个接收者发一帧
+            self.frames_saved += (changes_in - 1) * recipients
+            self.delay_seconds += sum(delays)
+            self.max_delay_seconds = max([self.max_delay_seconds] + delays)
+
+    def to_dict(self):
+        with self._lock:
+            received = self.changes_received
+            return {
+                'changes_received': received,
+                'changes_merged': self.changes_merged,
+                'batches_sent': self.batches_sent,
+                'frames_saved': self.frames_saved,
+                'added_latency_ms': {
+                    'avg': round(self.delay_seconds / received * 1000, 3) if received else None,
+                    'max': round(self.max_delay_seconds * 1000, 3) if received else None
+                }
+            }
+
+
+class BroadcastCoalescer:
+    """
+    广播合并器
+    add()收集sync_notification中的变更，窗口内第一条变更启动定时器，到期后调用flush_callback(消息)，
+    flush_callback返回接收者数量用于统计节省的帧数
+    """
+
+    def __init__(self, flush_callback, window):
+        self.flush_callback = flush_callback
+        self.window = window  # 合并窗口（秒）
+        self.stats = CoalescingStats()
+        self._lock = threading.Lock()
+        self._pending = {}  # 任务ID -> 合并后的变更，dict保持首次出现的顺序
+        self._received_at = []  # 窗口内每条原始变更的到达时间
+        self._timer = None
+
+    @staticmethod
+    def accepts(message):
+        """只合并携带任务变更的推送"""
+        if message.get('type') != 'sync_notification':
+            return False
+        data = message.get('data', {})
+        changes = data.get('changes') if data.get('action') == 'batch' else [data]
+        return bool(changes) and all(change_key(change) is not None for change in changes)
+
+    def add(self, message):
+        data = message['data']
+        changes = data['changes'] if data.get('action') == 'batch' else [data]
+        now = time.perf_counter()
+        with self._lock:
+            for change in changes:
+                key = change_key(change)
+                earlier = self._pending.pop(key, None)
+                self.stats.record_received(earlier is not None)
+                merged = change if earlier is None else merge_changes(earlier, change)
+                if merged is not None:
+                    self._pending[key] = merged
+                self._received_at.append(now)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """立即发出窗口内积累的变更"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            changes = list(self._pending.values())
+            received_at = self._received_at
+            self._pending = {}
+            self._received_at = []
+        if not received_at:
+            return
+
+        flushed_at = time.perf_counter()
+        recipients = 0
+        if changes:
+            if len(changes) == 1:
+                message = {'type': 'sync_notification', 'data': changes[0]}
+            else:
+                message = {'type': 'sync_notification', 'data': {'action': 'batch', 'changes': changes}}
+            recipients = self.flush_callback(message) or 0
+        self.stats.record_flush(len(received_at), recipients, [flushed_at - t for t in received_at])
@@ -0,0 +1,89 @@
+"""
+WebSocket消息编码模块
+握手时通过 Sec-WebSocket-Protocol 协商二进制子协议（MessagePack/CBOR，使用二进制帧），
+未协商或依赖未安装时使用JSON文本帧；消息信封（type/data/requestId）在各编码下完全相同
+"""
+
+import json
+
+from websocket_frame import OPCODE_TEXT, OPCODE_BINARY
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class CodecError(Exception):
+    """消息无法解码"""
+
+
+class JsonCodec:
+    name = 'json'
+    opcode = OPCODE_TEXT
+
+    def encode(self, message):
+        return json.dumps(message).encode('utf-8')
+
+    def decode(self, payload):
+        try:
+            return json.loads(bytes(payload).decode('utf-8'))
+        except ValueError as e:
+            raise CodecError(f'JSON解码失败: {e}')
+
+
+class MsgpackCodec:
+    name = 'msgpack'
+    opcode = OPCODE_BINARY
+
+    def encode(self, message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, payload):
+        try:
+            return msgpack.unpackb(payload, raw=False)
+        except Exception as e:
+            raise CodecError(f'MessagePack解码失败: {e}')
+
+
+class CborCodec:
+    name = 'cbor'
+    opcode = OPCODE_BINARY
+
+    def encode(self, message):
+        return cbor2.dumps(message)
+
+    def decode(self, payload):
+        try:
+            return cbor2.loads(payload)
+        except Exception as e:
+            raise CodecError(f'CBOR解码失败: {e}')
+
+
+JSON_CODEC = JsonCodec()
+
+# 子协议名 -> 编码器，只包含依赖已安装的编码
+SUBPROTOCOLS = {}
+if msgpack is not None:
+    SUBPROTOCOLS[MsgpackCodec.name] = MsgpackCodec()
+if cbor2 is not None:
+    SUBPROTOCOLS[CborCodec.name] = CborCodec()
+
+
+def negotiate_subprotocol(header_value):
+    """
+    按客户端在 Sec-WebSocket-Protocol 中的先后顺序选择第一个支持的子协议
+    返回(编码器, 响应头的值)，无法协商时返回(JSON编码器, None)
+    """
+    for name in (header_value or '').split(','):
+        name = name.strip().lower()
+        if name == JsonCodec.name:
+            return JSON_CODEC, name
+        if name in SUBPROTOCOLS:
+            return SUBPROTOCOLS[name], name
+    return JSON_CODEC, None
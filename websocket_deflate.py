@@ -0,0 +1,183 @@
+"""
+WebSocket permessage-deflate 压缩扩展（RFC 7692）
+负责握手参数协商以及每个连接的压缩/解压上下文
+"""
+
+import threading
+import time
+import zlib
+
+EXTENSION_NAME = 'permessage-deflate'
+
+# 默认压缩参数
+DEFAULT_DEFLATE_OPTIONS = {
+    'threshold': 1024,                # 小于该字节数的消息不压缩
+    'level': 6,                       # zlib压缩级别
+    'memory_level': 8,                # zlib内存级别
+    'server_context_takeover': True,  # 服务器是否在消息之间保留压缩上下文
+    'client_context_takeover': True,  # 是否允许客户端在消息之间保留压缩上下文
+}
+
+_TAIL = b'\x00\x00\xff\xff'
+
+
+class DeflateError(Exception):
+    """解压失败或解压后超出大小限制"""
+
+
+class CompressionStats:
+    """所有连接共享的压缩统计，用于评估带宽节省与CPU开销"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages_compressed = 0
+        self.messages_skipped = 0  # 低于阈值未压缩的消息
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.compress_seconds = 0.0
+        self.messages_decompressed = 0
+        self.decompress_seconds = 0.0
+
+    def record_compress(self, raw_size, compressed_size, seconds):
+        with self._lock:
+            self.messages_compressed += 1
+            self.raw_bytes += raw_size
+            self.compressed_bytes += compressed_size
+            self.compress_seconds += seconds
+
+    def record_skipped(self):
+        with self._lock:
+            self.messages_skipped += 1
+
+    def record_decompress(self, seconds):
+        with self._lock:
+            self.messages_decompressed += 1
+            self.decompress_seconds += seconds
+
+    def to_dict(self):
+        with self._lock:
+            compressed = self.messages_compressed
+            return {
+                'messages_compressed': compressed,
+                'messages_skipped': self.messages_skipped,
+                'raw_bytes': self.raw_bytes,
+                'compressed_bytes': self.compressed_bytes,
+                'ratio': round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+                'bytes_saved_per_message': (self.raw_bytes - self.compressed_bytes) // compressed if compressed else None,
+                'compress_us_per_message': round(self.compress_seconds / compressed * 1e6, 1) if compressed else None,
+                'decompress_us_per_message': (round(self.decompress_seconds / self.messages_decompressed * 1e6, 1)
+                                              if self.messages_decompressed else None),
+            }
+
+
+class PerMessageDeflate:
+    """单个连接协商后的压缩上下文"""
+
+    def __init__(self, server_context_takeover=True, client_context_takeover=True,
+                 server_window_bits=15, threshold=1024, level=6, memory_level=8, stats=None):
+        self.server_context_takeover = server_context_takeover
+        self.client_context_takeover = client_context_takeover
+        self.server_window_bits = server_window_bits
+        self.threshold = threshold
+        self.level = level
+        self.memory_level = memory_level
+        self.stats = stats
+        # 保留上下文时压缩与入队必须按发送顺序串行
+        self.lock = threading.Lock()
+        self._compressor = self._new_compressor() if server_context_takeover else None
+        self._decompressor = zlib.decompressobj(-15)
+
+    def _new_compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, -self.server_window_bits, self.memory_level)
+
+    def should_compress(self, payload):
+        if len(payload) >= self.threshold:
+            return True
+        if self.stats:
+            self.stats.record_skipped()
+        return False
+
+    def compress(self, payload):
+        """压缩一条消息的负载（去掉末尾的 00 00 ff ff）"""
+        started = time.perf_counter()
+        compressor = self._compressor or self._new_compressor()
+        data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data.endswith(_TAIL):
+            data = data[:-4]
+        if self.stats:
+            self.stats.record_compress(len(payload), len(data), time.perf_counter() - started)
+        return data
+
+    def decompress(self, payload, max_size):
+        """解压一条完整消息，超过max_size时抛出DeflateError，防止解压炸弹"""
+        started = time.perf_counter()
+        if not self.client_context_takeover:
+            self._decompressor = zlib.decompressobj(-15)
+        try:
+            data = self._decompressor.decompress(bytes(payload) + _TAIL, max_size)
+        except zlib.error as e:
+            raise DeflateError(f'解压失败: {e}')
+        if self._decompressor.unconsumed_tail:
+            raise DeflateError('解压后的消息超过大小限制')
+        if self.stats:
+            self.stats.record_decompress(time.perf_counter() - started)
+        return data
+
+
+def parse_extension_offers(header_value):
+    """解析 Sec-WebSocket-Extensions 头，返回[(扩展名, {参数: 值})]"""
+    offers = []
+    for offer in header_value.split(','):
+        items = [item.strip() for item in offer.split(';') if item.strip()]
+        if not items:
+            continue
+        params = {}
+        for item in items[1:]:
+            name, _, value = item.partition('=')
+            params[name.strip().lower()] = value.strip().strip('"') or None
+        offers.append((items[0].lower(), params))
+    return offers
+
+
+def negotiate(header_value, options=None, stats=None):
+    """
+    根据客户端的扩展报价协商permessage-deflate
+    返回(PerMessageDeflate, 响应头的值)，无法协商时返回(None, None)
+    """
+    options = {**DEFAULT_DEFLATE_OPTIONS, **(options or {})}
+    for name, params in parse_extension_offers(header_value or ''):
+        if name != EXTENSION_NAME:
+            continue
+
+        server_context_takeover = options['server_context_takeover'] and 'server_no_context_takeover' not in params
+        client_context_takeover = options['client_context_takeover'] and 'client_no_context_takeover' not in params
+
+        server_window_bits = 15
+        if 'server_max_window_bits' in params:
+            try:
+                server_window_bits = int(params['server_max_window_bits'])
+            except (TypeError, ValueError):
+                continue
+            # zlib的原始deflate流不支持8位窗口，拒绝该报价
+            if not 9 <= server_window_bits <= 15:
+                continue
+
+        response_params = [EXTENSION_NAME]
+        if not server_context_takeover:
+            response_params.append('server_no_context_takeover')
+        if not client_context_takeover:
+            response_params.append('client_no_context_takeover')
+        if 'server_max_window_bits' in params:
+            response_params.append(f'server_max_window_bits={server_window_bits}')
+
+        deflate = PerMessageDeflate(
+            server_context_takeover=server_context_takeover,
+            client_context_takeover=client_context_takeover,
+            server_window_bits=server_window_bits,
+            threshold=options['threshold'],
+            level=options['level'],
+            memory_level=options['memory_level'],
+            stats=stats
+        )
+        return deflate, '; '.join(response_params)
+    return None, None
@@ -0,0 +1,204 @@
+"""
+WebSocket帧编解码模块
+增量解码：按连接累积字节，支持一次读取包含多个帧、一个帧分多次到达、分片消息重组以及控制帧
+"""
+
+import struct
+
+# 操作码
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+# 关闭状态码
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_MESSAGE_TOO_BIG = 1009
+
+DEFAULT_MAX_MESSAGE_SIZE = 16 * 1024 * 1024  # 单条消息（含所有分片）上限
+
+
+class FrameError(Exception):
+    """帧格式错误或超出大小限制"""
+
+    def __init__(self, message, close_code=CLOSE_PROTOCOL_ERROR):
+        super().__init__(message)
+        self.close_code = close_code
+
+
+def unmask(payload, mask):
+    """
+    用4字节掩码解码负载
+    把负载和重复的掩码各看作一个大整数做一次异或，由C实现的大整数运算按机器字处理，
+    避免逐字节的Python循环
+    """
+    length = len(payload)
+    if not length:
+        return b''
+    key = (bytes(mask) * ((length + 3) // 4))[:length]
+    value = int.from_bytes(payload, 'little') ^ int.from_bytes(key, 'little')
+    return value.to_bytes(length, 'little')
+
+
+def encode_frame_header(length, opcode=OPCODE_TEXT, rsv1=False):
+    """编码服务器帧的帧头（服务器帧不带掩码），rsv1标记负载经过permessage-deflate压缩"""
+    first_byte = 0x80 | (0x40 if rsv1 else 0) | opcode
+    if length < 126:
+        return struct.pack('!BB', first_byte, length)
+    if length < 65536:
+        return struct.pack('!BBH', first_byte, 126, length)
+    return struct.pack('!BBQ', first_byte, 127, length)
+
+
+def encode_frame_parts(payload, opcode=OPCODE_TEXT, rsv1=False):
+    """返回(帧头, 负载)，供sendmsg分散写入，负载不做任何拷贝"""
+    return encode_frame_header(len(payload), opcode, rsv1), payload
+
+
+def encode_frame(payload, opcode=OPCODE_TEXT, rsv1=False):
+    """编码一个完整帧（单个bytes），用于需要缓存或共享整帧的场景"""
+    return encode_frame_header(len(payload), opcode, rsv1) + payload
+
+
+def encode_close(code=CLOSE_NORMAL, reason=''):
+    """编码关闭帧"""
+    return encode_frame(code.to_bytes(2, 'big') + reason.encode('utf-8'), OPCODE_CLOSE)
+
+
+class FrameDecoder:
+    """
+    增量帧解码器
+    feed()追加收到的字节，messages()逐个产出(操作码, 负载)：
+    数据消息在所有分片到齐后整体产出，控制帧（关闭/ping/pong）到达即产出
+    """
+
+    def __init__(self, max_message_size=DEFAULT_MAX_MESSAGE_SIZE, deflate=None, max_frame_size=None):
+        self.buffer = bytearray()
+        self.max_message_size = max_message_size
+        self.max_frame_size = max_frame_size or max_message_size  # 单个帧的负载上限
+        self.deflate = deflate  # 协商了permessage-deflate时的解压上下文
+        self._fragments = []
+        self._fragments_size = 0
+        self._fragment_opcode = None
+        self._fragment_compressed = False
+
+    def feed(self, data):
+        """追加收到的数据，返回本次可以产出的所有消息"""
+        self.buffer.extend(data)
+        return list(self.messages())
+
+    def messages(self):
+        """从缓冲区中解析出所有完整的消息"""
+        consumed = 0
+        try:
+            with memoryview(self.buffer) as view:
+                while True:
+                    frame = self._parse_frame(view, consumed)
+                    if frame is None:
+                        break
+                    consumed, fin, rsv1, opcode, payload = frame
+                    message = self._assemble(fin, rsv1, opcode, payload)
+                    if message is not None:
+                        yield message
+        finally:
+            # 整批解析完成后一次性丢弃已消费的字节，而不是每帧移动一次缓冲区
+            if consumed:
+                del self.buffer[:consumed]
+
+    def _parse_frame(self, view, offset):
+        """解析offset处的一个帧，数据不完整时返回None"""
+        available = len(view) - offset
+        if available < 2:
+            return None
+
+        first_byte = view[offset]
+        second_byte = view[offset + 1]
+        fin = (first_byte & 0x80) != 0
+        rsv1 = (first_byte & 0x40) != 0
+        opcode = first_byte & 0x0f
+        # RSV1只在协商了压缩扩展时用于数据消息的首帧，RSV2/RSV3未定义
+        if first_byte & 0x30 or (rsv1 and (self.deflate is None or opcode >= OPCODE_CLOSE
+                                           or opcode == OPCODE_CONTINUATION)):
+            raise FrameError('不支持的扩展位')
+        masked = (second_byte & 0x80) != 0
+        payload_length = second_byte & 0x7f
+
+        header_length = 2
+        if payload_length == 126:
+            header_length = 4
+        elif payload_length == 127:
+            header_length = 10
+        if masked:
+            header_length += 4
+        if available < header_length:
+            return None
+
+        position = offset + 2
+        if payload_length == 126:
+            payload_length = int.from_bytes(view[position:position + 2], 'big')
+            position += 2
+        elif payload_length == 127:
+            payload_length = int.from_bytes(view[position:position + 8], 'big')
+            position += 8
+
+        if opcode >= OPCODE_CLOSE and (payload_length > 125 or not fin):
+            raise FrameError('控制帧不能分片且负载不能超过125字节')
+        if payload_length > self.max_frame_size:
+            raise FrameError('帧超过大小限制', CLOSE_MESSAGE_TOO_BIG)
+        if self._fragments_size + payload_length > self.max_message_size:
+            raise FrameError('消息超过大小限制', CLOSE_MESSAGE_TOO_BIG)
+
+        if masked:
+            mask = view[position:position + 4]
+            position += 4
+        else:
+            mask = None
+
+        end = position + payload_length
+        if len(view) < end:
+            return None
+
+        payload = view[position:end]
+        payload = unmask(payload, mask) if mask is not None else bytes(payload)
+        return end, fin, rsv1, opcode, payload
+
+    def _assemble(self, fin, rsv1, opcode, payload):
+        """处理分片：返回完整消息，消息尚未结束时返回None"""
+        if opcode >= OPCODE_CLOSE:
+            return opcode, payload
+
+        if opcode == OPCODE_CONTINUATION:
+            if self._fragment_opcode is None:
+                raise FrameError('收到没有起始帧的续帧')
+            self._fragments.append(payload)
+            self._fragments_size += len(payload)
+            if not fin:
+                return None
+            message = (self._fragment_opcode,
+                       self._inflate(b''.join(self._fragments), self._fragment_compressed))
+            self._fragments = []
+            self._fragments_size = 0
+            self._fragment_opcode = None
+            return message
+
+        if self._fragment_opcode is not None:
+            raise FrameError('上一条分片消息尚未结束')
+        if fin:
+            return opcode, self._inflate(payload, rsv1)
+
+        self._fragment_opcode = opcode
+        self._fragment_compressed = rsv1
+        self._fragments = [payload]
+        self._fragments_size = len(payload)
+        return None
+
+    def _inflate(self, payload, compressed):
+        if not compressed:
+            return payload
+        try:
+            return self.deflate.decompress(payload, self.max_message_size)
+        except Exception as e:
+            raise FrameError(str(e))
@@ -0,0 +1,169 @@
+"""
+WebSocket心跳模块
+服务器主动发送ping，按连接记录最近活动时间；所有连接的检查时间放在一个哈希时间轮中，
+由单个线程推进，不为每个连接单独sleep，未在期限内回应的连接被断开
+"""
+
+import threading
+import time
+
+
+class TimerWheel:
+    """
+    哈希时间轮
+    每个槽对应一个tick，超过一圈的定时用剩余圈数表示；调度与到期都是O(1)摊还
+    """
+
+    def __init__(self, tick=1.0, size=512):
+        self.tick = tick
+        self.size = size
+        self._slots = [[] for _ in range(size)]
+        self._cursor = 0
+
+    def schedule(self, item, delay):
+        """delay秒后到期（向上取整到tick，至少一个tick）"""
+        ticks = max(1, -int(-delay // self.tick))
+        rounds = (ticks - 1) // self.size
+        self._slots[(self._cursor + ticks) % self.size].append([rounds, item])
+
+    def advance(self):
+        """前进一个tick，返回到期的条目"""
+        self._cursor = (self._cursor + 1) % self.size
+        bucket = self._slots[self._cursor]
+        if not bucket:
+            return []
+        expired = []
+        remaining = []
+        for entry in bucket:
+            if entry[0] == 0:
+                expired.append(entry[1])
+            else:
+                entry[0] -= 1
+                remaining.append(entry)
+        self._slots[self._cursor] = remaining
+        return expired
+
+
+class ConnectionActivity:
+    """单个连接的心跳状态与活动统计"""
+
+    __slots__ = ('connected_at', 'last_activity', 'ping_sent_at', 'pings_sent', 'last_rtt')
+
+    def __init__(self, now):
+        self.connected_at = now
+        self.last_activity = now
+        self.ping_sent_at = None  # 等待pong时为发送ping的时间
+        self.pings_sent = 0
+        self.last_rtt = None  # 最近一次ping往返耗时（秒）
+
+
+class HeartbeatMonitor:
+    """
+    心跳调度器
+    连接空闲超过ping_interval时通过send_ping(连接)发送ping，之后pong_timeout内没有任何数据到达
+    则调用on_timeout(连接)；收到数据只更新时间戳，不操作时间轮
+    """
+
+    def __init__(self, send_ping, on_timeout, ping_interval=30, pong_timeout=10, tick=1.0):
+        self.send_ping = send_ping
+        self.on_timeout = on_timeout
+        self.ping_interval = ping_interval
+        self.pong_timeout = pong_timeout
+        self.wheel = TimerWheel(tick)
+        self.activities = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def track(self, conn):
+        activity = ConnectionActivity(time.monotonic())
+        with self._lock:
+            self.activities[conn] = activity
+            self.wheel.schedule((conn, activity), self.ping_interval)
+
+    def untrack(self, conn):
+        # 时间轮中的条目在到期时发现连接已不在activities中会被直接丢弃
+        with self._lock:
+            self.activities.pop(conn, None)
+
+    def touch(self, conn):
+        """连接收到数据"""
+        activity = self.activities.get(conn)
+        if activity is not None:
+            activity.last_activity = time.monotonic()
+
+    def pong(self, conn):
+        """连接收到pong，记录往返耗时"""
+        activity = self.activities.get(conn)
+        if activity is not None and activity.ping_sent_at is not None:
+            activity.last_rtt = time.monotonic() - activity.ping_sent_at
+            activity.ping_sent_at = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ws-heartbeat', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        started = time.monotonic()
+        ticks = 0
+        while not self._stop.wait(self.wheel.tick):
+            # 按实际经过的时间推进，线程调度延迟不会让时间轮变慢
+            target = int((time.monotonic() - started) / self.wheel.tick)
+            while ticks < target:
+                ticks += 1
+                self.advance()
+
+    def advance(self):
+        """推进一个tick并检查到期的连接"""
+        with self._lock:
+            expired = self.wheel.advance()
+        for conn, activity in expired:
+            if self.activities.get(conn) is activity:
+                try:
+                    self._check(conn, activity)
+                except Exception as e:
+                    print(f'心跳检查失败: {e}')
+
+    def _check(self, conn, activity):
+        now = time.monotonic()
+        if activity.ping_sent_at is not None:
+            if activity.last_activity >= activity.ping_sent_at:
+                # ping之后有数据到达，说明连接仍然存活
+                activity.ping_sent_at = None
+            elif now - activity.ping_sent_at >= self.pong_timeout:
+                self.untrack(conn)
+                self.on_timeout(conn)
+                return
+            else:
+                self._schedule(conn, activity, activity.ping_sent_at + self.pong_timeout - now)
+                return
+
+        idle = now - activity.last_activity
+        if idle >= self.ping_interval:
+            activity.ping_sent_at = now
+            activity.pings_sent += 1
+            self.send_ping(conn)
+            self._schedule(conn, activity, self.pong_timeout)
+        else:
+            self._schedule(conn, activity, self.ping_interval - idle)
+
+    def _schedule(self, conn, activity, delay):
+        with self._lock:
+            self.wheel.schedule((conn, activity), delay)
+
+    def snapshot(self, conn):
+        """连接的活动统计"""
+        activity = self.activities.get(conn)
+        if activity is None:
+            return None
+        now = time.monotonic()
+        return {
+            'connected_seconds': round(now - activity.connected_at, 3),
+            'idle_seconds': round(now - activity.last_activity, 3),
+            'pings_sent': activity.pings_sent,
+            'awaiting_pong': activity.ping_sent_at is not None,
+            'last_rtt_ms': round(activity.last_rtt * 1000, 3) if activity.last_rtt is not None else None
+        }
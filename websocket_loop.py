@@ -0,0 +1,507 @@
+"""
+WebSocket事件循环模块
+基于selectors（Linux下为epoll）的非阻塞I/O多路复用，单个线程即可承载大量空闲连接；
+同时提供asyncio流模式下的连接封装
+"""
+
+import asyncio
+import itertools
+import selectors
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+# Windows上的socket没有sendmsg，退化为拼接后发送
+HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+IOV_BATCH = 64  # 单次sendmsg最多提交的缓冲区数量
+
+# select()实现的选择器（Windows上的DefaultSelector）最多监视FD_SETSIZE个socket（Windows为512），
+# 预留唤醒管道与监听socket后每个事件循环承载的连接数上限；epoll/kqueue没有此限制
+SELECT_MAX_CONNECTIONS = 500
+SELECT_RETRY_DELAY = 0.1  # select失败后重试前的等待（秒），避免持续失败时空转
+
+# Windows上selectors只能使用select()，默认改用asyncio模式（Proactor事件循环基于IOCP，没有socket数量上限）
+DEFAULT_SERVER_MODE = 'asyncio' if sys.platform == 'win32' else 'selector'
+
+
+def send_parts(sock, parts):
+    """在阻塞socket上用分散写发送全部缓冲区，不拼接负载"""
+    if not HAS_SENDMSG:
+        sock.sendall(b''.join(parts))
+        return
+    pending = [memoryview(part) for part in parts if len(part)]
+    while pending:
+        sent = sock.sendmsg(pending[:IOV_BATCH])
+        while sent:
+            if sent >= len(pending[0]):
+                sent -= len(pending[0])
+                pending.pop(0)
+            else:
+                pending[0] = pending[0][sent:]
+                sent = 0
+
+
+class EventLoop:
+    """单线程selectors事件循环"""
+
+    def __init__(self, name='ws-loop'):
+        self.name = name
+        self.selector = selectors.DefaultSelector()
+        self.running = False
+        self.thread = None
+        self._callbacks = deque()
+        # 只有select()实现有连接数上限，None表示不限
+        self.max_connections = (SELECT_MAX_CONNECTIONS
+                                if isinstance(self.selector, selectors.SelectSelector) else None)
+        self.connections = 0
+        self._connections_lock = threading.Lock()
+
+        # 自唤醒管道：其它线程投递回调后唤醒阻塞在select上的循环
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, self._drain_wakeup)
+
+    def in_loop_thread(self):
+        """当前线程是否为事件循环线程"""
+        return threading.current_thread() is self.thread
+
+    def call_soon_threadsafe(self, callback, *args):
+        """从任意线程投递回调到事件循环中执行"""
+        self._callbacks.append((callback, args))
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            # 缓冲区已满说明循环已处于待唤醒状态
+            pass
+
+    def _drain_wakeup(self, mask):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def register(self, sock, events, handler):
+        self.selector.register(sock, events, handler)
+
+    def modify(self, sock, events, handler):
+        self.selector.modify(sock, events, handler)
+
+    def unregister(self, sock):
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+
+    def reserve_connection(self, limit=None):
+        """为新连接占用一个名额，循环已满时返回False；limit为服务器配置的每个循环连接数上限"""
+        limits = [n for n in (limit, self.max_connections) if n is not None]
+        with self._connections_lock:
+            if limits and self.connections >= min(limits):
+                return False
+            self.connections += 1
+            return True
+
+    def release_connection(self):
+        """连接关闭后归还名额（线程安全）"""
+        with self._connections_lock:
+            self.connections -= 1
+
+    def _run_callbacks(self):
+        # 只执行本轮之前投递的回调，避免回调中再投递导致死循环
+        for _ in range(len(self._callbacks)):
+            callback, args = self._callbacks.popleft()
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f'事件循环回调执行失败: {e}')
+
+    def run_forever(self):
+        """在当前线程运行事件循环，直到stop()被调用"""
+        self.thread = threading.current_thread()
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    events = self.selector.select(timeout=None)
+                except (OSError, ValueError) as e:
+                    # 单个失效的socket不应让整个循环退出、断开其上的所有连接
+                    print(f'事件循环select失败: {e}')
+                    self._discard_broken()
+                    time.sleep(SELECT_RETRY_DELAY)
+                    events = []
+                for key, mask in events:
+                    try:
+                        key.data(mask)
+                    except Exception as e:
+                        print(f'事件循环处理I/O失败: {e}')
+                self._run_callbacks()
+        finally:
+            self._close()
+
+    def _discard_broken(self):
+        """移除已失效的socket，并让其处理函数在读取失败后关闭对应的连接"""
+        for key in list(self.selector.get_map().values()):
+            try:
+                key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_TYPE)
+                continue
+            except OSError:
+                pass
+            self.unregister(key.fileobj)
+            if key.fileobj is self._wakeup_r:
+                continue
+            try:
+                key.data(selectors.EVENT_READ)
+            except Exception as e:
+                print(f'事件循环关闭失效连接失败: {e}')
+
+    def start(self):
+        """在后台线程中启动事件循环"""
+        thread = threading.Thread(target=self.run_forever, name=self.name, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """停止事件循环（线程安全）"""
+        self.running = False
+        self._wakeup()
+
+    def _close(self):
+        for key in list(self.selector.get_map().values()):
+            if key.fileobj is not self._wakeup_r:
+                try:
+                    key.fileobj.close()
+                except OSError:
+                    pass
+        self.selector.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+
+class SocketConnection:
+    """
+    每客户端一个线程模式下的阻塞连接
+    发送统一进入出站队列，由该连接专属的写线程排空，调用方（包括广播）不会被慢客户端阻塞
+    """
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.decoder = None  # 握手完成后由服务器设置
+        self.deflate = None
+        self.codec = None  # 握手时协商的消息编码
+        self.closed = False
+        self._closing = False
+        self._queue = deque()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def send(self, data):
+        return self.send_parts((data,))
+
+    def send_parts(self, parts):
+        """加入出站队列，立即返回"""
+        size = sum(len(part) for part in parts)
+        with self._cond:
+            if self.closed or self._closing:
+                raise OSError('连接已关闭')
+            self._queue.append((parts, size))
+            self._pending += size
+            self._cond.notify()
+        return size
+
+    def pending_bytes(self):
+        """出站队列中尚未写出的字节数"""
+        return self._pending
+
+    def recv(self, size):
+        return self.sock.recv(size)
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._queue:
+                    break
+                parts, size = self._queue.popleft()
+            try:
+                send_parts(self.sock, parts)
+            except OSError:
+                break
+            with self._cond:
+                self._pending -= size
+
+        with self._cond:
+            self.closed = True
+            self._queue.clear()
+            self._pending = 0
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def close(self):
+        """排空出站队列后关闭"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+    def abort(self):
+        """立即断开，丢弃未发送的数据"""
+        try:
+            # 唤醒阻塞在recv/send上的线程；必须在写线程关闭socket之前执行，
+            # 否则读线程仍阻塞在recv上，内核不会发出FIN
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        with self._cond:
+            self._closing = True
+            self._queue.clear()
+            self._cond.notify()
+
+
+class LoopConnection:
+    """
+    事件循环上的非阻塞连接
+    对外提供与socket相同的send()/close()接口，可以在任意线程调用
+    """
+
+    RECV_SIZE = 65536
+
+    def __init__(self, loop, sock, address, on_data, on_close):
+        self.loop = loop
+        self.sock = sock
+        self.address = address
+        self.recv_buffer = bytearray()  # 握手阶段累积请求头
+        self.decoder = None  # 握手完成后由服务器设置的帧解码器
+        self.deflate = None  # 协商了permessage-deflate时的压缩上下文
+        self.codec = None  # 握手时协商的消息编码（JSON或二进制子协议）
+        self.handshake_done = False
+        self.closed = False
+        self._closing = False
+        self._recv_chunk = bytearray(self.RECV_SIZE)  # 复用的接收缓冲区，避免每次recv分配新对象
+        self._recv_view = memoryview(self._recv_chunk)
+        self._on_data = on_data
+        self._on_close = on_close
+        self._out = deque()
+        self._out_lock = threading.Lock()
+        self._pending = 0
+        self._writing = False
+
+    def attach(self):
+        """注册到事件循环（必须在循环线程中调用）"""
+        self.sock.setblocking(False)
+        self.loop.register(self.sock, selectors.EVENT_READ, self._handle_events)
+
+    def _handle_events(self, mask):
+        if mask & selectors.EVENT_READ:
+            self._handle_read()
+        if mask & selectors.EVENT_WRITE and not self.closed:
+            self._flush()
+
+    def _handle_read(self):
+        try:
+            received = self.sock.recv_into(self._recv_chunk)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close()
+            return
+
+        if not received:
+            self._close()
+            return
+
+        self._on_data(self, self._recv_view[:received])
+
+    def send(self, data):
+        """写入发送队列，由事件循环在可写时发出"""
+        return self.send_parts((data,))
+
+    def send_parts(self, parts):
+        """把多个缓冲区（如帧头和负载）依次加入发送队列，发送时合并为一次sendmsg"""
+        if self.closed or self._closing:
+            raise OSError('连接已关闭')
+        size = sum(len(part) for part in parts)
+        with self._out_lock:
+            self._out.extend(part for part in parts if len(part))
+            self._pending += size
+        if self.loop.in_loop_thread():
+            self._flush()
+        else:
+            self.loop.call_soon_threadsafe(self._flush)
+        return size
+
+    def pending_bytes(self):
+        """发送队列中尚未写出的字节数"""
+        return self._pending
+
+    def _flush(self):
+        if self.closed:
+            return
+        while True:
+            with self._out_lock:
+                if not self._out:
+                    break
+                chunks = list(itertools.islice(self._out, IOV_BATCH)) if HAS_SENDMSG else [self._out[0]]
+            try:
+                sent = self.sock.sendmsg(chunks) if HAS_SENDMSG else self.sock.send(chunks[0])
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self._close()
+                return
+
+            self._consume(sent)
+            if sent < sum(len(chunk) for chunk in chunks):
+                break  # 内核发送缓冲区已满，等待可写事件
+
+        if self._closing and not self._out:
+            self._close()
+            return
+
+        # 仍有未发完的数据时关注可写事件，发完后取消
+        want_write = bool(self._out)
+        if want_write != self._writing:
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if want_write else 0)
+            self.loop.modify(self.sock, events, self._handle_events)
+            self._writing = want_write
+
+    def _consume(self, sent):
+        """从发送队列头部移除已发出的字节，部分发出的缓冲区保留剩余部分"""
+        with self._out_lock:
+            self._pending -= sent
+            while sent:
+                head = self._out[0]
+                if sent >= len(head):
+                    sent -= len(head)
+                    self._out.popleft()
+                else:
+                    self._out[0] = memoryview(head)[sent:]
+                    sent = 0
+
+    def close(self):
+        """关闭连接（线程安全），已排队的数据会先发送完"""
+        if self.loop.in_loop_thread():
+            self._close_after_flush()
+        else:
+            self.loop.call_soon_threadsafe(self._close_after_flush)
+
+    def _close_after_flush(self):
+        self._closing = True
+        self._flush()
+
+    def abort(self):
+        """立即断开，丢弃未发送的数据（线程安全）"""
+        if self.loop.in_loop_thread():
+            self._close()
+        else:
+            self.loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        with self._out_lock:
+            self._out.clear()
+            self._pending = 0
+        self.loop.unregister(self.sock)
+        self.loop.release_connection()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        self._on_close(self)
+
+
+class AsyncConnection:
+    """
+    asyncio流上的连接
+    send()/close()可以在任意线程调用，send_async()供事件循环内的协程使用
+    与LoopConnection相同，所有发送先按调用顺序进入出站队列，再由事件循环线程依次写入传输层，
+    循环内外同时发送时帧不会交错，保留上下文的压缩帧也按压缩顺序发出
+    """
+
+    def __init__(self, loop, reader, writer, address):
+        self.loop = loop
+        self.reader = reader
+        self.writer = writer
+        self.address = address
+        self.decoder = None  # 握手完成后由服务器设置
+        self.deflate = None
+        self.codec = None  # 握手时协商的消息编码
+        self.closed = False
+        self._out = deque()
+        self._out_lock = threading.Lock()
+        self._queued = 0  # 已入队、尚未写入传输层的字节数
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def send(self, data):
+        """写入出站队列（不等待排空）"""
+        return self.send_parts((data,))
+
+    def send_parts(self, parts):
+        """把多个缓冲区（如帧头和负载）作为一个整体加入出站队列，由传输层负责合并发送"""
+        if self.closed:
+            raise OSError('连接已关闭')
+        size = sum(len(part) for part in parts)
+        with self._out_lock:
+            self._out.append(parts)
+            self._queued += size
+        if self._in_loop():
+            self._flush()
+        else:
+            self.loop.call_soon_threadsafe(self._flush)
+        return size
+
+    def _flush(self):
+        """按入队顺序把出站队列写入传输层（在事件循环线程中执行）"""
+        with self._out_lock:
+            batches = list(self._out)
+            self._out.clear()
+            self._queued = 0
+        if self.closed:
+            return
+        for parts in batches:
+            self.writer.writelines(parts)
+
+    async def drain(self):
+        """等待传输层缓冲区排空，对慢客户端形成背压"""
+        if self.closed:
+            raise OSError('连接已关闭')
+        await self.writer.drain()
+
+    def pending_bytes(self):
+        """出站队列与传输层写缓冲区中尚未写出的字节数"""
+        return self._queued + self.writer.transport.get_write_buffer_size()
+
+    def close(self):
+        if self._in_loop():
+            self._close()
+        else:
+            self.loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.writer.close()
+
+    def abort(self):
+        """立即断开，丢弃传输层缓冲区中的数据"""
+        self.closed = True
+        self.loop.call_soon_threadsafe(self.writer.transport.abort)
@@ -0,0 +1,94 @@
+"""
+WebSocket请求限流模块
+按事件类型配置令牌桶：每个连接一组，另有一组全局共享；在执行任何数据库操作之前检查
+"""
+
+import threading
+import time
+
+# 事件类型 -> (每秒补充的令牌数, 桶容量)，'*' 为未单独配置的事件
+DEFAULT_RATE_LIMITS = {
+    '*': (30, 100),                # 容量足够覆盖一次批量勾选
+    'fetch_tasks': (2, 5),         # 每次都会读取整表
+    'sync_tasks': (1, 3),
+    'search_tasks': (5, 10),       # 边输入边搜索
+    'clear_all_tasks': (0.2, 1),
+}
+
+DEFAULT_GLOBAL_RATE_LIMITS = {
+    '*': (500, 1000),
+    'fetch_tasks': (50, 100),
+    'sync_tasks': (10, 20),
+    'search_tasks': (100, 200),
+    'clear_all_tasks': (1, 2),
+}
+
+
+class TokenBucket:
+    """令牌桶：按时间补充令牌，取不到令牌时返回需要等待的秒数"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now):
+        """取一个令牌，成功返回0，否则返回还需等待的秒数"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    连接级 + 全局令牌桶限流
+    limits/global_limits为 事件类型 -> (速率, 容量)，为空字典时不限流
+    """
+
+    def __init__(self, limits=None, global_limits=None):
+        self.limits = DEFAULT_RATE_LIMITS if limits is None else limits
+        self.global_limits = DEFAULT_GLOBAL_RATE_LIMITS if global_limits is None else global_limits
+        self._lock = threading.Lock()
+        self._connection_buckets = {}  # 连接 -> {事件类型: 令牌桶}
+        self._global_buckets = {}
+        self.rejected = {}  # 事件类型（未单独配置的记为'*'）-> 被拒绝次数
+
+    @staticmethod
+    def _limit_for(limits, event_type):
+        return limits.get(event_type) or limits.get('*')
+
+    @staticmethod
+    def _bucket_key(limits, event_type):
+        # 未单独配置的事件共用'*'桶
+        return event_type if event_type in limits else '*'
+
+    def check(self, conn, event_type):
+        """允许时返回0，被限流时返回建议的重试等待秒数"""
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._connection_buckets.setdefault(conn, {})
+            # 先检查连接桶，单个客户端超限时不会消耗全局令牌
+            for limits, bucket_map in ((self.limits, buckets), (self.global_limits, self._global_buckets)):
+                limit = self._limit_for(limits, event_type)
+                if limit is None:
+                    continue
+                key = self._bucket_key(limits, event_type)
+                bucket = bucket_map.get(key)
+                if bucket is None:
+                    bucket = bucket_map[key] = TokenBucket(limit[0], limit[1], now)
+                wait = bucket.take(now)
+                if wait:
+                    self.rejected[key] = self.rejected.get(key, 0) + 1
+                    return wait
+        return 0
+
+    def forget(self, conn):
+        """连接断开后释放它的令牌桶"""
+        with self._lock:
+            self._connection_buckets.pop(conn, None)
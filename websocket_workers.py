@@ -0,0 +1,129 @@
+"""
+WebSocket数据库工作线程池
+固定数量的工作线程执行事件对应的数据库操作，I/O线程（事件循环/读线程）只负责提交；
+排队深度有上限，满时立即拒绝；同一连接的任务按到达顺序串行执行；
+在队列中等待超过该事件时间预算的任务不再执行
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# 事件类型 -> 时间预算（秒），'*' 为未单独配置的事件
+DEFAULT_EVENT_TIMEOUTS = {
+    '*': 5,
+    'fetch_tasks': 10,
+    'sync_tasks': 30,
+}
+
+
+class PoolBusy(Exception):
+    """排队任务已达上限"""
+
+
+class JobTimeout(Exception):
+    """任务在队列中等待超过时间预算，未执行"""
+
+
+class DBWorkerPool:
+    """有界数据库工作线程池"""
+
+    def __init__(self, max_workers=4, max_queue=256, timeouts=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeouts = DEFAULT_EVENT_TIMEOUTS if timeouts is None else timeouts
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ws-db')
+        self._lock = threading.Lock()
+        self._chains = {}  # 连接 -> 等待前一个任务完成的后续任务
+        self._in_flight = 0  # 已提交未完成的任务数（排队 + 执行中）
+        self.running = 0
+        self.completed = 0
+        self.rejected_busy = 0
+        self.timed_out = 0
+        self.over_budget = 0  # 已开始执行但完成时超出预算的任务（结果照常返回）
+
+    def timeout_for(self, event_type):
+        return self.timeouts.get(event_type) or self.timeouts.get('*')
+
+    def submit(self, key, event_type, fn, *args):
+        """
+        提交一个任务，返回Future；同一key（连接）的任务按顺序串行执行
+        排队已满时抛出PoolBusy
+        """
+        future = Future()
+        job = (future, self.timeout_for(event_type), time.monotonic(), fn, args)
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected_busy += 1
+                raise PoolBusy()
+            self._in_flight += 1
+            chain = self._chains.get(key)
+            if chain is not None:
+                chain.append(job)  # 该连接已有任务在执行，完成后再提交
+                return future
+            self._chains[key] = deque()
+        self._start(key, job)
+        return future
+
+    def _start(self, key, job):
+        try:
+            self._executor.submit(self._run, key, job)
+        except RuntimeError:
+            # 线程池已关闭
+            job[0].cancel()
+            with self._lock:
+                self._in_flight -= 1
+                self._chains.pop(key, None)
+
+    def _run(self, key, job):
+        future, timeout, submitted, fn, args = job
+        if future.set_running_or_notify_cancel():
+            self._execute(future, timeout, submitted, fn, args)
+
+        with self._lock:
+            self._in_flight -= 1
+            chain = self._chains.get(key)
+            if not chain:
+                self._chains.pop(key, None)
+                return
+            next_job = chain.popleft()
+        self._start(key, next_job)
+
+    def _execute(self, future, timeout, submitted, fn, args):
+        if timeout and time.monotonic() - submitted > timeout:
+            with self._lock:
+                self.timed_out += 1
+            future.set_exception(JobTimeout())
+            return
+
+        with self._lock:
+            self.running += 1
+        try:
+            result = fn(*args)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                if timeout and time.monotonic() - submitted > timeout:
+                    self.over_budget += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queued': self._in_flight - self.running,
+                'running': self.running,
+                'completed': self.completed,
+                'rejected_busy': self.rejected_busy,
+                'timed_out': self.timed_out,
+                'over_budget': self.over_budget,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)